@@ -0,0 +1,25 @@
+"""Composite indexes on cthulhu_event for keyset pagination
+
+Revision ID: 3a1f9c2e7b10
+Revises: None
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3a1f9c2e7b10'
+down_revision = None
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('ix_cthulhu_event_when_id', 'cthulhu_event', ['when', 'id', 'severity'])
+    op.create_index('ix_cthulhu_event_fsid_when_id', 'cthulhu_event', ['fsid', 'when', 'id', 'severity'])
+    op.create_index('ix_cthulhu_event_fqdn_when_id', 'cthulhu_event', ['fqdn', 'when', 'id', 'severity'])
+
+
+def downgrade():
+    op.drop_index('ix_cthulhu_event_fqdn_when_id', 'cthulhu_event')
+    op.drop_index('ix_cthulhu_event_fsid_when_id', 'cthulhu_event')
+    op.drop_index('ix_cthulhu_event_when_id', 'cthulhu_event')
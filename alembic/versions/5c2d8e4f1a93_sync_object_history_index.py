@@ -0,0 +1,21 @@
+"""Composite index on cthulhu_sync_object for time range history queries
+
+Revision ID: 5c2d8e4f1a93
+Revises: 3a1f9c2e7b10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5c2d8e4f1a93'
+down_revision = '3a1f9c2e7b10'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('ix_cthulhu_sync_object_fsid_type_when', 'cthulhu_sync_object', ['fsid', 'sync_type', 'when'])
+
+
+def downgrade():
+    op.drop_index('ix_cthulhu_sync_object_fsid_type_when', 'cthulhu_sync_object')
@@ -0,0 +1,39 @@
+"""Table of completed requests, for cthulhu to read once it drops them from memory
+
+Revision ID: 7d4b2a9c1e05
+Revises: 5c2d8e4f1a93
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d4b2a9c1e05'
+down_revision = '5c2d8e4f1a93'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'cthulhu_request',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('fsid', sa.Text(), nullable=True),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('error', sa.Boolean(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('status', sa.Text(), nullable=True),
+        sa.Column('headline', sa.Text(), nullable=True),
+        sa.Column('requested_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('outcomes', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_cthulhu_request_requested_at', 'cthulhu_request', ['requested_at', 'id'])
+    op.create_index('ix_cthulhu_request_fsid_requested_at', 'cthulhu_request', ['fsid', 'requested_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_cthulhu_request_fsid_requested_at', 'cthulhu_request')
+    op.drop_index('ix_cthulhu_request_requested_at', 'cthulhu_request')
+    op.drop_table('cthulhu_request')
@@ -20,7 +20,45 @@ CONFIG_PATH_VAR = "CALAMARI_CONFIG"
 class CalamariConfig(ConfigParser.SafeConfigParser):
     def __init__(self):
         defaults = {'ssl_key': '/etc/calamari/ssl/private/calamari-lite.key',
-                    'ssl_cert': '/etc/calamari/ssl/certs/calamari-lite-bundled.crt'}
+                    'ssl_cert': '/etc/calamari/ssl/certs/calamari-lite-bundled.crt',
+                    # Days to keep events of each severity, 0 to keep forever
+                    'event_retention': 'CRITICAL=365,ERROR=365,WARNING=90,RECOVERY=90,INFO=30',
+                    'event_prune_period': '300',
+                    'event_prune_batch_size': '1000',
+                    # Directory to write pruned events to as gzipped JSON lines, empty to discard them
+                    'event_archive_path': '',
+                    # Idle zerorpc connections to cthulhu kept by each REST API process
+                    'rpc_pool_size': '8',
+                    # Seconds a pooled connection may sit idle before it is pinged on checkout
+                    'rpc_pool_check_interval': '30',
+                    # Bytes of rendered REST API responses to cache in each process, 0 to disable
+                    'response_cache_size': str(64 * 1024 * 1024),
+                    # Smallest REST API response body in bytes to gzip for clients that
+                    # accept it, 0 to never gzip.  Streamed responses are always gzipped.
+                    'gzip_min_size': '1024',
+                    # Directory that cthulhu publishes sync object snapshots to for the
+                    # REST API to read directly, empty to always read them over RPC
+                    'snapshot_path': '',
+                    # Seconds after which the REST API stops trusting a snapshot and asks cthulhu
+                    # over RPC instead.  cthulhu publishes its snapshots again at half this period.
+                    'snapshot_max_age': '60',
+                    # Notifications kept by cthulhu for REST API clients waiting on the change feed
+                    'change_feed_size': '1000',
+                    # Completed requests that cthulhu keeps in memory, and for how many seconds,
+                    # before leaving them to be read from the database
+                    'completed_request_limit': '1000',
+                    'completed_request_age': '3600',
+                    # Seconds that cthulhu holds requests for, so that their commands may be run
+                    # together with those of other requests in one job, 0 to start them straight away
+                    'request_merge_window': '0.5',
+                    # Seconds between collections of cluster and pool stats by cthulhu
+                    'df_stats_period': '60',
+                    # Seconds per point and seconds of history that calamari-lite keeps
+                    # for each stat in the absence of graphite
+                    'tsdb_resolution': '60',
+                    'tsdb_retention': str(24 * 3600),
+                    # Directory for calamari-lite to keep stats history in, empty to keep it in memory only
+                    'tsdb_path': ''}
         ConfigParser.SafeConfigParser.__init__(self, defaults=defaults)
 
         try:
@@ -35,7 +35,12 @@ class Event(Base):
         # For looking up events for one server
         Index('ix_cthulhu_event_fqdn', "fqdn"),
         # For looking up events less than a certain severity
-        Index('ix_cthulhu_event_severity', "severity")
+        Index('ix_cthulhu_event_severity', "severity"),
+        # For paging through events in (when, id) order, optionally filtered by
+        # cluster or server, with the severity threshold checked from the index
+        Index('ix_cthulhu_event_when_id', "when", "id", "severity"),
+        Index('ix_cthulhu_event_fsid_when_id', "fsid", "when", "id", "severity"),
+        Index('ix_cthulhu_event_fqdn_when_id', "fqdn", "when", "id", "severity")
     )
 
     def __repr__(self):
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, String, Text, Boolean, DateTime, Index
+from calamari_common.db.base import Base
+
+
+class UserRequestRecord(Base):
+    """
+    Completed UserRequests, kept after cthulhu has dropped them from memory.
+    """
+    __tablename__ = 'cthulhu_request'
+
+    # The UserRequest's UUID
+    id = Column(String, primary_key=True)
+
+    # Optionally associated with a cluster
+    fsid = Column(Text, nullable=True)
+
+    state = Column(String)
+    error = Column(Boolean)
+    error_message = Column(Text)
+    status = Column(Text)
+    headline = Column(Text)
+    requested_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+
+    # JSON list of per-object outcomes, for requests that have them
+    outcomes = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # For listing requests most recent first, optionally for one cluster
+        Index('ix_cthulhu_request_requested_at', 'requested_at', 'id'),
+        Index('ix_cthulhu_request_fsid_requested_at', 'fsid', 'requested_at', 'id'),
+    )
+
+    def __repr__(self):
+        return "<UserRequestRecord %s @ %s>" % (self.id, self.requested_at)
@@ -736,6 +736,10 @@ def run_job(cmd, args):
             args[0],
             args[1],
         )
+    elif cmd == "ceph.get_df_stats":
+        return get_df_stats(
+            args['fsid'],
+            args['cluster_name'],)
     else:
         raise NotImplemented(cmd)
 
@@ -1076,6 +1080,23 @@ def cluster_stats(cluster_name):
     return result
 
 
+def get_df_stats(fsid, cluster_name):
+    """
+    The space usage of the cluster and the stats of all its pools, from one
+    session with the mons: 'df detail' for the cluster totals and per-pool usage,
+    and the pool sums of 'pg dump' for the object and I/O counts that df leaves out.
+    """
+    with ClusterHandle(cluster_name) as cluster_handle:
+        df = rados_command(cluster_handle, "df", args={'detail': 'detail'})
+        pg_pools = rados_command(cluster_handle, "pg dump", args={'dumpcontents': ['pools']})
+
+    return {
+        'fsid': fsid,
+        'df': df,
+        'pg_pools': pg_pools
+    }
+
+
 def pool_stats(cluster_name, pool_ids):
     import rados
 
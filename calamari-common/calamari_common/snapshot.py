@@ -0,0 +1,144 @@
+"""
+Snapshots of sync objects, published by cthulhu as files that the
+REST API processes memory-map, so that reading the current cluster maps
+doesn't need an RPC to cthulhu.
+
+Each snapshot is one file per (fsid, sync type), replaced atomically
+by rename when a new version arrives, so a reader holding an old mapping
+keeps a consistent (if outdated) copy.  cthulhu publishes each snapshot
+again from time to time while it is running, and removes them when it
+stops, so that readers may refuse snapshots that haven't been published
+recently in case it has gone away without removing them.
+
+The file contents are:
+
+- 8 bytes of magic, identifying the format version
+- A 4 byte big-endian header length
+- A msgpack header: {'fsid', 'sync_type', 'version', 'published'}
+- The msgpack-encoded sync object data
+"""
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+import msgpack
+
+MAGIC = "CALSNAP1"
+PREAMBLE = struct.Struct(">8sI")
+
+
+class SnapshotWriter(object):
+    def __init__(self, path):
+        self.path = path
+
+    def clear(self):
+        """
+        Remove all snapshots, so that nothing outdated is served from
+        a previous run before we have loaded the latest versions.
+        """
+        if os.path.exists(self.path):
+            for fsid in os.listdir(self.path):
+                self.delete_cluster(fsid)
+
+    def delete_cluster(self, fsid):
+        shutil.rmtree(os.path.join(self.path, fsid), ignore_errors=True)
+
+    def publish(self, fsid, sync_type, version, data):
+        cluster_path = os.path.join(self.path, fsid)
+        if not os.path.exists(cluster_path):
+            os.makedirs(cluster_path, 0755)
+
+        header = msgpack.packb({
+            'fsid': fsid,
+            'sync_type': sync_type,
+            'version': version,
+            'published': time.time()
+        })
+
+        f = tempfile.NamedTemporaryFile(dir=cluster_path, prefix=".%s." % sync_type, delete=False)
+        try:
+            f.write(PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(msgpack.packb(data))
+            # Readers are the web server, which runs as a different user
+            os.fchmod(f.fileno(), 0644)
+            f.close()
+            os.rename(f.name, os.path.join(cluster_path, sync_type))
+        except:
+            f.close()
+            os.unlink(f.name)
+            raise
+
+
+class Snapshot(object):
+    def __init__(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            self.identity = (st.st_ino, st.st_mtime, st.st_size)
+            self._map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, header_length = PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError("%s is not a snapshot" % path)
+        self._data_offset = PREAMBLE.size + header_length
+        self.header = msgpack.unpackb(buffer(self._map, PREAMBLE.size, header_length))
+        self.version = self.header['version']
+
+        self._data = None
+        self._decoded = False
+
+    @property
+    def data(self):
+        # Decoded on first use, by which time many callers only wanted the version
+        if not self._decoded:
+            self._data = msgpack.unpackb(buffer(self._map, self._data_offset))
+            self._decoded = True
+        return self._data
+
+
+class SnapshotReader(object):
+    """
+    Read snapshots published by a SnapshotWriter, keeping each mapped
+    (and its data decoded) until a newer one replaces it.  Callers
+    must treat the data as read-only, as it is shared between them.
+
+    Snapshots published more than max_age seconds ago are not returned,
+    if max_age is given.
+    """
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshots = {}
+
+    def get(self, fsid, sync_type):
+        """
+        :return: A Snapshot or None if there is no recent snapshot for this sync object
+        """
+        path = os.path.join(self.path, fsid, sync_type)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        key = (fsid, sync_type)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or snapshot.identity != (st.st_ino, st.st_mtime, st.st_size):
+                try:
+                    snapshot = Snapshot(path)
+                except (OSError, IOError):
+                    # Replaced or removed since we stat'd it
+                    return None
+                self._snapshots[key] = snapshot
+
+        if self.max_age and time.time() - snapshot.header['published'] > self.max_age:
+            return None
+        return snapshot
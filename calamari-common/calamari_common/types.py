@@ -46,6 +46,28 @@ class VersionedSyncObject(SyncObject):
         return cmp(a, b)
 
 
+def crush_ancestry(node_id, parent_map):
+    """
+    The paths from a CRUSH node up to the root of the tree, one list
+    of bucket IDs for each parent of the node.
+
+    :param parent_map: Dict of node ID to list of parent buckets, as in OsdMap.parent_bucket_by_node_id
+    """
+    ancestries = []
+    for parent in parent_map.get(node_id, []):
+        parent_id = parent.get('id')
+        ancestry = [parent_id]
+        while parent and parent_id is not None:
+            parent = parent_map.get(parent_id, [])
+            if parent:
+                parent_id = parent[0].get('id')
+                if parent_id is not None:
+                    ancestry.append(parent_id)
+        ancestries.append(ancestry)
+
+    return ancestries
+
+
 class OsdMap(VersionedSyncObject):
     str = 'osd_map'
 
@@ -58,6 +80,11 @@ class OsdMap(VersionedSyncObject):
             self.crush_rule_by_id = dict([(o['rule_id'], o) for o in data['crush']['rules']])
             self.crush_node_by_id = self._filter_crush_nodes(data['crush']['buckets'])
             self.metadata_by_id = self._map_osd_metadata(data)
+            self.parent_bucket_by_node_id = self._map_parent_buckets(data)
+            # Ancestry of every node in the tree, worked out once here rather than
+            # walking up the tree for each OSD every time they are listed
+            self.crush_ancestry_by_node_id = dict(
+                (n['id'], crush_ancestry(n['id'], self.parent_bucket_by_node_id)) for n in data['tree']['nodes'])
 
             # Special case Yuck
             flags = data.get('flags', '').replace('pauserd,pausewr', 'pause')
@@ -71,6 +98,8 @@ class OsdMap(VersionedSyncObject):
             self.metadata_by_id = {}
             self.crush_rule_by_id = {}
             self.crush_node_by_id = {}
+            self.parent_bucket_by_node_id = {}
+            self.crush_ancestry_by_node_id = {}
             self.flags = dict([(x, False) for x in OSD_FLAGS])
 
     def _map_osd_metadata(self, data):
@@ -94,20 +123,17 @@ class OsdMap(VersionedSyncObject):
             crush_nodes[node['id']] = node
         return crush_nodes
 
-    @property
-    def parent_bucket_by_node_id(self):
+    def _map_parent_buckets(self, data):
         """
         Builds a dict of node_id -> parent_node for all nodes with parents in the crush map
         """
         parent_map = defaultdict(list)
-        if self.data is not None:
-            has_been_mapped = set()
-            for node in self.data['tree']['nodes']:
-                for child_id in node.get('children', []):
-                    if (child_id, node['id']) not in has_been_mapped:
-                        parent_map[child_id].append(node)
-                        has_been_mapped.add((child_id, node['id']))
-        log.info('crush node parent map {p} version {v}'.format(p=parent_map, v=self.version))
+        has_been_mapped = set()
+        for node in data['tree']['nodes']:
+            for child_id in node.get('children', []):
+                if (child_id, node['id']) not in has_been_mapped:
+                    parent_map[child_id].append(node)
+                    has_been_mapped.add((child_id, node['id']))
         return dict(parent_map)
 
     @property
@@ -305,6 +331,13 @@ USER_REQUEST_SUBMITTED = 'submitted'
 OSD_IMPLEMENTED_COMMANDS = ('scrub', 'deep_scrub', 'repair')
 OSD_FLAGS = ('pause', 'noup', 'nodown', 'noout', 'noin', 'nobackfill', 'norecover', 'noscrub', 'nodeep-scrub')
 
+# The keys that lists of OSDs and pools may be sorted by, mapped
+# to the attributes of the OSD and pool data that they refer to
+OSD_SORT_KEYS = {'id': 'id', 'up': 'up', 'in': 'in', 'reweight': 'reweight', 'server': 'server', 'host': 'host',
+                 'device_class': 'device_class'}
+POOL_SORT_KEYS = {'id': 'pool', 'name': 'pool_name', 'size': 'size', 'min_size': 'min_size', 'pg_num': 'pg_num',
+                  'crush_ruleset': 'crush_ruleset'}
+
 # Severity codes for Calamari events
 CRITICAL = 1
 ERROR = 2
@@ -9,3 +9,91 @@ def memoize(function):
             memo[args] = rv
             return rv
     return wrapper
+
+
+def parse_selector(selector):
+    """
+    Expand a selector string into a list of dotted paths for ``project``.  The
+    selector is a comma separated list of dotted paths, any of which may be
+    followed by a bracketed selector that applies beneath it, so that
+    'epoch,osds[osd,up,in]' is equivalent to ['epoch', 'osds.osd', 'osds.up', 'osds.in'].
+
+    :raises ValueError: if the brackets in the selector are unbalanced
+    """
+    def _parse(pos, prefix):
+        fields = []
+        name = ""
+        while pos < len(selector):
+            c = selector[pos]
+            pos += 1
+            if c == '[':
+                if not name:
+                    raise ValueError("Selector '%s' has '[' without a field name" % selector)
+                sub_fields, pos = _parse(pos, prefix + name + ".")
+                fields.extend(sub_fields)
+                name = None
+            elif c == ',' or c == ']':
+                if name:
+                    fields.append(prefix + name)
+                name = ""
+                if c == ']':
+                    if not prefix:
+                        raise ValueError("Selector '%s' has unbalanced ']'" % selector)
+                    return fields, pos
+            elif name is None:
+                raise ValueError("Selector '%s' has characters following ']'" % selector)
+            elif not c.isspace():
+                name += c
+
+        if prefix:
+            raise ValueError("Selector '%s' has unbalanced '['" % selector)
+        if name:
+            fields.append(prefix + name)
+        return fields, pos
+
+    return _parse(0, "")[0]
+
+
+def project(data, fields):
+    """
+    Reduce a sync object (or any structure of dicts and lists) to
+    just the given fields.  Each field is a dotted path such as
+    'osds.up': path components are applied to each element of any
+    list encountered on the way, so ['epoch', 'osds.osd', 'osds.up']
+    yields {'epoch': 1, 'osds': [{'osd': 0, 'up': 1}, ...]}.
+
+    ``fields`` may also be a selector string, see ``parse_selector``.
+
+    Paths that don't exist in the data are omitted from the result.
+    """
+    if isinstance(fields, basestring):
+        fields = parse_selector(fields)
+
+    # Nested dicts of path components, where None marks a field
+    # that was asked for in its entirety
+    tree = {}
+    for field in fields:
+        parts = field.split('.')
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part, {}) is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+
+    def _project(value, tree):
+        if tree is None:
+            return value
+        elif isinstance(value, list):
+            return [_project(v, tree) for v in value]
+        elif isinstance(value, dict):
+            result = {}
+            for k, subtree in tree.items():
+                if k in value:
+                    result[k] = _project(value[k], subtree)
+            return result
+        else:
+            return value
+
+    return _project(data, tree)
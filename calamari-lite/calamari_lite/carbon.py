@@ -0,0 +1,147 @@
+"""
+Receivers for the protocols that carbon clients (diamond, the minion-sim
+StatsSender) send stats with, feeding a TimeSeriesStore.
+"""
+
+import cPickle
+from cStringIO import StringIO
+import struct
+
+import gevent
+from gevent.pool import Pool
+from gevent.server import StreamServer
+
+from cthulhu.log import log
+
+
+PLAINTEXT_PORT = 2003
+PICKLE_PORT = 2004
+
+# Bytes to read from a plaintext connection at a time
+RECV_SIZE = 64 * 1024
+
+# Largest pickle batch in bytes to accept.  A connection sending anything
+# bigger is dropped rather than buffered.
+MAX_FRAME_SIZE = 1024 * 1024
+
+# A pickle frame is a 4-byte big-endian length, then a pickled list
+# of (path, (timestamp, value)) tuples
+FRAME_HEADER = struct.Struct('!L')
+
+
+def loads(data):
+    """
+    Unpickle a batch of datapoints, refusing anything that would import or
+    call code: the protocol only needs lists, tuples, strings and numbers.
+    """
+    unpickler = cPickle.Unpickler(StringIO(data))
+    unpickler.find_global = None
+    return unpickler.load()
+
+
+class Receiver(object):
+    """
+    Accepts connections on a port and feeds the datapoints they send into a store.
+
+    Each connection is handled one batch at a time, yielding to other
+    greenlets between batches, so a store that can't keep up leaves data waiting in the
+    socket buffers and TCP slows the senders down.  At most ``max_connections``
+    are handled at once; further connections wait to be accepted.
+    """
+    def __init__(self, store, address, max_connections=128):
+        self._store = store
+        self._server = StreamServer(address, self._handle, spawn=Pool(max_connections))
+
+    @property
+    def address(self):
+        return self._server.address
+
+    def start(self):
+        self._server.start()
+
+    def stop(self):
+        self._server.stop()
+
+    def _handle(self, socket, address):
+        try:
+            self.receive(socket, address)
+        except Exception:
+            log.exception("Error receiving stats from %s" % (address,))
+        finally:
+            socket.close()
+
+    def _ingest(self, datapoints, address):
+        update = self._store.update
+        for datapoint in datapoints:
+            try:
+                path, (timestamp, value) = datapoint
+                update(path, float(value), int(float(timestamp)))
+            except (TypeError, ValueError):
+                log.warn("Ignoring malformed datapoint from %s: %r" % (address, datapoint))
+
+    def receive(self, socket, address):
+        raise NotImplementedError()
+
+
+class PlaintextReceiver(Receiver):
+    """
+    Carbon's line protocol: "<path> <value> <timestamp>\\n"
+    """
+    def _parse(self, lines, address):
+        for line in lines:
+            try:
+                path, value, timestamp = line.split()
+            except ValueError:
+                if line.strip():
+                    log.warn("Ignoring malformed stat line from %s: %r" % (address, line))
+            else:
+                yield path, (timestamp, value)
+
+    def receive(self, socket, address):
+        remainder = ""
+        while True:
+            data = socket.recv(RECV_SIZE)
+            if not data:
+                break
+            lines = (remainder + data).split("\n")
+            remainder = lines.pop()
+            self._ingest(self._parse(lines, address), address)
+            gevent.sleep(0)
+
+        self._ingest(self._parse([remainder], address), address)
+
+
+class PickleReceiver(Receiver):
+    """
+    Carbon's pickle protocol, which sends datapoints in length-prefixed batches
+    """
+    def _read(self, socket, size):
+        chunks = []
+        while size:
+            data = socket.recv(size)
+            if not data:
+                return None
+            chunks.append(data)
+            size -= len(data)
+        return "".join(chunks)
+
+    def receive(self, socket, address):
+        while True:
+            header = self._read(socket, FRAME_HEADER.size)
+            if header is None:
+                break
+            size, = FRAME_HEADER.unpack(header)
+            if size > MAX_FRAME_SIZE:
+                log.error("Dropping connection from %s, sent a %s byte batch" % (address, size))
+                break
+            frame = self._read(socket, size)
+            if frame is None:
+                break
+
+            try:
+                datapoints = loads(frame)
+            except (cPickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+                log.error("Dropping connection from %s, sent an invalid batch" % (address,))
+                break
+            self._ingest(datapoints, address)
+            gevent.sleep(0)
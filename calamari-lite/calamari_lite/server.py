@@ -8,11 +8,12 @@ from django.core.servers.basehttp import get_internal_wsgi_application
 import gevent.event
 import gevent
 import signal
-from gevent.server import StreamServer
 import os
 from gevent.pywsgi import WSGIServer
 import zerorpc
 from calamari_common.config import CalamariConfig
+from calamari_lite.carbon import PlaintextReceiver, PickleReceiver, PLAINTEXT_PORT, PICKLE_PORT
+from calamari_lite.tsdb import TimeSeriesStore
 from cthulhu.log import log
 import sys
 from gevent.hub import Hub
@@ -21,6 +22,7 @@ config = CalamariConfig()
 
 TIMEOUT = 5  # seconds till we tick the cthulhu eventer
 SALT_RESET_PERIOD = 300  # seconds till we teardown/setup our salt_caller. Do this because it's leaking memory
+FLUSH_PERIOD = 60  # seconds between flushes of stats history to disk
 
 
 def patch_gevent_hub_error_handler():
@@ -54,36 +56,37 @@ ssl = {
 
 
 class ShallowCarbonCache(gevent.Greenlet):
+    """
+    Stands in for carbon and graphite: receives stats in carbon's plaintext
+    and pickle protocols, keeps them in a TimeSeriesStore, and serves queries on them over RPC.
+    """
     def __init__(self):
         super(ShallowCarbonCache, self).__init__()
         self.complete = gevent.event.Event()
-        self.latest = {}
+        self.store = TimeSeriesStore(config.getint('calamari_web', 'tsdb_resolution'),
+                                     config.getint('calamari_web', 'tsdb_retention'),
+                                     config.get('calamari_web', 'tsdb_path') or None)
 
         self.rpc = zerorpc.Server({
-            'get_latest': self.get_latest
+            'get_latest': self.get_latest,
+            'fetch': self.fetch,
+            'aggregate': self.aggregate,
+            'list_series': self.list_series
         })
 
         self.rpc_thread = None
 
     def get_latest(self, paths):
-        result = {}
-        import json
-        print json.dumps(self.latest, indent=2)
+        return self.store.get_latest(paths)
 
-        for path in paths:
-            i = self.latest
-            for p in path.split("."):
-                try:
-                    i = i[p]
-                except KeyError:
-                    break
+    def fetch(self, path, from_time, until_time):
+        return self.store.fetch(path, from_time, until_time)
 
-            if isinstance(i, float):
-                result[path] = i
-            else:
-                result[path] = None
+    def aggregate(self, path, from_time, until_time, method, window=None):
+        return self.store.aggregate(path, from_time, until_time, method, window)
 
-        return result
+    def list_series(self):
+        return self.store.list_series()
 
     def start(self):
         super(ShallowCarbonCache, self).start()
@@ -92,27 +95,16 @@ class ShallowCarbonCache(gevent.Greenlet):
         self.rpc_thread = gevent.spawn(lambda: self.rpc.run())
 
     def _run(self):
-        def stream_handle(socket, address):
-            f = socket.makefile()
-            while True:
-                line = f.readline()
-                if not line:
-                    break
-                else:
-                    stat, val, t = line.strip().split()
-                    stat_path = stat.split(".")
-                    i = self.latest
-                    for p in stat_path[:-1]:
-                        if p not in i:
-                            i[p] = {}
-                        i = i[p]
-
-                    i[stat_path[-1]] = float(val)
-
-        server = StreamServer(('0.0.0.0', 2003), stream_handle)
-        server.start()
-        self.complete.wait()
-        server.stop()
+        receivers = [PlaintextReceiver(self.store, ('0.0.0.0', PLAINTEXT_PORT)),
+                     PickleReceiver(self.store, ('0.0.0.0', PICKLE_PORT))]
+        for receiver in receivers:
+            receiver.start()
+        while not self.complete.is_set():
+            self.complete.wait(timeout=FLUSH_PERIOD)
+            self.store.flush()
+        for receiver in receivers:
+            receiver.stop()
+        self.store.close()
 
     def stop(self):
         self.complete.set()
@@ -151,7 +143,8 @@ def main():
             complete.wait(timeout=5)
 
     app = get_internal_wsgi_application()
-    wsgi = WSGIServer(('0.0.0.0', 8002), app, **ssl)
+    # Each request is a greenlet, so the REST API's change feed may hold them open
+    wsgi = WSGIServer(('0.0.0.0', 8002), app, environ={'calamari.long_poll': True}, **ssl)
     wsgi.start()
 
     def shutdown():
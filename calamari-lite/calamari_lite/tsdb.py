@@ -0,0 +1,219 @@
+"""
+A small embedded time series store, so that calamari-lite can keep some
+history of the stats that carbon would otherwise store in whisper files.
+"""
+
+import math
+import mmap
+import os
+import struct
+import urllib
+
+from cthulhu.log import log
+
+
+# Each point is an interval timestamp and a value.  A slot whose timestamp
+# isn't the one expected for its position holds no data for that time.
+POINT = struct.Struct('<qd')
+
+# Identifies a series file, and the resolution and number of points it was created with
+HEADER = struct.Struct('<8sII')
+MAGIC = 'CALTSDB1'
+
+SERIES_SUFFIX = '.tsdb'
+
+
+def _avg(values):
+    return sum(values) / len(values)
+
+
+AGGREGATES = {
+    'min': min,
+    'max': max,
+    'avg': _avg,
+    'sum': sum,
+    'last': lambda values: values[-1]
+}
+
+
+class Series(object):
+    """
+    A fixed-size ring buffer of points at a fixed resolution, in a bytearray
+    or an mmap'd file.  Writing a point overwrites whatever was in its slot
+    from one retention period ago.
+    """
+    def __init__(self, buf, resolution, points, empty=False):
+        self._buf = buf
+        self.resolution = resolution
+        self.points = points
+
+        # The most recent point, for get_latest
+        self.latest_time = None
+        self.latest_value = None
+        for i in range(0, 0 if empty else points):
+            t, value = POINT.unpack_from(buf, HEADER.size + i * POINT.size)
+            if t and (self.latest_time is None or t > self.latest_time):
+                self.latest_time, self.latest_value = t, value
+
+    @classmethod
+    def buffer_size(cls, points):
+        return HEADER.size + points * POINT.size
+
+    def _offset(self, t):
+        return HEADER.size + (t // self.resolution % self.points) * POINT.size
+
+    def update(self, value, timestamp):
+        t = int(timestamp) - int(timestamp) % self.resolution
+        if self.latest_time is not None and t <= self.latest_time - self.points * self.resolution:
+            # Older than anything kept, and its slot now belongs to a more recent point
+            return
+        POINT.pack_into(self._buf, self._offset(t), t, value)
+        if self.latest_time is None or t >= self.latest_time:
+            self.latest_time, self.latest_value = t, value
+
+    def fetch(self, from_time, until_time):
+        """
+        :return: ((start, end, step), values), where values has one entry per
+                 step from start up to end, None where there is no data.
+        """
+        step = self.resolution
+        until_time = int(until_time) - int(until_time) % step + step
+        from_time = max(int(from_time) - int(from_time) % step, until_time - self.points * step)
+
+        values = []
+        buf = self._buf
+        for t in range(from_time, until_time, step):
+            stored_t, value = POINT.unpack_from(buf, self._offset(t))
+            values.append(value if stored_t == t and not math.isnan(value) else None)
+        return (from_time, until_time, step), values
+
+    def flush(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.flush()
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+
+
+class TimeSeriesStore(object):
+    """
+    A set of Series, indexed by their dotted stat paths, all with the same
+    resolution and retention.
+
+    If ``path`` is set, each series lives in an mmap'd file in that directory,
+    so that history survives restarts.  Files written with a different resolution
+    or retention are started afresh.
+    """
+    def __init__(self, resolution, retention, path=None):
+        self.resolution = resolution
+        self.points = max(1, retention // resolution)
+        self.path = path
+
+        self._series = {}
+
+        if self.path:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            for filename in os.listdir(self.path):
+                if filename.endswith(SERIES_SUFFIX):
+                    self._open(urllib.unquote(filename[:-len(SERIES_SUFFIX)]))
+            log.info("TimeSeriesStore: loaded %s series from %s" % (len(self._series), self.path))
+
+    def _open(self, stat):
+        size = Series.buffer_size(self.points)
+        if not self.path:
+            buf = bytearray(size)
+        else:
+            filename = os.path.join(self.path, urllib.quote(stat, safe='') + SERIES_SUFFIX)
+            fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0644)
+            try:
+                existing = os.fstat(fd).st_size
+                if existing != size:
+                    if existing:
+                        log.warn("TimeSeriesStore: discarding %s, written with different retention" % filename)
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                buf = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+
+        magic, resolution, points = HEADER.unpack_from(buf, 0)
+        empty = (magic, resolution, points) != (MAGIC, self.resolution, self.points)
+        if empty:
+            if magic == MAGIC:
+                log.warn("TimeSeriesStore: discarding %s, written with resolution %s" % (stat, resolution))
+            buf[:] = '\0' * size
+            HEADER.pack_into(buf, 0, MAGIC, self.resolution, self.points)
+
+        # Interned, as the same paths turn up in every line that carbon clients send
+        stat = intern(stat)
+        series = self._series[stat] = Series(buf, self.resolution, self.points, empty)
+        return series
+
+    def update(self, stat, value, timestamp):
+        try:
+            series = self._series[stat]
+        except KeyError:
+            series = self._open(stat)
+        series.update(value, timestamp)
+
+    def get_latest(self, stats):
+        """
+        :return: A dict of stat path to its most recent value, or None if there is no such series
+        """
+        result = {}
+        for stat in stats:
+            series = self._series.get(stat)
+            result[stat] = series.latest_value if series is not None else None
+        return result
+
+    def fetch(self, stat, from_time, until_time):
+        """
+        The values of a series between two times, as whisper.fetch gives them
+
+        :return: ((start, end, step), values), or None if there is no such series
+        """
+        series = self._series.get(stat)
+        if series is None:
+            return None
+        return series.fetch(from_time, until_time)
+
+    def aggregate(self, stat, from_time, until_time, method, window=None):
+        """
+        Aggregate the values of a series in windows
+
+        :param method: One of AGGREGATES
+        :param window: Seconds per window, rounded down to a whole number of points,
+                       or None to aggregate the whole time range at once
+        :return: A list of (window start, aggregate value) pairs, with None for
+                 windows without data, or None if there is no such series
+        """
+        try:
+            aggregate = AGGREGATES[method]
+        except KeyError:
+            raise ValueError("Unknown aggregation method '%s'" % method)
+
+        fetched = self.fetch(stat, from_time, until_time)
+        if fetched is None:
+            return None
+        (start, end, step), values = fetched
+
+        window_points = max(1, window // step) if window else len(values)
+        result = []
+        for i in range(0, len(values), window_points):
+            window_values = [v for v in values[i:i + window_points] if v is not None]
+            result.append((start + i * step, aggregate(window_values) if window_values else None))
+        return result
+
+    def list_series(self):
+        return self._series.keys()
+
+    def flush(self):
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+        self._series = {}
@@ -0,0 +1,105 @@
+import cPickle
+import os
+
+import gevent
+from gevent import socket
+from django.utils.unittest import TestCase
+
+from calamari_lite import carbon
+from calamari_lite.carbon import PlaintextReceiver, PickleReceiver, FRAME_HEADER
+from calamari_lite.tsdb import TimeSeriesStore
+
+
+T = 1420070400
+
+
+class FakeSocket(object):
+    """
+    Gives back the data it was created with in the chunks given, however
+    much more the receiver asks for, to exercise reads that split lines and frames
+    """
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+
+    def recv(self, size):
+        if not self._chunks:
+            return ""
+        chunk = self._chunks.pop(0)
+        if len(chunk) > size:
+            self._chunks.insert(0, chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+
+def frame(datapoints, protocol=2):
+    data = cPickle.dumps(datapoints, protocol)
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+class ReceiverTest(TestCase):
+    def setUp(self):
+        self.store = TimeSeriesStore(60, 600)
+
+    def _values(self, stat):
+        return self.store.fetch(stat, T, T + 60)[1]
+
+
+class TestPlaintextReceiver(ReceiverTest):
+    def test_split_lines(self):
+        receiver = PlaintextReceiver(self.store, ('127.0.0.1', 0))
+        receiver.receive(FakeSocket([
+            "a.b 1.5 %s\na." % T,
+            "c 2 %s\n\nmalformed line\na.b 3" % T,
+            " %s" % (T + 60)
+        ]), ('127.0.0.1', 1234))
+
+        self.assertEqual(self._values('a.b'), [1.5, 3.0])
+        self.assertEqual(self._values('a.c'), [2.0, None])
+        self.assertEqual(sorted(self.store.list_series()), ['a.b', 'a.c'])
+
+    def test_connection(self):
+        receiver = PlaintextReceiver(self.store, ('127.0.0.1', 0))
+        receiver.start()
+        try:
+            conn = socket.create_connection(receiver.address)
+            conn.sendall("a.b 1 %s\na.b 2 %s\n" % (T, T + 60))
+            conn.close()
+            with gevent.Timeout(5):
+                while self.store.get_latest(['a.b'])['a.b'] != 2.0:
+                    gevent.sleep(0.01)
+        finally:
+            receiver.stop()
+        self.assertEqual(self._values('a.b'), [1.0, 2.0])
+
+
+class TestPickleReceiver(ReceiverTest):
+    def test_frames(self):
+        data = frame([('a.b', (T, 1.0)), ('a.c', (T, 2))]) + frame([('a.b', (T + 60, '3')), ('bad',)], protocol=0)
+        receiver = PickleReceiver(self.store, ('127.0.0.1', 0))
+        # Arriving a few bytes at a time, so that headers and frames are split across reads
+        receiver.receive(FakeSocket([data[i:i + 3] for i in range(0, len(data), 3)]), ('127.0.0.1', 1234))
+
+        self.assertEqual(self._values('a.b'), [1.0, 3.0])
+        self.assertEqual(self._values('a.c'), [2.0, None])
+
+    def test_oversize_frame(self):
+        data = frame([('a.b', (T, 1.0))])
+        conn = FakeSocket([FRAME_HEADER.pack(carbon.MAX_FRAME_SIZE + 1), data])
+        PickleReceiver(self.store, ('127.0.0.1', 0)).receive(conn, ('127.0.0.1', 1234))
+        # Dropped without reading the frame, or anything after it
+        self.assertEqual(conn.recv(1024), data)
+        self.assertEqual(self.store.list_series(), [])
+
+    def test_truncated_frame(self):
+        data = frame([('a.b', (T, 1.0))])
+        PickleReceiver(self.store, ('127.0.0.1', 0)).receive(FakeSocket([data[:-1]]), ('127.0.0.1', 1234))
+        self.assertEqual(self.store.list_series(), [])
+
+    def test_globals_refused(self):
+        for obj in [set([1]), os.system]:
+            self.assertRaises(cPickle.UnpicklingError, carbon.loads, cPickle.dumps(obj, 2))
+
+        # Such a batch drops the connection, and nothing in it is ingested
+        data = frame([('a.b', (T, 1.0)), ('a.c', (T, set([2])))]) + frame([('a.d', (T, 1.0))])
+        PickleReceiver(self.store, ('127.0.0.1', 0)).receive(FakeSocket([data]), ('127.0.0.1', 1234))
+        self.assertEqual(self.store.list_series(), [])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+
+from django.utils.unittest import TestCase
+
+from calamari_lite.tsdb import TimeSeriesStore, SERIES_SUFFIX
+
+
+# A time on an interval boundary, to keep the arithmetic below readable
+T = 1420070400
+STAT = 'ceph.cluster.abc.pool.0.num_objects'
+
+
+class TestTimeSeriesStore(TestCase):
+    def setUp(self):
+        # Ten points of one minute
+        self.store = TimeSeriesStore(60, 600)
+
+    def test_fetch(self):
+        self.store.update(STAT, 1.0, T)
+        self.store.update(STAT, 2.0, T + 61)
+        self.store.update(STAT, 4.0, T + 180)
+
+        (start, end, step), values = self.store.fetch(STAT, T, T + 180)
+        self.assertEqual((start, end, step), (T, T + 240, 60))
+        self.assertEqual(values, [1.0, 2.0, None, 4.0])
+
+        # Times that aren't on a boundary are rounded down to the interval they're in
+        self.assertEqual(self.store.fetch(STAT, T + 30, T + 90)[1], [1.0, 2.0])
+        self.assertEqual(self.store.fetch('nonexistent', T, T + 180), None)
+
+    def test_wrap(self):
+        for i in range(0, 15):
+            self.store.update(STAT, float(i), T + i * 60)
+
+        # Only the last retention period is kept, even if more is asked for
+        (start, end, step), values = self.store.fetch(STAT, T, T + 14 * 60)
+        self.assertEqual(start, T + 5 * 60)
+        self.assertEqual(values, [float(i) for i in range(5, 15)])
+        self.assertEqual(self.store.get_latest([STAT, 'nonexistent']), {STAT: 14.0, 'nonexistent': None})
+
+    def test_late_point(self):
+        self.store.update(STAT, 1.0, T + 600)
+
+        # A point from one retention period ago would go in the same slot
+        self.store.update(STAT, 0.5, T)
+        self.assertEqual(self.store.fetch(STAT, T + 600, T + 600)[1], [1.0])
+        self.assertEqual(self.store.get_latest([STAT])[STAT], 1.0)
+
+        # One that is late but still within the retention period is kept
+        self.store.update(STAT, 0.75, T + 60)
+        self.assertEqual(self.store.fetch(STAT, T + 60, T + 60)[1], [0.75])
+        self.assertEqual(self.store.get_latest([STAT])[STAT], 1.0)
+
+    def test_aggregate(self):
+        for i, value in enumerate([1.0, 3.0, None, 5.0, 7.0]):
+            if value is not None:
+                self.store.update(STAT, value, T + i * 60)
+
+        self.assertEqual(self.store.aggregate(STAT, T, T + 240, 'max'), [(T, 7.0)])
+        self.assertEqual(self.store.aggregate(STAT, T, T + 240, 'avg', 120),
+                         [(T, 2.0), (T + 120, 5.0), (T + 240, 7.0)])
+        # Windows are whole numbers of points, and empty ones have no value
+        self.assertEqual(self.store.aggregate(STAT, T, T + 240, 'sum', 90),
+                         [(T, 1.0), (T + 60, 3.0), (T + 120, None), (T + 180, 5.0), (T + 240, 7.0)])
+        self.assertEqual(self.store.aggregate('nonexistent', T, T + 240, 'min'), None)
+        self.assertRaises(ValueError, self.store.aggregate, STAT, T, T + 240, 'median')
+
+
+class TestPersistence(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, resolution, retention):
+        store = TimeSeriesStore(resolution, retention, self.path)
+        for i in range(0, 3):
+            store.update(STAT, float(i), T + i * 60)
+        store.flush()
+        store.close()
+
+    def test_reload(self):
+        self._write(60, 600)
+        self.assertEqual(os.listdir(self.path), [STAT + SERIES_SUFFIX])
+
+        store = TimeSeriesStore(60, 600, self.path)
+        self.assertEqual(store.list_series(), [STAT])
+        self.assertEqual(store.get_latest([STAT])[STAT], 2.0)
+        self.assertEqual(store.fetch(STAT, T, T + 120)[1], [0.0, 1.0, 2.0])
+        store.close()
+
+    def test_changed_resolution(self):
+        # Same number of points, so the same file size, but at a different resolution
+        self._write(60, 600)
+        store = TimeSeriesStore(30, 300, self.path)
+        self.assertEqual(store.get_latest([STAT])[STAT], None)
+        self.assertEqual(store.fetch(STAT, T, T + 120)[1], [None] * 5)
+        store.close()
+
+    def test_changed_retention(self):
+        self._write(60, 600)
+        store = TimeSeriesStore(60, 1200, self.path)
+        self.assertEqual(store.get_latest([STAT])[STAT], None)
+        store.update(STAT, 5.0, T)
+        self.assertEqual(store.fetch(STAT, T, T + 60)[1], [5.0, None])
+        store.close()
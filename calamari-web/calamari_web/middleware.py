@@ -1,3 +1,30 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class APIGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware for REST API responses (JSON and msgpack) only, and only
+    those of at least settings.GZIP_MIN_SIZE bytes, as compressing small bodies
+    costs more CPU than it saves in transfer.  Streamed responses are always
+    compressed, as they are only used for large bodies.
+
+    HTML is left alone: compressing pages that embed a CSRF token alongside
+    request-controlled content exposes the token to BREACH-style attacks.
+    """
+    CONTENT_TYPES = ('application/json', 'application/msgpack')
+
+    def process_response(self, request, response):
+        if not settings.GZIP_MIN_SIZE:
+            return response
+        if response.get('Content-Type', '').split(";")[0].strip() not in self.CONTENT_TYPES:
+            return response
+        if not response.streaming and len(response.content) < settings.GZIP_MIN_SIZE:
+            return response
+
+        return super(APIGZipMiddleware, self).process_response(request, response)
+
+
 class AngularCSRFRename(object):
     ANGULAR_HEADER_NAME = 'HTTP_X_XSRF_TOKEN'
 
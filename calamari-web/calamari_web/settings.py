@@ -108,7 +108,12 @@ TEMPLATE_LOADERS = (
 CSRF_COOKIE_NAME = "XSRF-TOKEN"
 SESSION_COOKIE_NAME = "calamari_sessionid"
 
+# Only REST API responses of at least this many bytes are gzipped, see APIGZipMiddleware
+GZIP_MIN_SIZE = config.getint('calamari_web', 'gzip_min_size')
+
 MIDDLEWARE_CLASSES = (
+    # First, so that it compresses the response after everything else is done with it
+    'calamari_web.middleware.APIGZipMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'calamari_web.middleware.AngularCSRFRename',
@@ -205,6 +210,13 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
         'calamari_rest.renderers.CalamariBrowsableAPIRenderer',
+        'calamari_rest.renderers.MsgPackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'calamari_rest.parsers.MsgPackParser',
     )
 }
 
@@ -23,6 +23,7 @@ from calamari_common.db.base import Base
 from cthulhu.persistence.sync_objects import SyncObject  # noqa
 from cthulhu.persistence.servers import Server, Service  # noqa
 from calamari_common.db.event import Event  # noqa
+from calamari_common.db.request import UserRequestRecord  # noqa
 
 import logging.config
 
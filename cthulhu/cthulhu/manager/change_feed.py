@@ -0,0 +1,117 @@
+from collections import deque
+import time
+import uuid
+
+import gevent.event
+
+from calamari_common.types import severity_str
+from cthulhu.log import log
+
+
+class ChangeFeed(object):
+    """
+    A bounded log of notifications about things that clients of the REST API
+    would otherwise have to poll for: new sync object versions, user request
+    state transitions and new events.  Clients wait on it with a ``since``
+    token, and then fetch only the resources that changed.
+
+    Notifications are small dicts, with a 'type' of 'sync_object', 'request'
+    or 'event'.  A token identifies a position in the log of this
+    particular ChangeFeed, so a token from before a cthulhu restart,
+    or one which has fallen off the end of the log, gets a reset rather
+    than a partial list of changes.
+    """
+    def __init__(self, size):
+        self._feed_id = uuid.uuid4().hex[:8]
+        # (sequence number, notification), oldest first
+        self._changes = deque(maxlen=size)
+        self._seq = 0
+        # Replaced on every append, so that waiters see it set even if
+        # more changes arrive before they wake up
+        self._appended = gevent.event.Event()
+
+    def _append(self, change):
+        self._seq += 1
+        self._changes.append((self._seq, change))
+        appended, self._appended = self._appended, gevent.event.Event()
+        appended.set()
+
+    def on_sync_object(self, fsid, sync_type, version):
+        self._append({'type': 'sync_object', 'fsid': fsid, 'sync_type': sync_type, 'version': version})
+
+    def on_request(self, request):
+        self._append({'type': 'request', 'fsid': request.fsid, 'id': request.id, 'state': request.state,
+                      'error': request.error})
+
+    def on_event(self, event):
+        change = {'type': 'event', 'severity': severity_str(event.severity), 'message': event.message,
+                  'when': event.when.isoformat()}
+        change.update(event.associations)
+        self._append(change)
+
+    def _token(self, seq):
+        return "%s-%s" % (self._feed_id, seq)
+
+    def _parse_token(self, token):
+        """
+        :return: The sequence number that ``token`` refers to, or None if it isn't a valid
+                 position in this feed
+        """
+        try:
+            feed_id, seq = token.split("-")
+            seq = int(seq)
+        except ValueError:
+            return None
+        if feed_id != self._feed_id or seq > self._seq:
+            return None
+        # Changes after seq must all still be in the log
+        if seq < self._seq and (not self._changes or seq < self._changes[0][0] - 1):
+            return None
+        return seq
+
+    def _since(self, seq, fsid):
+        latest = {}
+        changes = []
+        for change_seq, change in self._changes:
+            if change_seq <= seq or (fsid is not None and change.get('fsid') != fsid):
+                continue
+            if change['type'] == 'sync_object':
+                # Only the latest version of a sync object is interesting
+                key = (change['fsid'], change['sync_type'])
+                if key in latest:
+                    changes[latest[key]] = None
+                latest[key] = len(changes)
+            changes.append(change)
+        return [c for c in changes if c is not None]
+
+    def get(self, since, timeout, fsid=None):
+        """
+        Get the changes after ``since``, waiting for up to ``timeout`` seconds
+        for there to be some.
+
+        :param since: A token from a previous call, or None to just get a token for now
+        :param fsid: Optionally, only get the changes relating to this cluster
+        :return: A dict with 'since', the token to pass next time, 'reset', True if
+                 ``since`` was not recognised so the client must assume that everything
+                 changed, and 'changes', the list of notifications
+        """
+        if since is None:
+            return {'since': self._token(self._seq), 'reset': False, 'changes': []}
+
+        seq = self._parse_token(since)
+        if seq is None:
+            log.debug("ChangeFeed: resetting client with token %s" % since)
+            return {'since': self._token(self._seq), 'reset': True, 'changes': []}
+
+        deadline = time.time() + timeout
+        changes = self._since(seq, fsid)
+        while not changes:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not self._appended.wait(timeout=remaining):
+                break
+            if self._parse_token(since) is None:
+                # So much happened while waiting that some of it has been forgotten
+                return {'since': self._token(self._seq), 'reset': True, 'changes': []}
+            changes = self._since(seq, fsid)
+
+        return {'since': self._token(self._seq), 'reset': False, 'changes': changes}
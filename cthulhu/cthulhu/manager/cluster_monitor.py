@@ -13,15 +13,20 @@ from cthulhu.log import log
 from cthulhu.manager.crush_node_request_factory import CrushNodeRequestFactory
 from cthulhu.manager.crush_rule_request_factory import CrushRuleRequestFactory
 from cthulhu.manager.crush_request_factory import CrushRequestFactory
+from cthulhu.manager.df_stats import DfStats
+from cthulhu.manager.health_counters import HealthCounters
+from cthulhu.manager.osd_index import OsdIndex
 from cthulhu.manager.osd_request_factory import OsdRequestFactory
+from cthulhu.manager.pool_index import PoolIndex
 from cthulhu.manager.pool_request_factory import PoolRequestFactory
 from cthulhu.manager.plugin_monitor import PluginMonitor
-from calamari_common.types import CRUSH_NODE, CRUSH_RULE, CRUSH_MAP, SYNC_OBJECT_STR_TYPE, SYNC_OBJECT_TYPES, OSD, POOL, OsdMap, MdsMap, MonMap, MonStatus
+from calamari_common.types import CRUSH_NODE, CRUSH_RULE, CRUSH_MAP, SYNC_OBJECT_STR_TYPE, SYNC_OBJECT_TYPES, OSD, POOL, OsdMap, MdsMap, MonMap, MonStatus, PgSummary
 from cthulhu.util import now
 
 remote = get_remote()
 
 FAVORITE_TIMEOUT_FACTOR = int(config.get('cthulhu', 'favorite_timeout_factor'))
+DF_STATS_PERIOD = int(config.get('cthulhu', 'df_stats_period'))
 
 
 class ClusterUnavailable(Exception):
@@ -160,7 +165,7 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
     another to listen to user requests.
     """
 
-    def __init__(self, fsid, cluster_name, persister, servers, eventer, requests):
+    def __init__(self, fsid, cluster_name, persister, servers, eventer, requests, snapshots=None, changes=None):
         super(ClusterMonitor, self).__init__()
 
         self.fsid = fsid
@@ -171,6 +176,8 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
         self._servers = servers
         self._eventer = eventer
         self._requests = requests
+        self._snapshots = snapshots
+        self._changes = changes
 
         # Which mon we are currently using for running requests,
         # identified by minion ID
@@ -182,6 +189,18 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
 
         self._sync_objects = SyncObjects(self.name)
 
+        # The OsdIndex most recently built, and the state it was built from
+        self._osd_index = None
+        self._osd_index_key = None
+        self._pool_index = None
+        self._pool_index_key = None
+
+        # Updated as sync objects arrive rather than when asked for
+        self._health_counters = HealthCounters()
+
+        # Collected periodically from our favourite mon
+        self._df_stats = DfStats(self.fsid, self.name, DF_STATS_PERIOD)
+
         self._request_factories = {
             CRUSH_MAP: CrushRequestFactory,
             CRUSH_NODE: CrushNodeRequestFactory,
@@ -219,7 +238,68 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
         """
         return self._sync_objects.get(object_type)
 
+    @nosleep
+    def get_health_counters(self):
+        """
+        :returns: The counters dict of our HealthCounters, up to date with the latest sync objects
+        """
+        return self._health_counters.counters
+
+    @nosleep
+    def get_df_stats(self):
+        """
+        :returns: The most recently collected cluster and pool stats, and when they were collected
+        """
+        return self._df_stats.get()
+
+    @nosleep
+    def refresh_df_stats(self):
+        """
+        Collect the cluster and pool stats now, rather than waiting for them to be due
+
+        :returns: An Event that is set when the collection completes, or None if
+                  there is no mon to collect them from
+        """
+        if self._favorite_mon is None:
+            return None
+        return self._df_stats.refresh(self._favorite_mon)
+
+    @nosleep
+    def get_osd_index(self):
+        """
+        :returns: an OsdIndex of the current OsdMap, PgSummary and server state,
+                  rebuilt only if any of those have changed since the last call
+        """
+        osd_map = self._sync_objects.get(OsdMap)
+        pg_summary = self._sync_objects.get(PgSummary)
+        key = (osd_map.version, pg_summary.version, self._servers.generation)
+        if key != self._osd_index_key:
+            log.debug("Building OSD index for %s" % (key,))
+            self._osd_index = OsdIndex(self.fsid, osd_map, pg_summary.data, self._servers,
+                                       self.get_valid_commands(OSD, osd_map.osds_by_id.keys()))
+            self._osd_index_key = key
+        return self._osd_index
+
+    @nosleep
+    def get_pool_index(self):
+        """
+        :returns: a PoolIndex of the current OsdMap and PgSummary, rebuilt
+                  only if either has changed since the last call
+        """
+        osd_map = self._sync_objects.get(OsdMap)
+        pg_summary = self._sync_objects.get(PgSummary)
+        key = (osd_map.version, pg_summary.version)
+        if key != self._pool_index_key:
+            self._pool_index = PoolIndex(osd_map, pg_summary.data)
+            self._pool_index_key = key
+        return self._pool_index
+
     def on_job_complete(self, fqdn, jid, success, result, cmd, args):
+        if cmd == 'ceph.get_df_stats' and jid == self._df_stats.jid:
+            # Recognised by JID rather than FSID, so that failures are noticed too
+            self._df_stats.on_job_complete(success, result)
+            return
+
         # It would be much nicer to put the FSID at the start of
         # the tag, if salt would only let us add custom tags to our jobs.
         # Instead we enforce a convention that calamari jobs include
@@ -306,6 +386,8 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
 
         self.update_time = datetime.datetime.utcnow().replace(tzinfo=utc)
 
+        self._df_stats.tick(minion_id)
+
         log.debug('Checking for version increments in heartbeat from %s' % minion_id)
         for sync_type in SYNC_OBJECT_TYPES:
             self._sync_objects.on_version(
@@ -329,8 +411,33 @@ class ClusterMonitor(gevent.greenlet.Greenlet):
 
             self._eventer.on_sync_object(self.fsid, sync_type, new_object, old_object)
 
+            self._health_counters.on_sync_object(sync_type, data)
+
+            self._publish_snapshot(sync_type, new_object)
+
+            if self._changes is not None:
+                self._changes.on_sync_object(self.fsid, sync_type.str, new_object.version)
+
         return new_object
 
+    def _publish_snapshot(self, sync_type, sync_object):
+        if self._snapshots is not None:
+            try:
+                self._snapshots.publish(self.fsid, sync_type.str, sync_object.version, sync_object.data)
+            except (IOError, OSError):
+                log.exception("Failed to publish snapshot of %s/%s" % (self.fsid, sync_type.str))
+
+    @nosleep
+    def refresh_snapshots(self):
+        """
+        Publish the sync objects we have again, so that the REST API can
+        tell that they are still current.
+        """
+        for sync_type in SYNC_OBJECT_TYPES:
+            sync_object = self._sync_objects.get(sync_type)
+            if sync_object.version is not None:
+                self._publish_snapshot(sync_type, sync_object)
+
     @nosleep
     def on_sync_object(self, minion_id, data):
         if minion_id != self._favorite_mon:
@@ -0,0 +1,252 @@
+"""
+Merging of the RADOS commands of several UserRequests into one remote job.
+
+Requests for a cluster are held for MERGE_WINDOW seconds after the first
+of them arrives, then started in the order they were submitted.  Consecutive
+requests are run as one ceph.rados_commands job when:
+
+ - they are all ``batchable``, i.e. a single rados_commands job is all they
+   need to start
+ - every one of their commands is in the table in ``command_targets``, so
+   we know which objects it acts on
+ - no two of them act on the same object: two changes to one pool (say a
+   delete and an update) are never run in the same job, nor are a change to
+   an OSD and a scrub of it.
+
+Anything else, like a replacement of the CRUSH map, runs in a job of its own.
+
+Jobs are started in the order of the requests in them, and a job is not
+started while an earlier job acting on any of the same objects is still
+running, so that two changes to one pool are applied in the order they were
+requested.  A job whose objects aren't known waits for, and is waited for by,
+every other.  A request stays in the way of later ones until its commands
+have run, including when an earlier request in the same job failed, and it
+has to run them again in a job of its own.
+"""
+
+import gevent
+
+from calamari_common.remote import get_remote
+from cthulhu.log import log
+from cthulhu.manager import config
+from cthulhu.util import now
+
+remote = get_remote()
+
+
+# Seconds to hold requests for, so that others may be merged with them.  0 starts
+# each request straight away, as it is submitted.
+MERGE_WINDOW = config.getfloat('cthulhu', 'request_merge_window')
+
+# Most requests to run in one job
+MAX_BATCH_SIZE = 32
+
+
+def command_targets(prefix, args):
+    """
+    The objects that a command acts on
+
+    :return: A set of (kind, name) tuples, or None if the command is not one
+             that may be merged with others
+    """
+    if prefix == 'osd pool rename':
+        return {('pool', args['srcpool']), ('pool', args['destpool'])}
+    elif prefix in ('osd pool create', 'osd pool delete', 'osd pool set', 'osd pool set-quota'):
+        return {('pool', args['pool'])}
+    elif prefix in ('osd in', 'osd out', 'osd down'):
+        return set(('osd', int(osd_id)) for osd_id in args['ids'])
+    elif prefix == 'osd reweight':
+        return {('osd', int(args['id']))}
+    elif prefix in ('osd scrub', 'osd deep-scrub', 'osd repair'):
+        return {('osd', int(args['who']))}
+    elif prefix in ('osd set', 'osd unset'):
+        return {('flag', args['key'])}
+    else:
+        # e.g. CRUSH changes, which may touch anything in the map
+        return None
+
+
+def request_targets(request):
+    """
+    The objects that all of a request's commands act on, or None if it may
+    not be merged with others
+    """
+    if not request.batchable:
+        return None
+
+    targets = set()
+    for prefix, args in request.commands:
+        found = command_targets(prefix, args)
+        if found is None:
+            return None
+        targets |= found
+    return targets
+
+
+def batch_targets(requests):
+    """
+    The objects that a batch of requests act on, or None if they aren't known
+    """
+    targets = set()
+    for request in requests:
+        found = request_targets(request)
+        if found is None:
+            return None
+        targets |= found
+    return targets
+
+
+def conflict(targets, other_targets):
+    """
+    Whether two jobs acting on these objects must be run one after the other
+    """
+    return targets is None or other_targets is None or bool(targets & other_targets)
+
+
+def plan_batches(requests):
+    """
+    Divide requests into the jobs to run them in
+
+    :param requests: Requests in the order they were submitted
+    :return: A list of lists of requests, one for each job in the order to start them
+    """
+    batches = []
+    batch = None
+    batch_targets = None
+    for request in requests:
+        targets = request_targets(request)
+        if (batch is not None and batch_targets is not None and targets is not None and
+                not targets & batch_targets and len(batch) < MAX_BATCH_SIZE):
+            batch.append(request)
+            batch_targets |= targets
+        else:
+            batch = [request]
+            batch_targets = targets
+            batches.append(batch)
+
+    return batches
+
+
+class CommandBatch(object):
+    """
+    A ceph.rados_commands job running the commands of several requests, one
+    request after another.  Each request's jid is set to that of the job.
+    """
+    def __init__(self, requests):
+        self.requests = requests
+        self.jid = None
+        self.alive_at = None
+
+    @property
+    def minion_id(self):
+        return self.requests[0].minion_id
+
+    def submit(self):
+        first = self.requests[0]
+        commands = []
+        for request in self.requests:
+            commands.extend(request.commands)
+
+        self.jid = remote.run_job(self.minion_id, 'ceph.rados_commands',
+                                  {'fsid': first.fsid,
+                                   'cluster_name': first.cluster_name,
+                                   'commands': commands})
+        self.alive_at = now()
+        log.info("Started job %s for requests %s" % (self.jid, ", ".join(r.id for r in self.requests)))
+
+        for request in self.requests:
+            request.jid = self.jid
+            request.alive_at = self.alive_at
+
+    def split(self, success, result):
+        """
+        Divide the result of the job between its requests, as if each had run
+        its commands in a job of its own.
+
+        :return: A list of (request, result) tuples.  The result is None for requests
+                 whose commands didn't run, because those of an earlier request failed.
+        """
+        if not success or not isinstance(result, dict):
+            # Failed before running any commands, or the handler raised an exception
+            return [(request, result) for request in self.requests]
+
+        ran = len(result['results'])
+        split = []
+        offset = 0
+        for request in self.requests:
+            end = offset + len(request.commands)
+            if not result['error'] or end <= ran:
+                split.append((request, dict(result, error=False, error_status='',
+                                            results=result['results'][offset:end])))
+            elif offset <= ran:
+                split.append((request, dict(result, results=result['results'][offset:ran])))
+            else:
+                split.append((request, None))
+            offset = end
+
+        return split
+
+
+class CommandScheduler(object):
+    """
+    Holds the requests for one cluster for MERGE_WINDOW seconds after the
+    first arrives, then passes them to ``start`` in batches to run in one job
+    each, once no earlier job acting on the same objects is still running.
+    """
+    def __init__(self, start):
+        """
+        :param start: Callable taking a list of requests to run in one job
+        """
+        self._start = start
+        self._queue = []
+        self._timer = None
+
+        # Batches waiting for earlier conflicting ones, in order: (requests, targets)
+        self._pending = []
+        # Request ID to the targets of the batch it started in, until its commands have run
+        self._running = {}
+
+    def add(self, request):
+        self._queue.append(request)
+        if self._timer is None:
+            self._timer = gevent.spawn_later(MERGE_WINDOW, self._flush)
+
+    def flush(self):
+        """
+        Start the held requests now
+        """
+        if self._timer is not None:
+            self._timer.kill(block=False)
+        self._flush()
+
+    def finished(self, request):
+        """
+        Called when a request's commands have run, or it has given up on running them,
+        to start any held requests that were waiting for it
+        """
+        if request.id in self._running:
+            del self._running[request.id]
+            self._dispatch()
+
+    def _flush(self):
+        self._timer = None
+        queue, self._queue = self._queue, []
+        self._pending.extend((batch, batch_targets(batch)) for batch in plan_batches(queue))
+        self._dispatch()
+
+    def _dispatch(self):
+        # Anything running, or ahead in the queue, holds up later batches that conflict with it
+        ahead = list(self._running.values())
+        ready = []
+        pending, self._pending = self._pending, []
+        for requests, targets in pending:
+            if any(conflict(targets, other) for other in ahead):
+                self._pending.append((requests, targets))
+            else:
+                ready.append(requests)
+                for request in requests:
+                    self._running[request.id] = targets
+            ahead.append(targets)
+
+        for requests in ready:
+            self._start(requests)
@@ -0,0 +1,140 @@
+import datetime
+
+import gevent.event
+
+from calamari_common.remote import get_remote, Unavailable
+from cthulhu.log import log
+from cthulhu.util import now
+
+remote = get_remote()
+
+
+# Fields of a pool's 'pg dump' stat_sum, and the names that librados'
+# ioctx.get_stats() gives them, which the REST API has always presented
+POOL_STAT_FIELDS = {
+    'num_bytes': 'num_bytes',
+    'num_objects': 'num_objects',
+    'num_object_clones': 'num_object_clones',
+    'num_object_copies': 'num_object_copies',
+    'num_objects_missing_on_primary': 'num_objects_missing_on_primary',
+    'num_objects_unfound': 'num_objects_unfound',
+    'num_objects_degraded': 'num_objects_degraded',
+    'num_read': 'num_rd',
+    'num_read_kb': 'num_rd_kb',
+    'num_write': 'num_wr',
+    'num_write_kb': 'num_wr_kb'
+}
+
+
+def parse_df_stats(df, pg_pools):
+    """
+    Convert the output of 'df detail' and 'pg dump pools' into the cluster and
+    pool stats that librados' get_cluster_stats() and ioctx.get_stats() would give
+
+    :return: 2-tuple of cluster stats dict, list of pool stats dicts in order of pool ID
+    """
+    sums_by_id = dict((p['poolid'], p['stat_sum']) for p in pg_pools)
+
+    pools = []
+    for df_pool in sorted(df['pools'], key=lambda p: p['id']):
+        stat_sum = sums_by_id.get(df_pool['id'], {})
+        stats = dict((name, stat_sum.get(field, 0)) for field, name in POOL_STAT_FIELDS.items())
+        stats['num_kb'] = (stats['num_bytes'] + 1023) // 1024
+        stats['name'] = df_pool['name']
+        stats['id'] = df_pool['id']
+        pools.append(stats)
+
+    totals = df['stats']
+    if 'total_bytes' in totals:
+        cluster = {
+            'kb': totals['total_bytes'] // 1024,
+            'kb_used': totals['total_used_bytes'] // 1024,
+            'kb_avail': totals['total_avail_bytes'] // 1024
+        }
+    else:
+        # Before Hammer, df gave totals in kB
+        cluster = {
+            'kb': totals['total_space'],
+            'kb_used': totals['total_used'],
+            'kb_avail': totals['total_avail']
+        }
+    cluster['num_objects'] = totals.get('total_objects', sum(p['num_objects'] for p in pools))
+
+    return cluster, pools
+
+
+class DfStats(object):
+    """
+    The space and I/O stats of a cluster and its pools, collected with one
+    job on a mon every ``period`` seconds rather than on every request for them.
+    """
+    def __init__(self, fsid, cluster_name, period):
+        self._fsid = fsid
+        self._cluster_name = cluster_name
+        self._period = datetime.timedelta(seconds=period)
+
+        # The collection job in progress, if any
+        self.jid = None
+        self._started_at = None
+
+        self.cluster = None
+        self.pools = []
+        self.updated = None
+
+        # Replaced after each collection, so that anyone waiting for
+        # a refresh sees it set
+        self._collected = gevent.event.Event()
+
+    def _in_progress(self):
+        # A job that never reports back shouldn't prevent collecting again
+        return self.jid is not None and now() - self._started_at < self._period
+
+    def tick(self, minion_id):
+        """
+        Collect the stats from ``minion_id`` if they're due
+        """
+        if not self._in_progress() and (self.updated is None or now() - self.updated >= self._period):
+            self.refresh(minion_id)
+
+    def refresh(self, minion_id):
+        """
+        Collect the stats from ``minion_id`` now, unless a collection is already in progress
+
+        :return: An Event that is set when the collection completes
+        """
+        collected = self._collected
+        if self._in_progress():
+            return collected
+
+        try:
+            jid = remote.run_job(minion_id, 'ceph.get_df_stats',
+                                 {'fsid': self._fsid, 'cluster_name': self._cluster_name})
+        except Unavailable:
+            log.error("Failed to start df stats job on %s" % minion_id)
+        else:
+            log.debug("DfStats.refresh: jid=%s" % jid)
+            self.jid = jid
+            self._started_at = now()
+        return collected
+
+    def on_job_complete(self, success, result):
+        self.jid = None
+        if not success:
+            log.error("Failed to collect df stats: %s" % result)
+        else:
+            try:
+                self.cluster, self.pools = parse_df_stats(result['df'], result['pg_pools'])
+            except (KeyError, TypeError):
+                log.exception("Failed to parse df stats")
+            else:
+                self.updated = now()
+
+        collected, self._collected = self._collected, gevent.event.Event()
+        collected.set()
+
+    def get(self):
+        return {
+            'updated': self.updated.isoformat() if self.updated is not None else None,
+            'cluster': self.cluster,
+            'pools': self.pools
+        }
@@ -126,7 +126,9 @@ class Eventer(gevent.greenlet.Greenlet):
         """
         log.info("Eventer._emit: %s/%s" % (severity_str(severity), message))
 
-        self._events.append(Event(severity, message, **associations))
+        event = Event(severity, message, **associations)
+        self._events.append(event)
+        self._manager.changes.on_event(event)
 
     def on_user_request_begin(self, request):
         self._emit(INFO, "Started: %s" % request.headline, **request.associations)
@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+from calamari_common.types import OsdMap, MdsMap, MonStatus, PgSummary
+
+
+CRIT_STATES = set(['stale', 'down', 'peering', 'inconsistent', 'incomplete', 'inactive'])
+WARN_STATES = set(['creating', 'recovery_wait', 'recovering', 'replay',
+                   'splitting', 'degraded', 'remapped', 'scrubbing', 'repair',
+                   'wait_backfill', 'backfilling', 'backfill_toofull'])
+OKAY_STATES = set(['active', 'clean'])
+
+
+def _counter(count, states):
+    return {
+        'count': count,
+        'states': states
+    }
+
+
+def calculate_mon_counters(mon_status):
+    quorum = set(mon_status['quorum'])
+    ok, warn, crit = 0, 0, 0
+    for mon in mon_status['monmap']['mons']:
+        if mon['rank'] in quorum:
+            ok += 1
+        # TODO: use 'have we had a salt heartbeat recently' here instead
+        # elif self.try_mon_connect(mon):
+        #    warn += 1
+        else:
+            crit += 1
+    return {
+        'ok': _counter(ok, {} if ok == 0 else {'in': ok}),
+        'warn': _counter(warn, {} if warn == 0 else {'up': warn}),
+        'critical': _counter(crit, {} if crit == 0 else {'out': crit})
+    }
+
+
+def _pg_counter_helper(states, classifier, count, stats):
+    matched_states = classifier.intersection(states)
+    if len(matched_states) > 0:
+        stats[0] += count
+        for state in matched_states:
+            stats[1][state] += count
+        return True
+    return False
+
+
+def calculate_pg_counters(pg_summary):
+    # Although the mon already has a copy of this (in 'status' output),
+    # it's such a simple thing to recalculate here and simplifies our
+    # sync protocol.
+    all_states = CRIT_STATES | WARN_STATES | OKAY_STATES
+
+    ok, warn, crit = [[0, defaultdict(int)] for _ in range(3)]
+    for state_name, count in pg_summary['all'].items():
+        states = [s.lower() for s in state_name.split("+")]
+        if _pg_counter_helper(states, CRIT_STATES, count, crit):
+            pass
+        elif _pg_counter_helper(states, WARN_STATES, count, warn):
+            pass
+        elif _pg_counter_helper(states, OKAY_STATES, count, ok):
+            pass
+        else:
+            # Uncategorised state, assume it's critical.  This shouldn't usually
+            # happen, but want to avoid breaking if ceph adds a state.
+            crit[0] += count
+            for state in states:
+                if state not in all_states or state in CRIT_STATES:
+                    crit[1][state] += count
+
+    return {
+        'ok': _counter(ok[0], dict(ok[1])),
+        'warn': _counter(warn[0], dict(warn[1])),
+        'critical': _counter(crit[0], dict(crit[1]))
+    }
+
+
+def calculate_osd_counters(osd_map):
+    osds = osd_map['osds']
+    counters = {
+        'not_up_not_in': 0,
+        'not_up_in': 0,
+        'up_not_in': 0,
+        'up_in': 0
+    }
+    for osd in osds:
+        up, inn = osd['up'], osd['in']
+        if not up and not inn:
+            counters['not_up_not_in'] += 1
+        elif not up and inn:
+            counters['not_up_in'] += 1
+        elif up and not inn:
+            counters['up_not_in'] += 1
+        else:
+            counters['up_in'] += 1
+
+    warn_count = counters['up_not_in'] + counters['not_up_in']
+    warn_states = {}
+    if counters['up_not_in'] > 0:
+        warn_states['up/out'] = counters['up_not_in']
+    if counters['not_up_in'] > 0:
+        warn_states['down/in'] = counters['not_up_in']
+    return {
+        'ok': _counter(counters['up_in'], {} if counters['up_in'] == 0 else {'up/in': counters['up_in']}),
+        'warn': _counter(warn_count, warn_states),
+        'critical': _counter(counters['not_up_not_in'],
+                             {} if counters['not_up_not_in'] == 0 else {'down/out': counters['not_up_not_in']})
+    }
+
+
+def calculate_mds_counters(mds_map):
+    up = len(mds_map['up'])
+    inn = len(mds_map['in'])
+    total = len(mds_map['info'])
+    return {
+        'total': total,
+        'up_in': inn,
+        'up_not_in': up - inn,
+        'not_up_not_in': total - up,
+    }
+
+
+class HealthCounters(object):
+    """
+    The summary counts of OSDs, MDSs, mons and PGs by health that the v1
+    health_counters resource presents.  Each section depends on only
+    one sync object, so it is recalculated when that object changes rather than
+    when someone asks for the counters.
+    """
+    SECTIONS = {
+        OsdMap: ('osd', calculate_osd_counters),
+        MdsMap: ('mds', calculate_mds_counters),
+        MonStatus: ('mon', calculate_mon_counters),
+        PgSummary: ('pg', calculate_pg_counters)
+    }
+
+    # What the counters are calculated from until a cluster reports its sync objects
+    EMPTY = {
+        OsdMap: {'osds': []},
+        MdsMap: {'up': {}, 'in': [], 'info': {}},
+        MonStatus: {'quorum': [], 'monmap': {'mons': []}},
+        PgSummary: {'all': {}}
+    }
+
+    def __init__(self):
+        self.counters = {}
+        for sync_type, data in self.EMPTY.items():
+            self.on_sync_object(sync_type, data)
+
+    def on_sync_object(self, sync_type, data):
+        """
+        Recalculate the section depending on ``sync_type``, if any, from its new data
+        """
+        try:
+            section, calculate = self.SECTIONS[sync_type]
+        except KeyError:
+            return
+        self.counters[section] = calculate(data if data is not None else self.EMPTY[sync_type])
@@ -22,9 +22,11 @@ except ImportError:
 
 
 from calamari_common.remote import get_remote
+from calamari_common.snapshot import SnapshotWriter
 from cthulhu.log import log
 import cthulhu.log
 from cthulhu.util import Ticker
+from cthulhu.manager.change_feed import ChangeFeed
 from cthulhu.manager.cluster_monitor import ClusterMonitor
 from cthulhu.manager.eventer import Eventer
 from cthulhu.manager.request_collection import RequestCollection
@@ -44,6 +46,9 @@ Persister = None
 Service = None
 Server = None
 
+EVENT_PRUNE_PERIOD = int(config.get('cthulhu', 'event_prune_period'))
+SNAPSHOT_REFRESH_PERIOD = config.getint('cthulhu', 'snapshot_max_age') / 2.0
+
 # Manhole module optional for debugging.
 try:
     import manhole
@@ -182,11 +187,27 @@ class Manager(object):
 
             self.persister = NullPersister()
 
+        # Publish sync objects for the REST API to read without RPCs
+        snapshot_path = config.get('cthulhu', 'snapshot_path')
+        if snapshot_path:
+            self.snapshots = SnapshotWriter(snapshot_path)
+            self.snapshots.clear()
+        else:
+            self.snapshots = None
+        self._snapshot_ticker = Ticker(SNAPSHOT_REFRESH_PERIOD, lambda: self._refresh_snapshots())
+
+        # Notifications for REST API clients waiting for things to change
+        self.changes = ChangeFeed(config.getint('cthulhu', 'change_feed_size'))
+
         # Remote operations
         self.requests = RequestCollection(self)
         self._request_ticker = Ticker(request_collection.TICK_PERIOD,
                                       lambda: self.requests.tick())
 
+        # Expire old events from the database
+        self._event_prune_ticker = Ticker(EVENT_PRUNE_PERIOD,
+                                          lambda: self.persister.prune_events())
+
         # FSID to ClusterMonitor
         self.clusters = {}
 
@@ -205,9 +226,16 @@ class Manager(object):
         victim.stop()
         victim.done.wait()
         del self.clusters[fs_id]
+        if self.snapshots is not None:
+            self.snapshots.delete_cluster(fs_id)
 
         self._expunge(fs_id)
 
+    def _refresh_snapshots(self):
+        if self.snapshots is not None:
+            for monitor in self.clusters.values():
+                monitor.refresh_snapshots()
+
     def stop(self):
         log.info("%s stopping" % self.__class__.__name__)
         for monitor in self.clusters.values():
@@ -217,6 +245,12 @@ class Manager(object):
         self._process_monitor.stop()
         self.eventer.stop()
         self._request_ticker.stop()
+        self._event_prune_ticker.stop()
+        self._snapshot_ticker.stop()
+
+        # Once we're gone, the REST API must not go on serving what we published
+        if self.snapshots is not None:
+            self.snapshots.clear()
 
     def _expunge(self, fsid):
         if sqlalchemy is None:
@@ -260,7 +294,7 @@ class Manager(object):
         fsids = [(row[0], row[1]) for row in session.query(SyncObject.fsid, SyncObject.cluster_name).distinct(SyncObject.fsid)]
         for fsid, name in fsids:
             cluster_monitor = ClusterMonitor(fsid, name, self.persister, self.servers,
-                                             self.eventer, self.requests)
+                                             self.eventer, self.requests, self.snapshots, self.changes)
             self.clusters[fsid] = cluster_monitor
 
             object_types = [row[0] for row in session.query(SyncObject.sync_type).filter_by(fsid=fsid).distinct()]
@@ -303,6 +337,8 @@ class Manager(object):
         self.persister.start()
         self.eventer.start()
         self._request_ticker.start()
+        self._event_prune_ticker.start()
+        self._snapshot_ticker.start()
 
         self.servers.start()
         return True
@@ -315,6 +351,8 @@ class Manager(object):
         self.persister.join()
         self.eventer.join()
         self._request_ticker.join()
+        self._event_prune_ticker.join()
+        self._snapshot_ticker.join()
         self.servers.join()
         for monitor in self.clusters.values():
             monitor.join()
@@ -322,7 +360,8 @@ class Manager(object):
     def on_discovery(self, minion_id, heartbeat_data):
         log.info("on_discovery: {0}/{1}".format(minion_id, heartbeat_data['fsid']))
         cluster_monitor = ClusterMonitor(heartbeat_data['fsid'], heartbeat_data['name'],
-                                         self.persister, self.servers, self.eventer, self.requests)
+                                         self.persister, self.servers, self.eventer, self.requests,
+                                         self.snapshots, self.changes)
         self.clusters[heartbeat_data['fsid']] = cluster_monitor
 
         # Run before passing on the heartbeat, because otherwise the
@@ -388,3 +427,5 @@ def main():
 
     while not complete.is_set():
         complete.wait(timeout=1)
+
+    m.stop()
@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from calamari_common.types import NotFound, ServiceId, OSD, POOL
+from cthulhu.log import log
+
+
+# Fields of the OSD metadata reported by the salt module, and the names
+# that they go by in an OSD row
+OSD_METADATA_FIELDS = {
+    'backend_device_node': 'backend_filestore_dev_node',
+    'backend_partition_path': 'backend_filestore_partition_path',
+    'osd_data': 'osd_data',
+    'osd_journal': 'osd_journal'
+}
+
+
+class OsdIndex(object):
+    """
+    The OSDs of a cluster as the REST API presents them: each OSD map entry
+    enriched with its CRUSH reweight, ancestry and device class, pools, metadata,
+    valid commands, server and PG states.  Built once for a particular combination of OsdMap,
+    PgSummary and ServerMonitor state, so that listing OSDs is a matter of
+    selecting rows rather than joining those sources on every request.
+
+    Rows are shared between callers and must not be modified.
+    """
+    def __init__(self, fsid, osd_map, pg_summary, servers, valid_commands):
+        """
+        :param osd_map: An OsdMap
+        :param pg_summary: The data of a PgSummary, or None
+        :param servers: The ServerMonitor
+        :param valid_commands: Dict of OSD ID to {'valid_commands': [...]}
+        """
+        # In order of OSD ID
+        self.rows = []
+        self.rows_by_id = {}
+        self.osds_by_pool = {}
+        self.osds_by_host = defaultdict(set)
+        self.osds_by_pg_state = defaultdict(set)
+        self.osds_by_crush_ancestor = defaultdict(set)
+        self.osds_by_device_class = defaultdict(set)
+        self.osds_by_up = {True: set(), False: set()}
+        self.osds_by_in = {True: set(), False: set()}
+
+        if osd_map.data is None:
+            return
+
+        self.osds_by_pool = dict((pool_id, set(osd_ids)) for pool_id, osd_ids in osd_map.osds_by_pool.items())
+        pools_by_osd = defaultdict(list)
+        for pool_id in sorted(self.osds_by_pool.keys()):
+            for osd_id in self.osds_by_pool[pool_id]:
+                pools_by_osd[osd_id].append(pool_id)
+
+        pg_states_by_osd = defaultdict(lambda: defaultdict(int))
+        if pg_summary is not None:
+            for osd_id, osd_pg_summary in pg_summary['by_osd'].items():
+                for state_tuple, count in osd_pg_summary.items():
+                    for state in state_tuple.split("+"):
+                        self.osds_by_pg_state[state].add(osd_id)
+                        pg_states_by_osd[osd_id][state] += count
+
+        osds = sorted(osd_map.data['osds'], key=lambda o: o['osd'])
+        service_states = servers.get_services([ServiceId(fsid, OSD, str(o['osd'])) for o in osds])
+        # Device classes only appear in the CRUSH maps of luminous and later
+        device_classes = dict((d['id'], d.get('class')) for d in osd_map.data['crush']['devices'])
+
+        for osd, service_state in zip(osds, service_states):
+            osd_id = osd['osd']
+            row = dict(osd)
+            row['id'] = osd_id
+
+            # An OSD being in the OSD map does not guarantee its presence in the CRUSH
+            # map, as "osd crush rm" and "osd rm" are separate operations.
+            try:
+                row['reweight'] = float(osd_map.osd_tree_node_by_id[osd_id]['reweight'])
+            except KeyError:
+                log.warning("No CRUSH data available for OSD {0}".format(osd_id))
+                row['reweight'] = 0.0
+            row['crush_node_ancestry'] = osd_map.crush_ancestry_by_node_id.get(osd_id, [])
+            for ancestry in row['crush_node_ancestry']:
+                for node_id in ancestry:
+                    self.osds_by_crush_ancestor[node_id].add(osd_id)
+            row['device_class'] = device_classes.get(osd_id)
+            if row['device_class'] is not None:
+                self.osds_by_device_class[row['device_class']].add(osd_id)
+            self.osds_by_up[bool(osd['up'])].add(osd_id)
+            self.osds_by_in[bool(osd['in'])].add(osd_id)
+
+            row['pools'] = pools_by_osd[osd_id]
+            metadata = osd_map.metadata_by_id.get(osd_id, {})
+            for field, metadata_field in OSD_METADATA_FIELDS.items():
+                row[field] = metadata.get(metadata_field)
+            row.update(valid_commands[osd_id])
+            row['pg_states'] = dict(pg_states_by_osd[osd_id])
+
+            server_state = service_state.server_state if service_state else None
+            if server_state is not None:
+                row['server'] = server_state.fqdn
+                row['host'] = server_state.hostname
+                self.osds_by_host[server_state.fqdn].add(osd_id)
+                self.osds_by_host[server_state.hostname].add(osd_id)
+            else:
+                row['server'] = None
+                row['host'] = None
+
+            self.rows.append(row)
+            self.rows_by_id[osd_id] = row
+
+    def get(self, osd_id):
+        try:
+            return self.rows_by_id[osd_id]
+        except KeyError:
+            raise NotFound(OSD, osd_id)
+
+    def select(self, list_filter):
+        """
+        The rows matching all of the criteria in ``list_filter``, in order of OSD ID.
+
+        :param list_filter: Dict, optionally with:
+                            - 'id__in': a list of OSD IDs
+                            - 'pool': a pool ID, for the OSDs that the pool may use
+                            - 'host': a server's FQDN or hostname
+                            - 'pg_states': a list of PG states, for OSDs with PGs in any of them
+                            - 'up', 'in': booleans
+                            - 'crush_ancestor': the ID of a CRUSH bucket, for OSDs beneath it
+                            - 'device_class': a CRUSH device class
+        """
+        selected = None
+
+        def _narrow(selected, osd_ids):
+            return osd_ids if selected is None else selected & osd_ids
+
+        if 'id__in' in list_filter:
+            selected = _narrow(selected, set(list_filter['id__in']))
+        if 'pool' in list_filter:
+            try:
+                selected = _narrow(selected, self.osds_by_pool[list_filter['pool']])
+            except KeyError:
+                raise NotFound(POOL, list_filter['pool'])
+        if 'host' in list_filter:
+            selected = _narrow(selected, self.osds_by_host.get(list_filter['host'], set()))
+        if 'pg_states' in list_filter:
+            in_states = set()
+            for state in list_filter['pg_states']:
+                in_states |= self.osds_by_pg_state.get(state, set())
+            selected = _narrow(selected, in_states)
+        if 'up' in list_filter:
+            selected = _narrow(selected, self.osds_by_up[bool(list_filter['up'])])
+        if 'in' in list_filter:
+            selected = _narrow(selected, self.osds_by_in[bool(list_filter['in'])])
+        if 'crush_ancestor' in list_filter:
+            selected = _narrow(selected, self.osds_by_crush_ancestor.get(list_filter['crush_ancestor'], set()))
+        if 'device_class' in list_filter:
+            selected = _narrow(selected, self.osds_by_device_class.get(list_filter['device_class'], set()))
+
+        if selected is None:
+            return self.rows
+        elif len(selected) < len(self.rows) / 4:
+            # Cheaper to look the few selected rows up than to scan them all
+            return [self.rows_by_id[i] for i in sorted(selected) if i in self.rows_by_id]
+        else:
+            return [r for r in self.rows if r['id'] in selected]
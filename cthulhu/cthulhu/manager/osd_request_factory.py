@@ -1,25 +1,29 @@
 from cthulhu.manager.request_factory import RequestFactory
 from calamari_common.types import OsdMap, OSD_IMPLEMENTED_COMMANDS, OSD_FLAGS
-from cthulhu.manager.user_request import OsdMapModifyingRequest, RadosRequest
+from cthulhu.manager.user_request import OsdMapModifyingRequest, BulkOsdModifyingRequest, RadosRequest
+
+# The commands that a bulk OSD update merges into one, in the order they are run
+BULK_OSD_PREFIXES = ('osd out', 'osd in', 'osd down')
 
 
 class OsdRequestFactory(RequestFactory):
-    def update(self, osd_id, attributes):
+    def _osd_commands(self, osd_map, osd_id, attributes):
+        """
+        The commands that would bring one OSD's state into line with ``attributes``
+        """
         commands = []
 
-        osd_map = self._cluster_monitor.get_sync_object(OsdMap)
-
         # in/out/down take a vector of strings called 'ids', while 'reweight' takes a single integer
 
         if 'in' in attributes and bool(attributes['in']) != bool(osd_map.osds_by_id[osd_id]['in']):
             if attributes['in']:
-                commands.append(('osd in', {'ids': [attributes['id'].__str__()]}))
+                commands.append(('osd in', {'ids': [str(osd_id)]}))
             else:
-                commands.append(('osd out', {'ids': [attributes['id'].__str__()]}))
+                commands.append(('osd out', {'ids': [str(osd_id)]}))
 
         if 'up' in attributes and bool(attributes['up']) != bool(osd_map.osds_by_id[osd_id]['up']):
             if not attributes['up']:
-                commands.append(('osd down', {'ids': [attributes['id'].__str__()]}))
+                commands.append(('osd down', {'ids': [str(osd_id)]}))
             else:
                 raise RuntimeError("It is not valid to set a down OSD to be up")
 
@@ -27,6 +31,12 @@ class OsdRequestFactory(RequestFactory):
             if attributes['reweight'] != float(osd_map.osd_tree_node_by_id[osd_id]['reweight']):
                 commands.append(('osd reweight', {'id': osd_id, 'weight': attributes['reweight']}))
 
+        return commands
+
+    def update(self, osd_id, attributes):
+        osd_map = self._cluster_monitor.get_sync_object(OsdMap)
+        commands = self._osd_commands(osd_map, osd_id, attributes)
+
         if not commands:
             # Returning None indicates no-op
             return None
@@ -49,6 +59,55 @@ class OsdRequestFactory(RequestFactory):
 
         return OsdMapModifyingRequest(message, self._cluster_monitor.fsid, self._cluster_monitor.name, commands)
 
+    def update_many(self, _, osds_attributes):
+        """
+        Modify several OSDs in one request.  All the OSDs being marked in, out
+        or down are each handled by a single command, so that the cluster goes
+        through as few OSD map epochs as possible and the request only has to
+        wait for one.
+
+        :param osds_attributes: A list of attribute dicts, each including the 'id' of an OSD
+        """
+        osd_map = self._cluster_monitor.get_sync_object(OsdMap)
+
+        ids_by_prefix = dict((prefix, []) for prefix in BULK_OSD_PREFIXES)
+        reweights = []
+        osd_ids = []
+        for attributes in osds_attributes:
+            osd_id = attributes['id']
+            osd_ids.append(osd_id)
+            for prefix, args in self._osd_commands(osd_map, osd_id, attributes):
+                if prefix in ids_by_prefix:
+                    ids_by_prefix[prefix].append(osd_id)
+                else:
+                    reweights.append(((prefix, args), [osd_id]))
+
+        commands = []
+        command_osds = []
+        for prefix in BULK_OSD_PREFIXES:
+            if ids_by_prefix[prefix]:
+                commands.append((prefix, {'ids': [str(i) for i in ids_by_prefix[prefix]]}))
+                command_osds.append(ids_by_prefix[prefix])
+        for command, affected in reweights:
+            commands.append(command)
+            command_osds.append(affected)
+
+        if not commands:
+            # Returning None indicates no-op
+            return None
+
+        changes = []
+        for attributes in osds_attributes:
+            msg_attrs = attributes.copy()
+            del msg_attrs['id']
+            changes.append("osd.{id} {attrs}".format(
+                id=attributes['id'], attrs=" ".join("%s=%s" % (k, v) for k, v in sorted(msg_attrs.items()))))
+        message = "Modifying {count} OSDs in {cluster_name} ({changes})".format(
+            count=len(osd_ids), cluster_name=self._cluster_monitor.name, changes=", ".join(changes))
+
+        return BulkOsdModifyingRequest(message, self._cluster_monitor.fsid, self._cluster_monitor.name,
+                                       commands, command_osds, osd_ids)
+
     def scrub(self, osd_id):
         return RadosRequest(
             "Initiating scrub on {cluster_name}-osd.{id}".format(cluster_name=self._cluster_monitor.name, id=osd_id),
@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+from calamari_common.types import NotFound, POOL
+
+
+class PoolIndex(object):
+    """
+    The pools of a cluster, indexed for filtering by the PG states of the
+    pools.  Built once for a particular combination of OsdMap and PgSummary.
+
+    Rows are shared between callers and must not be modified.
+    """
+    def __init__(self, osd_map, pg_summary):
+        """
+        :param osd_map: An OsdMap
+        :param pg_summary: The data of a PgSummary, or None
+        """
+        # In order of pool ID
+        self.rows = []
+        self.rows_by_id = {}
+        self.pools_by_pg_state = defaultdict(set)
+
+        if osd_map.data is None:
+            return
+
+        self.rows = sorted(osd_map.data['pools'], key=lambda p: p['pool'])
+        self.rows_by_id = dict((p['pool'], p) for p in self.rows)
+
+        if pg_summary is not None:
+            for pool_id, pool_pg_summary in pg_summary['by_pool'].items():
+                for state_tuple in pool_pg_summary.keys():
+                    for state in state_tuple.split("+"):
+                        self.pools_by_pg_state[state].add(pool_id)
+
+    def get(self, pool_id):
+        try:
+            return self.rows_by_id[pool_id]
+        except KeyError:
+            raise NotFound(POOL, pool_id)
+
+    def select(self, list_filter):
+        """
+        The rows matching all of the criteria in ``list_filter``, in order of pool ID.
+
+        :param list_filter: Dict, optionally with:
+                            - 'id__in': a list of pool IDs
+                            - 'pg_states': a list of PG states, for pools with PGs in any of them
+        """
+        rows = self.rows
+        if 'id__in' in list_filter:
+            rows = [self.rows_by_id[i] for i in sorted(set(list_filter['id__in'])) if i in self.rows_by_id]
+        if 'pg_states' in list_filter:
+            in_states = set()
+            for state in list_filter['pg_states']:
+                in_states |= self.pools_by_pg_state.get(state, set())
+            rows = [p for p in rows if p['pool'] in in_states]
+
+        return rows
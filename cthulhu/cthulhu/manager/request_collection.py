@@ -1,10 +1,15 @@
+from collections import deque
 from contextlib import contextmanager
 from gevent.lock import RLock
 import datetime
+import heapq
 import logging
 
 from calamari_common.remote import get_remote
+from calamari_common.types import VersionedSyncObject
 from cthulhu.gevent_util import nosleep
+from cthulhu.manager import command_scheduler, config
+from cthulhu.manager.command_scheduler import CommandBatch, CommandScheduler
 from cthulhu.manager.user_request import UserRequest
 from cthulhu.log import log as cthulhu_log
 from cthulhu.util import now
@@ -12,15 +17,78 @@ from cthulhu.util import now
 
 TICK_PERIOD = 20
 
+# Completed requests are dropped from memory when there are more than this many
+# of them, or they completed longer than this ago: after that they are read
+# back from the database.
+COMPLETED_REQUEST_LIMIT = config.getint('cthulhu', 'completed_request_limit')
+COMPLETED_REQUEST_AGE = datetime.timedelta(seconds=config.getint('cthulhu', 'completed_request_age'))
+
 
 # getChild isn't in 2.6
 log = logging.getLogger('.'.join((cthulhu_log.name, 'request_collection')))
 
 
+class WaitingRequests(object):
+    """
+    The requests waiting for new versions of one sync object of one cluster,
+    indexed so that each new version wakes only the requests whose awaited
+    version it satisfies.
+    """
+    def __init__(self, ordered):
+        """
+        :param ordered: Whether versions of the sync object can be compared, otherwise
+                        every request is woken by every new version
+        """
+        self._ordered = ordered
+
+        # Heap of awaited versions.  May also hold versions that nobody is
+        # waiting for any more: these are skipped when they come to the top.
+        self._versions = []
+        # Awaited version to dict of request ID to request
+        self._by_version = {}
+        # Requests woken by every new version
+        self._any = {}
+
+    def add(self, request, version):
+        if version is None or not self._ordered:
+            self._any[request.id] = request
+        else:
+            if version not in self._by_version:
+                heapq.heappush(self._versions, version)
+                self._by_version[version] = {}
+            self._by_version[version][request.id] = request
+
+    def remove(self, request, version):
+        if version is None or not self._ordered:
+            self._any.pop(request.id, None)
+        else:
+            waiting = self._by_version.get(version, {})
+            waiting.pop(request.id, None)
+            if not waiting:
+                self._by_version.pop(version, None)
+
+    def satisfied_by(self, version):
+        """
+        Remove and return the requests that ``version`` satisfies
+        """
+        requests = self._any.values()
+        self._any = {}
+        if self._ordered:
+            while self._versions and self._versions[0] <= version:
+                requests.extend(self._by_version.pop(heapq.heappop(self._versions), {}).values())
+        return requests
+
+
 class RequestCollection(object):
     """
     Manage a collection of UserRequests, indexed by
-    salt JID and request ID.
+    salt JID, request ID, state, and the sync object versions
+    that they are waiting for.
+
+    Requests are saved to the database when they complete, and only the
+    most recently completed are kept in memory.  Every completed request
+    is either still in memory or completed no later than ``evicted_until``,
+    so that the two can be listed together without duplicates.
 
     Unlike most of cthulhu, this class contains a lock, which
     is used in all entry points which may sleep (anything which
@@ -34,8 +102,24 @@ class RequestCollection(object):
 
         self._by_request_id = {}
         self._by_jid = {}
+        self._by_state = dict((state, {}) for state in UserRequest.states)
         self._lock = RLock()
 
+        # (fsid, sync_type) to WaitingRequests
+        self._waiting = {}
+        # Request ID to the (fsid, sync_type, version)s it is indexed under in _waiting
+        self._awaiting = {}
+
+        # FSID to CommandScheduler holding that cluster's requests before they start
+        self._schedulers = {}
+        # JID to CommandBatch, for jobs running the commands of several requests
+        self._batches = {}
+
+        # Completed requests still in memory, in order of completion
+        self._completed = deque()
+        # Anything that completed before we started is only in the database
+        self.evicted_until = now()
+
         self._remote = get_remote()
 
         self._manager = manager
@@ -50,7 +134,56 @@ class RequestCollection(object):
         if not state:
             return self._by_request_id.values()
         else:
-            return [r for r in self._by_request_id.values() if r.state == state]
+            return self._by_state[state].values()
+
+    def _index_waiting(self, request):
+        """
+        File ``request`` under the versions it is now waiting for, if any
+        """
+        for fsid, sync_type, version in self._awaiting.pop(request.id, []):
+            self._waiting[(fsid, sync_type)].remove(request, version)
+
+        if request.state == request.SUBMITTED and request.fsid:
+            awaiting = [(request.fsid, sync_type, version) for sync_type, version in request.awaiting_versions.items()]
+            for fsid, sync_type, version in awaiting:
+                try:
+                    waiting = self._waiting[(fsid, sync_type)]
+                except KeyError:
+                    waiting = self._waiting[(fsid, sync_type)] = WaitingRequests(
+                        issubclass(sync_type, VersionedSyncObject))
+                waiting.add(request, version)
+            if awaiting:
+                self._awaiting[request.id] = awaiting
+
+    def get_saved(self, fsid, limit, key=None, reverse=False, count=True):
+        """
+        Completed requests which are no longer in memory, most recently requested first.
+        See Persister.get_requests for ``key``, ``reverse`` and ``count``.
+
+        :return: 2-tuple of the number of such requests (None if not counted), list of up
+                 to ``limit`` of them as dicts
+        """
+        saved = self._manager.persister.get_requests(fsid, self.evicted_until, limit, key, reverse, count)
+        if saved is None:
+            # No database
+            return 0 if count else None, []
+        return saved
+
+    def _evict(self):
+        """
+        Drop the oldest completed requests from memory, down to COMPLETED_REQUEST_LIMIT
+        and none older than COMPLETED_REQUEST_AGE.
+        """
+        threshold = now() - COMPLETED_REQUEST_AGE
+        while self._completed and (len(self._completed) > COMPLETED_REQUEST_LIMIT or
+                                   self._completed[0].completed_at < threshold or
+                                   self._completed[0].completed_at <= self.evicted_until):
+            # The last condition takes any that completed at the same moment as
+            # the one before, so that the database and memory never overlap
+            request = self._completed.popleft()
+            del self._by_request_id[request.id]
+            del self._by_state[request.state][request.id]
+            self.evicted_until = max(self.evicted_until, request.completed_at)
 
     def tick(self):
         """
@@ -58,11 +191,13 @@ class RequestCollection(object):
         get a periodic call to saltutil.running to verify that things really
         are still happening.
         """
+        with self._lock:
+            self._evict()
 
-        if not self._by_jid:
+        if not self._by_jid and not self._batches:
             return
         else:
-            log.debug("RequestCollection.tick: %s JIDs underway" % len(self._by_jid))
+            log.debug("RequestCollection.tick: %s JIDs underway" % (len(self._by_jid) + len(self._batches)))
 
         # Identify JIDs who haven't had a saltutil.running reponse for too long.
         # Kill requests in a separate phase because request:JID is not 1:1
@@ -74,6 +209,15 @@ class RequestCollection(object):
                     request.id, request.jid, _now, request.alive_at
                 ))
                 stale_jobs.add(request)
+        for batch in self._batches.values():
+            if _now - batch.alive_at > datetime.timedelta(seconds=TICK_PERIOD * 3):
+                log.error("Batch JID %s stale: now=%s, alive_at=%s" % (batch.jid, _now, batch.alive_at))
+                del self._batches[batch.jid]
+                waiting = self._batch_requests(batch)
+                stale_jobs.update(waiting)
+                for request in batch.requests:
+                    if request not in waiting:
+                        self._release(request)
 
         # Any identified stale jobs are errored out.
         for request in stale_jobs:
@@ -81,11 +225,14 @@ class RequestCollection(object):
                 request.set_error("Lost contact")
                 request.jid = None
                 request.complete()
+            self._release(request)
 
         # Identify minions associated with JIDs in flight
         query_minions = set()
         for jid, request in self._by_jid.items():
             query_minions.add(request.minion_id)
+        for jid, batch in self._batches.items():
+            query_minions.add(batch.minion_id)
 
         # Attempt to emit a saltutil.running to ping jobs, next tick we
         # will see if we got updates to the alive_at attribute to indicate non-staleness
@@ -102,13 +249,11 @@ class RequestCollection(object):
         """
         log.debug("RequestCollection.on_tick_response: %s from %s" % (len(jobs), minion_id))
         for job in jobs:
-            try:
-                request = self._by_jid[job['jid']]
-            except KeyError:
-                # Not one of mine, ignore it
-                pass
-            else:
-                request.alive_at = now()
+            # A request, or a batch of them
+            running = self._by_jid.get(job['jid'], self._batches.get(job['jid']))
+            if running is not None:
+                running.alive_at = now()
+            # Otherwise not one of mine, ignore it
 
     def cancel(self, request_id):
         """
@@ -130,12 +275,19 @@ class RequestCollection(object):
             request.set_error("Cancelled")
             request.complete()
 
-            # In the background, try to cancel the request's JID on a best-effort basis
-            if cancel_jid:
-                self._remote.cancel(request.minion_id, cancel_jid)
-                # We don't check for completion or errors, it's a best-effort thing.  If we're
-                # cancelling something we will do our best to kill any subprocess but can't
-                # any guarantees because running nodes may be out of touch with the calamari server.
+            # In the background, try to cancel the request's JID on a best-effort basis,
+            # unless it's running the commands of other requests too
+            if cancel_jid in self._batches:
+                # Its commands may still run, so it holds up later requests until the job completes
+                if not self._batch_requests(self._batches[cancel_jid]):
+                    self._remote.cancel(request.minion_id, cancel_jid)
+            else:
+                if cancel_jid:
+                    self._remote.cancel(request.minion_id, cancel_jid)
+                    # We don't check for completion or errors, it's a best-effort thing.  If we're
+                    # cancelling something we will do our best to kill any subprocess but can't
+                    # any guarantees because running nodes may be out of touch with the calamari server.
+                self._release(request)
 
     @nosleep
     def fail_all(self, failed_minion, fsid):
@@ -152,6 +304,7 @@ class RequestCollection(object):
                     log.error("Giving up on JID %s" % request.jid)
                     request.jid = None
                 request.complete()
+            self._release(request)
 
     def submit(self, request, minion):
         """
@@ -160,11 +313,76 @@ class RequestCollection(object):
         to a job could arrive before the request was filed here.
         """
         with self._lock:
-            request.submit(minion)
+            if request.fsid and command_scheduler.MERGE_WINDOW:
+                # Hold it in case its commands can be run in one job with those of others
+                request.hold(minion)
+                try:
+                    scheduler = self._schedulers[request.fsid]
+                except KeyError:
+                    scheduler = self._schedulers[request.fsid] = CommandScheduler(self._start)
+                scheduler.add(request)
+            else:
+                request.submit(minion)
+                self._by_jid[request.jid] = request
             self._by_request_id[request.id] = request
-            self._by_jid[request.jid] = request
+            self._by_state[request.state][request.id] = request
+            self._index_waiting(request)
+        self._manager.changes.on_request(request)
         self._manager.eventer.on_user_request_begin(request)
 
+    def flush(self):
+        """
+        Start any held requests now, rather than waiting for others to merge with them
+        """
+        for scheduler in self._schedulers.values():
+            scheduler.flush()
+
+    def _release(self, request):
+        """
+        Let held requests start that were waiting for ``request``'s commands to run
+        """
+        scheduler = self._schedulers.get(request.fsid)
+        if scheduler is not None:
+            scheduler.finished(request)
+
+    def _batch_requests(self, batch):
+        """
+        The requests of a batch which are still waiting for its job
+        """
+        return [r for r in batch.requests if r.state == r.SUBMITTED and r.jid == batch.jid]
+
+    def _start(self, requests):
+        """
+        Start the remote execution of held requests, in one job
+        """
+        with self._lock:
+            # Some may have been cancelled, or failed, while they were held
+            for request in requests:
+                if request.state != request.SUBMITTED or request.jid is not None:
+                    self._release(request)
+            requests = [r for r in requests if r.state == r.SUBMITTED and r.jid is None]
+            if not requests:
+                return
+
+            try:
+                if len(requests) == 1:
+                    request = requests[0]
+                    with self._update_index(request):
+                        request.start()
+                else:
+                    batch = CommandBatch(requests)
+                    batch.submit()
+                    self._batches[batch.jid] = batch
+            except Exception as e:
+                log.exception("Failed to start requests %s" % ", ".join(r.id for r in requests))
+                for request in requests:
+                    with self._update_index(request):
+                        request.jid = None
+                        request.set_error("Failed to start: %s" % e)
+                        request.complete()
+                    self._manager.eventer.on_user_request_complete(request)
+                    self._release(request)
+
     def on_map(self, fsid, sync_type, sync_object):
         """
         Callback for when a new cluster map is available, in which
@@ -172,26 +390,26 @@ class RequestCollection(object):
         so that they can progress if they were waiting for it.
         """
         with self._lock:
-            requests = self.get_all(state=UserRequest.SUBMITTED)
-            for request in requests:
-                if request.fsid != fsid:
-                    continue
+            try:
+                requests = self._waiting[(fsid, sync_type)].satisfied_by(sync_object.version)
+            except KeyError:
+                return
 
+            for request in requests:
                 try:
-                    # If this is one of the types that this request
-                    # is waiting for, invoke on_map.
-                    for awaited_type in request.awaiting_versions.keys():
-                        if awaited_type == sync_type:
-                            with self._update_index(request):
-                                request.on_map(sync_type, sync_object)
+                    # Requests which are still waiting after this are filed
+                    # under their new awaited versions by _update_index
+                    with self._update_index(request):
+                        request.on_map(sync_type, sync_object)
                 except Exception as e:
                     log.exception("Request %s threw exception in on_map", request.id)
-                    if request.jid:
-                        log.error("Abandoning job {0}".format(request.jid))
-                        request.jid = None
+                    with self._update_index(request):
+                        if request.jid:
+                            log.error("Abandoning job {0}".format(request.jid))
+                            request.jid = None
 
-                    request.set_error("Internal error %s" % e)
-                    request.complete()
+                        request.set_error("Internal error %s" % e)
+                        request.complete()
 
                 if request.state == UserRequest.COMPLETE:
                     self._manager.eventer.on_user_request_complete(request)
@@ -207,22 +425,18 @@ class RequestCollection(object):
             ))
             return
 
-        if result['error']:
-            # This indicates a failure within ceph.rados_commands which was caught
-            # by our code, like one of our Ceph commands returned an error code.
-            # NB in future there may be UserRequest subclasses which want to receive
-            # and handle these errors themselves, so this branch would be refactored
-            # to allow that.
-            log.error("Request %s experienced an error: %s" % (request.id, result['error_status']))
-            request.jid = None
-            request.set_error(result['error_status'])
-            request.complete()
-            return
-
         try:
             with self._update_index(request):
                 old_jid = request.jid
-                request.complete_jid(result)
+                if result['error']:
+                    # This indicates a failure within ceph.rados_commands which was caught
+                    # by our code, like one of our Ceph commands returned an error code.
+                    # Most requests complete in error straight away, but some may still
+                    # wait for the maps that the commands before the failure produced.
+                    log.error("Request %s experienced an error: %s" % (request.id, result['error_status']))
+                    request.fail_jid(result)
+                else:
+                    request.complete_jid(result)
                 assert request.jid != old_jid
 
                 # After a jid completes, requests may start waiting for cluster
@@ -249,9 +463,10 @@ class RequestCollection(object):
             # Ensure that a misbehaving piece of code in a UserRequest subclass
             # results in a terminated job, not a zombie job
             log.exception("Calling complete_jid for %s/%s" % (request.id, request.jid))
-            request.jid = None
-            request.set_error("Internal error %s" % e)
-            request.complete()
+            with self._update_index(request):
+                request.jid = None
+                request.set_error("Internal error %s" % e)
+                request.complete()
 
     def on_completion(self, fqdn, jid, success, result, cmd, args):
         """
@@ -267,41 +482,64 @@ class RequestCollection(object):
                 result_logging = result  # make result less log-spammy
             log.debug("on_completion: jid=%s success=%s result=%s" % (jid, success, result_logging))
 
-            try:
-                request = self.get_by_jid(jid)
-                log.debug("on_completion: jid %s belongs to request %s" % (jid, request.id))
-            except KeyError:
-                log.warning("on_completion: unknown jid {0}, return: {1}".format(jid, result_logging))
-                return
-
-            if not success:
-                with self._update_index(request):
-                    request.jid = None
-
-                    # This indicates a failure at the salt level, i.e. job threw an exception
-                    log.error("Remote execution failed for request %s: %s" % (request.id, result_logging))
-                    if isinstance(result, dict):
-                        # Handler ran and recorded an error for us
-                        request.set_error(result['error_status'])
-                    else:
-                        # An exception, probably, stringized by salt for us
-                        request.set_error(result)
-                    request.complete()
-            elif cmd == 'ceph.rados_commands':
-                self._on_rados_completion(fqdn, request, result)
+            if jid in self._batches:
+                batch = self._batches.pop(jid)
+                log.debug("on_completion: jid %s belongs to requests %s" % (
+                    jid, ", ".join(r.id for r in batch.requests)))
+                waiting = self._batch_requests(batch)
+                completions = [(request, request_result)
+                               for request, request_result in batch.split(success, result) if request in waiting]
+                # Those cancelled while the job ran no longer hold anything up
+                for request in batch.requests:
+                    if request not in waiting:
+                        self._release(request)
             else:
-                # General case successful JID other than rados_command
-                with self._update_index(request):
-                    request.complete_jid(result)
+                try:
+                    request = self.get_by_jid(jid)
+                    log.debug("on_completion: jid %s belongs to request %s" % (jid, request.id))
+                except KeyError:
+                    log.warning("on_completion: unknown jid {0}, return: {1}".format(jid, result_logging))
+                    return
+                completions = [(request, result)]
+
+            for request, result in completions:
+                if result is None:
+                    # Its commands didn't run because an earlier request's in the same
+                    # job failed: give it a job of its own.  Later requests acting on the
+                    # same objects are still held until that one completes.
+                    with self._update_index(request):
+                        request.jid = None
+                    self._start([request])
+                    continue
+                elif not success:
+                    with self._update_index(request):
+                        request.jid = None
+
+                        # This indicates a failure at the salt level, i.e. job threw an exception
+                        log.error("Remote execution failed for request %s: %s" % (request.id, result_logging))
+                        if isinstance(result, dict):
+                            # Handler ran and recorded an error for us
+                            request.set_error(result['error_status'])
+                        else:
+                            # An exception, probably, stringized by salt for us
+                            request.set_error(result)
+                        request.complete()
+                elif cmd == 'ceph.rados_commands':
+                    self._on_rados_completion(fqdn, request, result)
+                else:
+                    # General case successful JID other than rados_command
+                    with self._update_index(request):
+                        request.complete_jid(result)
 
-        if request.state == UserRequest.COMPLETE:
-            self._manager.eventer.on_user_request_complete(request)
+                if request.state == UserRequest.COMPLETE:
+                    self._manager.eventer.on_user_request_complete(request)
+                self._release(request)
 
     def _update_index(self, request):
         """
         Context manager to acquire across request-modifying operations
         to ensure lookups like by_jid are up to date if requests
-        were modified in the process
+        were modified in the process, and to publish any change of state
         """
 
         @contextmanager
@@ -310,12 +548,23 @@ class RequestCollection(object):
             # in order to ensure by_jid is up to date before any response
             # to new jids can arrive.
             old_jid = request.jid
+            old_state = request.state
             yield
             # Update by_jid in case this triggered a new job
             if request.jid != old_jid:
                 if old_jid:
-                    del self._by_jid[old_jid]
+                    # May already be gone, if complete_jid failed after starting a new job
+                    self._by_jid.pop(old_jid, None)
                 if request.jid:
                     self._by_jid[request.jid] = request
+            self._index_waiting(request)
+            if request.state != old_state:
+                del self._by_state[old_state][request.id]
+                self._by_state[request.state][request.id] = request
+                self._manager.changes.on_request(request)
+                if request.state == request.COMPLETE:
+                    self._manager.persister.save_request(request)
+                    self._completed.append(request)
+                    self._evict()
 
         return update()
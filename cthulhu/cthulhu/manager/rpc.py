@@ -1,4 +1,5 @@
 import traceback
+from dateutil.parser import parse as dateutil_parse
 import gevent.event
 
 try:
@@ -7,12 +8,22 @@ except ImportError:
     zerorpc = None
 
 from calamari_common.types import OsdMap, SYNC_OBJECT_STR_TYPE, OSD, OSD_MAP, POOL, CLUSTER, CRUSH_NODE, CRUSH_MAP, CRUSH_RULE, CRUSH_TYPE, ServiceId,\
-    NotFound, SERVER
+    NotFound, SERVER, OSD_SORT_KEYS, POOL_SORT_KEYS, USER_REQUEST_COMPLETE
 from calamari_common.remote import get_remote
+from calamari_common.util import project
 
 from cthulhu.log import log
 from cthulhu.manager import config
 from cthulhu.manager.user_request import SaltRequest
+from cthulhu.util import sort_rows
+
+# The longest that get_changes will wait: long enough to save clients from
+# busy polling, short enough to come in under their RPC timeout
+CHANGES_MAX_TIMEOUT = 20
+
+# Seconds to wait for a mon to collect cluster and pool stats, within the
+# REST API's RPC timeout
+DF_STATS_TIMEOUT = 20
 
 
 class RpcInterface(object):
@@ -85,6 +96,36 @@ class RpcInterface(object):
                 'update_time': cluster.update_time.isoformat()
             }
 
+    def get_health_counters(self, fs_id):
+        """
+        The counts of OSDs, MDSs, mons and PGs by health, as maintained by the
+        ClusterMonitor, so that clients needn't fetch the sync objects to count them.
+
+        :return: A dict of 'counters' and the 'cluster_update_time'
+        """
+        cluster = self._fs_resolve(fs_id)
+        return {
+            'counters': cluster.get_health_counters(),
+            'cluster_update_time': cluster.update_time.isoformat()
+        }
+
+    def get_df_stats(self, fs_id, refresh=False):
+        """
+        The space and I/O stats of a cluster and its pools, as most recently
+        collected by the ClusterMonitor.
+
+        :param refresh: Collect the stats afresh rather than returning the cached ones.  They
+                        are also collected if there aren't any yet.
+        :return: A dict of 'updated', the time they were collected, or None if they
+                 never have been, 'cluster' and 'pools'
+        """
+        cluster = self._fs_resolve(fs_id)
+        if refresh or cluster.get_df_stats()['updated'] is None:
+            collected = cluster.refresh_df_stats()
+            if collected is not None:
+                collected.wait(timeout=DF_STATS_TIMEOUT)
+        return cluster.get_df_stats()
+
     def list_clusters(self):
         result = []
         for fsid in self._manager.clusters.keys():
@@ -97,7 +138,7 @@ class RpcInterface(object):
         # Clear out records of the cluster itself
         self._manager.delete_cluster(fs_id)
 
-    def get_sync_object(self, fs_id, object_type, path=None):
+    def get_sync_object(self, fs_id, object_type, path=None, fields=None):
         """
         Get one of the objects that ClusterMonitor keeps a copy of from the mon, such
         as the cluster maps.
@@ -105,6 +146,10 @@ class RpcInterface(object):
         :param fs_id: The fsid of a cluster
         :param object_type: String, one of SYNC_OBJECT_TYPES
         :param path: List, optional, a path within the object to return instead of the whole thing
+        :param fields: Optional, a selector string like 'epoch,osds[osd,up,in]' or a list of dotted
+                       paths, to return only those fields of the object (or of the value at ``path``).
+                       Use this rather than fetching the whole object to read a few fields
+                       of it, to avoid sending it all over the RPC connection.
 
         :return: the requested data, or None if it was not found (including if any element of ``path``
                  was not found)
@@ -121,9 +166,103 @@ class RpcInterface(object):
             except (AttributeError, KeyError) as e:
                 log.exception("Exception %s traversing %s: obj=%s" % (e, path, obj))
                 raise NotFound(object_type, path)
-            return obj
         else:
-            return self._fs_resolve(fs_id).get_sync_object_data(SYNC_OBJECT_STR_TYPE[object_type])
+            obj = self._fs_resolve(fs_id).get_sync_object_data(SYNC_OBJECT_STR_TYPE[object_type])
+
+        if fields:
+            obj = project(obj, fields)
+        return obj
+
+    def get_sync_object_versions(self, fs_id, object_types):
+        """
+        Get the versions of the sync objects that we currently hold for a cluster,
+        a cheap call for clients to check whether anything they built from those
+        objects may have changed.
+
+        :param fs_id: The fsid of a cluster
+        :param object_types: List of strings, each one of SYNC_OBJECT_TYPES, or SERVER
+                             for the generation of the server monitor's state, which
+                             changes when servers and services are discovered or move
+        :return: A list of versions, one for each of object_types
+        """
+        cluster = self._fs_resolve(fs_id)
+        return [self._manager.servers.generation if t == SERVER
+                else cluster.get_sync_object(SYNC_OBJECT_STR_TYPE[t]).version for t in object_types]
+
+    def get_changes(self, since, timeout, fs_id=None):
+        """
+        Wait for sync objects, requests or events to change, see ChangeFeed.get
+
+        :param since: A token from the last call, or None to get a token to start from
+        :param timeout: Seconds to wait for a change, capped at CHANGES_MAX_TIMEOUT
+        :param fs_id: Optionally, only return changes for this cluster
+        """
+        if fs_id is not None:
+            self._fs_resolve(fs_id)
+        return self._manager.changes.get(since, min(timeout, CHANGES_MAX_TIMEOUT), fs_id)
+
+    def multi_get(self, fs_id, requests):
+        """
+        Resolve several read requests in one round trip.  Nothing in here yields
+        to other greenlets, so every request sees the same version of the cluster's
+        sync objects (in particular, the same OsdMap).
+
+        :param fs_id: The fsid of a cluster
+        :param requests: List of lists, each a method name followed by its arguments
+                         without the fs_id, one of:
+
+                         - ['get_sync_object', object_type, path, fields]
+                         - ['list', object_type, list_filter]
+                         - ['get', object_type, object_id]
+                         - ['get_valid_commands', object_type, object_ids]
+                         - ['server_by_service', object_type, object_ids]
+                         - ['list_osd_rows', list_filter]
+                         - ['get_osd_row', osd_id]
+                         - ['get_osds_by_pg_state']
+
+                         For the last two, object_ids may be None meaning all the
+                         OSDs in the OsdMap.  server_by_service returns the same
+                         2-tuples as the server_by_service RPC.
+
+        :return: A dict with 'osd_map_version', the OsdMap version that the results
+                 were built from, and 'results', a list with the result of each request
+        """
+        cluster = self._fs_resolve(fs_id)
+        osd_map = cluster.get_sync_object(OsdMap)
+
+        def _osd_ids(object_type, object_ids):
+            if object_type != OSD:
+                raise NotImplementedError(object_type)
+            if object_ids is None:
+                return osd_map.osds_by_id.keys()
+            return object_ids
+
+        handlers = {
+            'get_sync_object': lambda object_type, path=None, fields=None: self.get_sync_object(
+                fs_id, object_type, path, fields),
+            'list': lambda object_type, list_filter: self.list(fs_id, object_type, list_filter),
+            'get': lambda object_type, object_id: self.get(fs_id, object_type, object_id),
+            'get_valid_commands': lambda object_type, object_ids: self.get_valid_commands(
+                fs_id, object_type, _osd_ids(object_type, object_ids)),
+            'server_by_service': lambda object_type, object_ids: self.server_by_service(
+                [ServiceId(fs_id, object_type, str(i)) for i in _osd_ids(object_type, object_ids)]),
+            'list_osd_rows': lambda list_filter: self.list_osd_rows(fs_id, list_filter),
+            'get_osd_row': lambda osd_id: self.get_osd_row(fs_id, osd_id),
+            'get_osds_by_pg_state': lambda: self.get_osds_by_pg_state(fs_id)
+        }
+
+        results = []
+        for request in requests:
+            try:
+                handler = handlers[request[0]]
+            except KeyError:
+                raise NotImplementedError(request[0])
+            results.append(handler(*request[1:]))
+
+        return {
+            'osd_map_version': osd_map.version,
+            'results': results
+        }
 
     def update(self, fs_id, object_type, object_id, attributes):
         """
@@ -159,6 +298,22 @@ class RpcInterface(object):
         else:
             raise NotImplementedError(object_type)
 
+    def update_many(self, fs_id, object_type, objects_attributes):
+        """
+        Modify several objects in a cluster with a single request.
+
+        :param objects_attributes: A list of attribute dicts, each including the 'id' of an object
+        """
+        cluster = self._fs_resolve(fs_id)
+
+        if object_type == OSD:
+            for attributes in objects_attributes:
+                self._osd_resolve(cluster, attributes['id'])
+
+            return cluster.request_update('update_many', OSD, None, objects_attributes)
+        else:
+            raise NotImplementedError(object_type)
+
     def debug_job(self, minion_id, cmd, args):
         """
         Used in synthetic testing.
@@ -289,6 +444,67 @@ class RpcInterface(object):
         else:
             raise NotImplementedError(object_type)
 
+    def list_osd_rows(self, fs_id, list_filter):
+        """
+        Get the OSDs of a cluster enriched with the data that the REST API presents
+        alongside them (reweight, server, pools, PG states and so on), from an index
+        that is only rebuilt when the OsdMap, PgSummary or server state changes.
+
+        :param list_filter: Dict, optionally with 'id__in' (list of OSD IDs), 'pool' (pool ID),
+                            'host' (server FQDN or hostname), 'pg_states' (list of PG states,
+                            matching OSDs with PGs in any of them), 'up' and 'in' (booleans),
+                            'crush_ancestor' (CRUSH bucket ID) and 'device_class'.
+        :return: A list of OSD rows, in order of OSD ID
+        """
+        return self._fs_resolve(fs_id).get_osd_index().select(list_filter)
+
+    def get_osd_row(self, fs_id, osd_id):
+        """
+        Get one of the rows from list_osd_rows
+        """
+        return self._fs_resolve(fs_id).get_osd_index().get(osd_id)
+
+    def list_page(self, fs_id, object_type, list_filter, ordering, offset, limit):
+        """
+        Get a sorted slice of the OSDs or pools of a cluster, filtered and sorted
+        against the indexes that cthulhu keeps of them, so that a client paging
+        through a large cluster doesn't receive every object to show a few.
+
+        :param object_type: OSD or POOL
+        :param list_filter: As for list_osd_rows for OSDs, or with 'id__in' and 'pg_states' for pools
+        :param ordering: A comma separated list of the keys in OSD_SORT_KEYS or POOL_SORT_KEYS,
+                         each optionally prefixed by '-' for descending order, or None for
+                         ascending order of ID
+        :param offset: Index of the first result to return
+        :param limit: Maximum number of results to return, or None for all of them
+        :return: A dict with 'count', the number of objects matching the filter, and
+                 'results', a list of the requested slice of them
+        """
+        cluster = self._fs_resolve(fs_id)
+        if object_type == OSD:
+            rows = cluster.get_osd_index().select(list_filter)
+            sort_keys = OSD_SORT_KEYS
+        elif object_type == POOL:
+            rows = cluster.get_pool_index().select(list_filter)
+            sort_keys = POOL_SORT_KEYS
+        else:
+            raise NotImplementedError(object_type)
+
+        if ordering:
+            rows = sort_rows(rows, ordering, sort_keys)
+
+        return {
+            'count': len(rows),
+            'results': rows[offset:offset + limit] if limit is not None else rows[offset:]
+        }
+
+    def get_osds_by_pg_state(self, fs_id):
+        """
+        :return: A dict of PG state to the IDs of OSDs with PGs in that state
+        """
+        osd_index = self._fs_resolve(fs_id).get_osd_index()
+        return dict((state, sorted(osd_ids)) for state, osd_ids in osd_index.osds_by_pg_state.items())
+
     def _dump_request(self, request):
         """UserRequest to JSON-serializable form"""
         return {
@@ -299,7 +515,8 @@ class RpcInterface(object):
             'status': request.status,
             'headline': request.headline,
             'requested_at': request.requested_at.isoformat(),
-            'completed_at': request.completed_at.isoformat() if request.completed_at else None
+            'completed_at': request.completed_at.isoformat() if request.completed_at else None,
+            'outcomes': request.outcomes
         }
 
     def get_request(self, request_id):
@@ -309,23 +526,66 @@ class RpcInterface(object):
         try:
             return self._dump_request(self._manager.requests.get_by_id(request_id))
         except KeyError:
-            raise NotFound('request', request_id)
+            # Completed requests are only kept in memory for a while
+            saved = self._manager.persister.get_request(request_id)
+            if saved is None:
+                raise NotFound('request', request_id)
+            return saved
 
     def cancel_request(self, request_id):
         try:
             self._manager.requests.cancel(request_id)
-            return self.get_request(request_id)
         except KeyError:
-            raise NotFound('request', request_id)
+            # Not in memory, so if it exists at all it's already complete
+            pass
+        return self.get_request(request_id)
 
-    def list_requests(self, filter_args):
+    def list_requests(self, filter_args, offset=0, limit=None, cursor=None, count=True):
+        """
+        List requests, most recently requested first
+
+        :param filter_args: Optional 'state' and 'fsid' to filter on
+        :param cursor: Optionally, a [direction, requested_at, id] list naming a request, to
+                       list those requested before ('next') or after ('prev') it instead of
+                       skipping ``offset`` requests, which means reading all of them from the database
+        :param count: Whether to count all the requests matching the filter, which also
+                      means reading all of them from the database
+        :return: A dict with the 'count' of requests matching the filter (None if not
+                 counted), and the 'results' from ``offset`` or ``cursor``, up to ``limit`` of them
+        """
         state = filter_args.get('state', None)
         fsid = filter_args.get('fsid', None)
-        requests = self._manager.requests.get_all()
-        return sorted([self._dump_request(r)
-                       for r in requests
-                       if (state is None or r.state == state) and (fsid is None or r.fsid == fsid)],
-                      lambda a, b: cmp(b['requested_at'], a['requested_at']))
+        key = None
+        reverse = False
+        if cursor is not None:
+            direction, requested_at, request_id = cursor
+            key = (dateutil_parse(requested_at), request_id)
+            reverse = direction == 'prev'
+            offset = 0
+        end = offset + limit if limit is not None else None
+
+        requests = [r for r in self._manager.requests.get_all(state) if fsid is None or r.fsid == fsid]
+        total = len(requests) if count else None
+        if key is not None:
+            requests = [r for r in requests
+                        if ((r.requested_at, r.id) > key if reverse else (r.requested_at, r.id) < key)]
+        requests = [self._dump_request(r) for r in requests]
+        if state in (None, USER_REQUEST_COMPLETE):
+            # Those no longer in memory are all complete.  Only the first ``end`` of them
+            # can be on this page, whatever the requests in memory are.
+            saved_count, saved = self._manager.requests.get_saved(fsid, end, key, reverse, count)
+            if count:
+                total += saved_count
+            requests.extend(saved)
+
+        requests.sort(key=lambda r: (r['requested_at'], r['id']), reverse=not reverse)
+        requests = requests[offset:end]
+        if reverse:
+            requests.reverse()
+        return {
+            'count': total,
+            'results': requests
+        }
 
     def minion_status(self, status_filter):
         """
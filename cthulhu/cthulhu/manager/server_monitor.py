@@ -129,6 +129,10 @@ class ServerMonitor(greenlet.Greenlet):
         # Service (fsid, type, id) to ServiceState
         self.services = {}
 
+        # Incremented whenever services come or go or change server, or a
+        # server changes name, for callers caching things derived from those
+        self.generation = 0
+
         self._complete = event.Event()
 
         self._eventer = eventer
@@ -240,6 +244,7 @@ class ServerMonitor(greenlet.Greenlet):
         service_state.set_server(server_state)
         server_state.services[service_state.id] = service_state
         self.fsid_services[service_state.fsid].append(service_state)
+        self.generation += 1
 
     def forget_service(self, service_state):
         log.info("Removing record of service %s" % (service_state,))
@@ -248,6 +253,7 @@ class ServerMonitor(greenlet.Greenlet):
         if service_state.server_state:
             del service_state.server_state.services[service_state.id]
         self._persister.delete_service(service_state.id)
+        self.generation += 1
 
     @nosleep
     def on_osd_map(self, osd_map):
@@ -399,6 +405,7 @@ class ServerMonitor(greenlet.Greenlet):
                     del self.servers[old_fqdn]
                     server_state.fqdn = fqdn
                     self.servers[server_state.fqdn] = server_state
+                    self.generation += 1
                     self._persister.update_server(old_fqdn, fqdn=fqdn, managed=True)
                     new_server = False
                     log.info("Server %s went from unmanaged to managed" % fqdn)
@@ -531,6 +538,7 @@ class ServerMonitor(greenlet.Greenlet):
             old_server_state = service_state.server_state
             log.info("Associated service %s with server %s (was %s)" % (service_id, server_state, old_server_state))
             service_state.set_server(server_state)
+            self.generation += 1
             if old_server_state is not None:
                 del old_server_state.services[service_id]
             server_state.services[service_id] = service_state
@@ -611,6 +619,7 @@ class ServerMonitor(greenlet.Greenlet):
             del self.hostname_to_server[server_state.hostname]
         del self.servers[fqdn]
         self._persister.delete_server(fqdn)
+        self.generation += 1
 
     def delete_cluster(self, fsid):
         if fsid not in self.fsid_services:
@@ -630,6 +639,7 @@ class ServerMonitor(greenlet.Greenlet):
                 self.delete(service.server_state.fqdn)
 
         del self.fsid_services[fsid]
+        self.generation += 1
 
     def dump(self, server_state):
         """
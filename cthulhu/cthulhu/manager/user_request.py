@@ -41,6 +41,10 @@ class UserRequestBase(object):
     COMPLETE = USER_REQUEST_COMPLETE
     states = [NEW, SUBMITTED, COMPLETE]
 
+    # Whether the request may be started by running its ``commands`` in a
+    # ceph.rados_commands job along with those of other requests
+    batchable = False
+
     def __init__(self, fsid, cluster_name):
         """
         Requiring cluster_name and fsid is redundant (ideally everything would
@@ -80,6 +84,10 @@ class UserRequestBase(object):
     def minion_id(self):
         return self._minion_id
 
+    @property
+    def cluster_name(self):
+        return self._cluster_name
+
     @property
     def associations(self):
         """
@@ -109,6 +117,15 @@ class UserRequestBase(object):
         else:
             return "Completed successfully"
 
+    @property
+    def outcomes(self):
+        """
+        For requests acting on several objects at once, a list of dicts with the
+        'id' of each object and the 'outcome' for it so far.  None for requests
+        that only report success or failure as a whole.
+        """
+        return None
+
     @property
     def awaiting_versions(self):
         """
@@ -131,6 +148,25 @@ class UserRequestBase(object):
 
         self.state = self.SUBMITTED
 
+    def hold(self, minion_id):
+        """
+        Like submit, but leave the remote execution to be started later, either
+        with start() or by running the request's commands in a CommandBatch.
+        """
+        assert self.state == self.NEW
+
+        self._minion_id = minion_id
+        self.state = self.SUBMITTED
+
+    def start(self):
+        """
+        Start the remote execution of a request that was held.
+        """
+        assert self.state == self.SUBMITTED
+        assert self.jid is None
+
+        self._submit()
+
     def _submit(self):
         raise NotImplementedError()
 
@@ -149,6 +185,18 @@ class UserRequestBase(object):
         # assume completion of a JID means the job is now done.
         self.complete()
 
+    def fail_jid(self, result):
+        """
+        Call this when remote execution reports an error in ``result``, a dict
+        with an 'error_status'.
+
+        The default is to complete in error straight away.  Implementations which
+        override this must update .jid as for complete_jid.
+        """
+        self.jid = None
+        self.set_error(result['error_status'])
+        self.complete()
+
     def complete(self):
         """
         Call this when you're all done
@@ -183,10 +231,19 @@ class RadosRequest(UserRequest):
     """
     A user request whose remote operations consist of librados mon commands
     """
+    batchable = True
+
     def __init__(self, headline, fsid, cluster_name, commands):
         self._commands = commands
         super(RadosRequest, self).__init__(headline, fsid, cluster_name)
 
+    @property
+    def commands(self):
+        """
+        The commands that the request starts with
+        """
+        return self._commands
+
     def _submit(self, commands=None):
         if commands is None:
             commands = self._commands
@@ -276,6 +333,71 @@ class OsdMapModifyingRequest(RadosRequest):
             self.log.debug("check pending (%s < %s)" % (osd_map.version, self._await_version))
 
 
+class BulkOsdModifyingRequest(OsdMapModifyingRequest):
+    """
+    An OsdMapModifyingRequest acting on several OSDs, which reports
+    the outcome for each of them.
+
+    The commands run in order and stop at the first failure.  If any
+    commands were applied before that, the request still waits for the
+    OSD map epoch that they produced before completing (in error), so that
+    the OSDs reported as complete are up to date when it does.
+    """
+
+    PENDING = 'pending'
+    OSD_COMPLETE = 'complete'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+    UNCHANGED = 'unchanged'
+
+    # Where an OSD is affected by more than one command, the worst of their outcomes
+    # is reported for it
+    _SEVERITY = [OSD_COMPLETE, PENDING, SKIPPED, FAILED]
+
+    def __init__(self, headline, fsid, cluster_name, commands, command_osds, osd_ids):
+        """
+        :param command_osds: For each of ``commands``, a list of the OSD IDs it modifies
+        :param osd_ids: All the OSD IDs in the request, including any left unchanged
+        """
+        super(BulkOsdModifyingRequest, self).__init__(headline, fsid, cluster_name, commands)
+        self._command_osds = command_osds
+        self._osd_ids = osd_ids
+
+    def fail_jid(self, result):
+        self.set_error(result['error_status'])
+        if result['results']:
+            self.complete_jid(result)
+        else:
+            self.jid = None
+            self.result = result
+            self.complete()
+
+    def _command_outcome(self, index):
+        if self.result is None:
+            return self.FAILED if self.state == self.COMPLETE else self.PENDING
+        elif not self.result['error']:
+            return self.OSD_COMPLETE
+
+        applied = len(self.result['results'])
+        if index < applied:
+            return self.OSD_COMPLETE
+        elif index == applied:
+            return self.FAILED
+        else:
+            return self.SKIPPED
+
+    @property
+    def outcomes(self):
+        by_osd = {}
+        for index, osd_ids in enumerate(self._command_osds):
+            outcome = self._command_outcome(index)
+            for osd_id in osd_ids:
+                if osd_id not in by_osd or self._SEVERITY.index(outcome) > self._SEVERITY.index(by_osd[osd_id]):
+                    by_osd[osd_id] = outcome
+
+        return [{'id': osd_id, 'outcome': by_osd.get(osd_id, self.UNCHANGED)} for osd_id in self._osd_ids]
+
+
 class PoolCreatingRequest(OsdMapModifyingRequest):
     """
     Like an OsdMapModifyingRequest, but additionally wait for all PGs in the resulting pool
@@ -420,6 +542,9 @@ class PgCreatingRequest(OsdMapModifyingRequest):
     OSD_MAP_WAIT = 'osd_map_wait'
     PG_MAP_WAIT = 'pg_map_wait'
 
+    # Goes on to run more commands against its pool, after the first job
+    batchable = False
+
     def __init__(self, headline, fsid, cluster_name, commands,
                  pool_id, pool_name, pgp_num,
                  initial_pg_count, final_pg_count, block_size):
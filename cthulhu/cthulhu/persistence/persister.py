@@ -3,8 +3,14 @@
 from collections import namedtuple
 import logging
 import datetime
+import gzip
+import json
+import os
 from calamari_common.db.event import Event
+from calamari_common.db.request import UserRequestRecord
+from calamari_common.types import severity_from_str, severity_str
 
+from dateutil.tz import tzutc
 import gevent.greenlet
 import gevent.queue
 import gevent.event
@@ -31,6 +37,50 @@ DeferredCall = namedtuple('DeferredCall', ['fn', 'args', 'kwargs'])
 CLUSTER_MAP_RETENTION = datetime.timedelta(seconds=int(config.get('cthulhu', 'cluster_map_retention')))
 
 
+def parse_event_retention(retention_str):
+    """
+    Parse a setting like "CRITICAL=365,INFO=30" into a dict of severity
+    to timedelta.  Severities which are omitted, or given zero days, are kept forever.
+    """
+    retention = {}
+    for item in [i.strip() for i in retention_str.split(",") if i.strip()]:
+        severity, days = item.split("=")
+        days = int(days)
+        if days > 0:
+            retention[severity_from_str(severity.strip().upper())] = datetime.timedelta(days=days)
+    return retention
+
+
+EVENT_RETENTION = parse_event_retention(config.get('cthulhu', 'event_retention'))
+EVENT_PRUNE_BATCH_SIZE = int(config.get('cthulhu', 'event_prune_batch_size'))
+EVENT_ARCHIVE_PATH = config.get('cthulhu', 'event_archive_path')
+
+
+def request_dict(record):
+    """
+    A UserRequestRecord in the form that RpcInterface gives UserRequests
+    """
+    def isoformat(when):
+        if when is None:
+            return None
+        elif when.tzinfo is None:
+            # Backends without timezone support give back naive UTC times
+            when = when.replace(tzinfo=tzutc())
+        return when.isoformat()
+
+    return {
+        'id': record.id,
+        'state': record.state,
+        'error': record.error,
+        'error_message': record.error_message,
+        'status': record.status,
+        'headline': record.headline,
+        'requested_at': isoformat(record.requested_at),
+        'completed_at': isoformat(record.completed_at),
+        'outcomes': json.loads(record.outcomes) if record.outcomes is not None else None
+    }
+
+
 class Persister(gevent.greenlet.Greenlet):
     """
     Asynchronously persist a queue of updates.  This is for use by classes
@@ -126,6 +176,125 @@ class Persister(gevent.greenlet.Greenlet):
                 when=event.when,
                 **event.associations))
 
+    def _prune_events(self):
+        """
+        Delete events older than the retention period for their severity, oldest
+        first and at most EVENT_PRUNE_BATCH_SIZE per severity, so that one call never
+        holds a long transaction.  If there is more to delete, queue another call
+        behind whatever other updates are waiting.
+        """
+        more = False
+        t_now = now()
+        for severity, retention in EVENT_RETENTION.items():
+            expired = self._session.query(Event).filter(
+                Event.severity == severity,
+                Event.when < t_now - retention).order_by(Event.when).limit(EVENT_PRUNE_BATCH_SIZE).all()
+            if not expired:
+                continue
+
+            if EVENT_ARCHIVE_PATH:
+                self._archive_events(expired)
+
+            self._session.query(Event).filter(Event.id.in_([e.id for e in expired])).delete(synchronize_session=False)
+            log.debug("Pruned %s %s events" % (len(expired), severity_str(severity)))
+            if len(expired) == EVENT_PRUNE_BATCH_SIZE:
+                more = True
+
+        if more:
+            self._queue.put(DeferredCall(self._prune_events, [], {}))
+
+    def _archive_events(self, events):
+        """
+        Append events to one gzipped JSON-lines file per day, so that archives
+        can be expired or shipped elsewhere a day at a time.
+        """
+        by_day = {}
+        for event in events:
+            by_day.setdefault(event.when.strftime("%Y-%m-%d"), []).append(event)
+
+        for day, day_events in by_day.items():
+            path = os.path.join(EVENT_ARCHIVE_PATH, "cthulhu_event-{0}.jsonl.gz".format(day))
+            # Appending to a gzip file adds a new member, which readers treat as one stream
+            f = gzip.open(path, 'ab')
+            try:
+                for event in day_events:
+                    f.write(json.dumps({
+                        'id': event.id,
+                        'when': event.when.isoformat(),
+                        'severity': severity_str(event.severity),
+                        'message': event.message,
+                        'fsid': event.fsid,
+                        'fqdn': event.fqdn,
+                        'service_type': event.service_type,
+                        'service_id': event.service_id
+                    }) + "\n")
+            finally:
+                f.close()
+
+    def _save_request(self, request):
+        self._session.add(UserRequestRecord(
+            id=request.id,
+            fsid=request.fsid,
+            state=request.state,
+            error=request.error,
+            error_message=request.error_message,
+            status=request.status,
+            headline=request.headline,
+            requested_at=request.requested_at,
+            completed_at=request.completed_at,
+            outcomes=json.dumps(request.outcomes) if request.outcomes is not None else None))
+
+    def get_request(self, request_id):
+        """
+        Read back a request saved with save_request.  Unlike updates this happens
+        straight away, in a session of its own.
+
+        :return: A dict like request_dict gives, or None if there is no such request
+        """
+        session = Session()
+        try:
+            record = session.query(UserRequestRecord).get(request_id)
+            return request_dict(record) if record is not None else None
+        finally:
+            session.close()
+
+    def get_requests(self, fsid, completed_before, limit, key=None, reverse=False, count=True):
+        """
+        Read back requests saved with save_request, most recently requested first.
+
+        :param fsid: Only requests for this cluster, or None for all
+        :param completed_before: Only requests completed at or before this time
+        :param limit: At most this many requests, or None for all
+        :param key: Optionally, a (requested_at, id) tuple to only read requests ordered
+                    after, so that reading a page costs a range scan of the index rather
+                    than reading every request before it
+        :param reverse: Least recently requested first, and those ordered before ``key``
+        :param count: Whether to count all the matching requests, which means reading all of them
+        :return: 2-tuple of the number of matching requests (None if not counted), list of
+                 dicts like request_dict gives
+        """
+        requested_at, request_id = UserRequestRecord.requested_at, UserRequestRecord.id
+        session = Session()
+        try:
+            query = session.query(UserRequestRecord).filter(UserRequestRecord.completed_at <= completed_before)
+            if fsid is not None:
+                query = query.filter(UserRequestRecord.fsid == fsid)
+            total = query.count() if count else None
+
+            if reverse:
+                if key is not None:
+                    query = query.filter((requested_at > key[0]) | ((requested_at == key[0]) & (request_id > key[1])))
+                query = query.order_by(requested_at.asc(), request_id.asc())
+            else:
+                if key is not None:
+                    query = query.filter((requested_at < key[0]) | ((requested_at == key[0]) & (request_id < key[1])))
+                query = query.order_by(requested_at.desc(), request_id.desc())
+            if limit is not None:
+                query = query.limit(limit)
+            return total, [request_dict(r) for r in query]
+        finally:
+            session.close()
+
     def _run(self):
         log.info("Persister listening")
 
@@ -1,23 +1,4 @@
 
-
-from sqlalchemy import Column, String, Text, DateTime, Integer, LargeBinary
-from calamari_common.db.base import Base
-
-
-class SyncObject(Base):
-    """
-    A table for storing a FIFO of ClusterMonitor 'sync objects', i.e.
-    cluster maps.
-    """
-    __tablename__ = 'cthulhu_sync_object'
-
-    # TODO: composite PK
-    fsid = Column(Text, primary_key=True)
-    cluster_name = Column(Text)  # FIXME this is denormalized because currently there isn't a cluster table
-    sync_type = Column(String, primary_key=True)
-    version = Column(Integer, nullable=True, primary_key=True)
-    when = Column(DateTime, index=True)
-    data = Column(LargeBinary)
-
-    def __repr__(self):
-        return "<SyncObject %s/%s/%s>" % (self.fsid, self.sync_type, self.version if self.version else self.when)
+# The model lives in calamari_common so that the REST API can read the
+# sync object history directly: this import is kept for existing users.
+from calamari_common.db.sync_object import SyncObject  # noqa
@@ -12,6 +12,30 @@ def now():
     return datetime.datetime.utcnow().replace(tzinfo=tz.tzutc())
 
 
+def sort_rows(rows, ordering, sort_keys):
+    """
+    Sort a list of dicts by a comma separated list of keys, each optionally
+    prefixed with '-' for descending order, like 'host,-reweight'.  The sort
+    is stable, so rows that compare equal stay in their original order.
+
+    :param sort_keys: Dict of the key names that may appear in ``ordering`` to the
+                      dict keys that they refer to
+    :raises ValueError: if ``ordering`` names a key that isn't in ``sort_keys``
+    """
+    keys = []
+    for key in ordering.split(","):
+        key = key.strip()
+        name = key.lstrip("-")
+        if name not in sort_keys:
+            raise ValueError("Cannot sort by '%s', must be one of %s" % (name, ", ".join(sorted(sort_keys.keys()))))
+        keys.append((sort_keys[name], key.startswith("-")))
+
+    rows = list(rows)
+    for field, descending in reversed(keys):
+        rows.sort(key=lambda r: r.get(field), reverse=descending)
+    return rows
+
+
 class Ticker(gevent.greenlet.Greenlet):
     def __init__(self, period, callback, *args, **kwargs):
         super(Ticker, self).__init__(*args, **kwargs)
@@ -0,0 +1,87 @@
+import datetime
+
+import gevent
+from django.utils.unittest import TestCase
+from mock import MagicMock
+
+from calamari_common.types import WARNING
+from cthulhu.manager.change_feed import ChangeFeed
+
+
+class TestChangeFeed(TestCase):
+    def setUp(self):
+        self.feed = ChangeFeed(5)
+
+    def _token(self):
+        return self.feed.get(None, 0)['since']
+
+    def test_changes_since(self):
+        token = self._token()
+        self.feed.on_sync_object('abc', 'osd_map', 10)
+        request = MagicMock(fsid='abc', id='req1', state='complete', error=False)
+        self.feed.on_request(request)
+
+        result = self.feed.get(token, 0)
+        self.assertFalse(result['reset'])
+        self.assertEqual(result['changes'], [
+            {'type': 'sync_object', 'fsid': 'abc', 'sync_type': 'osd_map', 'version': 10},
+            {'type': 'request', 'fsid': 'abc', 'id': 'req1', 'state': 'complete', 'error': False}
+        ])
+
+        # Nothing new since the returned token
+        self.assertEqual(self.feed.get(result['since'], 0)['changes'], [])
+
+    def test_event(self):
+        token = self._token()
+        event = MagicMock(severity=WARNING, message="OSD 1 down", when=datetime.datetime(2014, 1, 1),
+                          associations={'fsid': 'abc'})
+        self.feed.on_event(event)
+        self.assertEqual(self.feed.get(token, 0)['changes'], [
+            {'type': 'event', 'severity': 'WARNING', 'message': "OSD 1 down", 'when': '2014-01-01T00:00:00',
+             'fsid': 'abc'}
+        ])
+
+    def test_sync_object_collapsed(self):
+        token = self._token()
+        self.feed.on_sync_object('abc', 'osd_map', 10)
+        self.feed.on_sync_object('abc', 'pg_summary', 3)
+        self.feed.on_sync_object('abc', 'osd_map', 11)
+        self.assertEqual([(c['sync_type'], c['version']) for c in self.feed.get(token, 0)['changes']],
+                         [('pg_summary', 3), ('osd_map', 11)])
+
+    def test_fsid_filter(self):
+        token = self._token()
+        self.feed.on_sync_object('abc', 'osd_map', 10)
+        self.feed.on_sync_object('def', 'osd_map', 20)
+        self.assertEqual([c['fsid'] for c in self.feed.get(token, 0, 'def')['changes']], ['def'])
+
+    def test_reset(self):
+        # Tokens from another feed, e.g. before a restart
+        self.assertTrue(self.feed.get(ChangeFeed(5).get(None, 0)['since'], 0)['reset'])
+        self.assertTrue(self.feed.get("rubbish", 0)['reset'])
+
+        # Tokens whose changes have fallen off the end of the log
+        token = self._token()
+        for i in range(0, 5):
+            self.feed.on_sync_object('abc', 'osd_map', i)
+        self.assertFalse(self.feed.get(token, 0)['reset'])
+        self.feed.on_sync_object('abc', 'osd_map', 5)
+        result = self.feed.get(token, 0)
+        self.assertTrue(result['reset'])
+        self.assertFalse(self.feed.get(result['since'], 0)['reset'])
+
+    def test_wait(self):
+        token = self._token()
+        self.assertEqual(self.feed.get(token, 0.01)['changes'], [])
+
+        gevent.spawn_later(0.01, self.feed.on_sync_object, 'abc', 'osd_map', 10)
+        result = self.feed.get(token, 5)
+        self.assertEqual([c['version'] for c in result['changes']], [10])
+
+    def test_wait_other_fsid(self):
+        # Changes to other clusters don't end the wait
+        token = self._token()
+        gevent.spawn_later(0.01, self.feed.on_sync_object, 'def', 'osd_map', 10)
+        gevent.spawn_later(0.02, self.feed.on_sync_object, 'abc', 'osd_map', 20)
+        result = self.feed.get(token, 5, 'abc')
+        self.assertEqual([c['version'] for c in result['changes']], [20])
@@ -0,0 +1,104 @@
+from django.utils.unittest import TestCase
+from mock import MagicMock, patch
+
+from cthulhu.manager import command_scheduler
+from cthulhu.manager.command_scheduler import CommandBatch, CommandScheduler, plan_batches
+from cthulhu.manager.user_request import OsdMapModifyingRequest, PgCreatingRequest, RadosRequest
+
+
+def pool_set(pool_name, var='size', val=3):
+    return ('osd pool set', {'pool': pool_name, 'var': var, 'val': val})
+
+
+def request(*commands):
+    return OsdMapModifyingRequest("Doing things", 'abc', 'ceph', list(commands))
+
+
+class TestPlanBatches(TestCase):
+    def _plan(self, requests):
+        return [[requests.index(r) for r in batch] for batch in plan_batches(requests)]
+
+    def test_different_pools(self):
+        requests = [request(pool_set('rbd')), request(pool_set('data'), pool_set('data', 'min_size', 2)),
+                    request(('osd pool create', {'pool': 'new', 'pg_num': 64}))]
+        self.assertEqual(self._plan(requests), [[0, 1, 2]])
+
+    def test_same_pool(self):
+        # A delete and an update to the same pool never go in the same job, and stay in order
+        requests = [request(pool_set('rbd')), request(pool_set('data')),
+                    request(('osd pool delete', {'pool': 'rbd', 'pool2': 'rbd',
+                                                 'sure': '--yes-i-really-really-mean-it'})),
+                    request(pool_set('metadata'))]
+        self.assertEqual(self._plan(requests), [[0, 1], [2, 3]])
+
+        # A rename conflicts with changes to either name
+        requests = [request(('osd pool rename', {'srcpool': 'rbd', 'destpool': 'rbd2'})), request(pool_set('rbd2'))]
+        self.assertEqual(self._plan(requests), [[0], [1]])
+
+    def test_osds(self):
+        requests = [request(('osd out', {'ids': ['1', '2']})), RadosRequest("Scrub", 'abc', 'ceph', [
+            ('osd scrub', {'who': '3'})]), RadosRequest("Scrub", 'abc', 'ceph', [('osd scrub', {'who': '2'})])]
+        self.assertEqual(self._plan(requests), [[0, 1], [2]])
+
+    def test_alone(self):
+        crush = request(('osd setcrushmap', {'data': 'map'}))
+        grow = PgCreatingRequest("Growing pool", 'abc', 'ceph', [], 1, 'rbd', 128, 64, 128, 32)
+        requests = [request(pool_set('rbd')), crush, request(pool_set('data')), grow, request(pool_set('metadata'))]
+        self.assertEqual(self._plan(requests), [[0], [1], [2], [3], [4]])
+
+    @patch.object(command_scheduler, 'MAX_BATCH_SIZE', 2)
+    def test_max_size(self):
+        requests = [request(pool_set('pool%s' % i)) for i in range(0, 5)]
+        self.assertEqual(self._plan(requests), [[0, 1], [2, 3], [4]])
+
+
+class TestCommandBatch(TestCase):
+    def test_split(self):
+        requests = [request(pool_set('rbd'), pool_set('rbd', 'min_size', 2)), request(pool_set('data')),
+                    request(pool_set('metadata'), pool_set('metadata', 'min_size', 2)), request(pool_set('other'))]
+        batch = CommandBatch(requests)
+
+        result = {'error': False, 'results': ['a', 'b', 'c', 'd', 'e', 'f'], 'error_status': '',
+                  'versions': {'osd_map': 5}, 'fsid': 'abc'}
+        self.assertEqual([r['results'] for _, r in batch.split(True, result)], [['a', 'b'], ['c'], ['d', 'e'], ['f']])
+
+        # The fourth command, the second of the third request, fails
+        result = dict(result, error=True, results=['a', 'b', 'c'], error_status="EINVAL")
+        split = [r for _, r in batch.split(True, result)]
+        self.assertEqual([(r['error'], r['results']) for r in split[0:3]],
+                         [(False, ['a', 'b']), (False, ['c']), (True, [])])
+        self.assertEqual(split[2]['error_status'], "EINVAL")
+        self.assertEqual(split[2]['versions'], {'osd_map': 5})
+        self.assertEqual(split[3], None)
+
+        self.assertEqual([r for _, r in batch.split(False, "Traceback")], ["Traceback"] * 4)
+
+
+class TestCommandScheduler(TestCase):
+    def test_order(self):
+        start = MagicMock()
+        scheduler = CommandScheduler(start)
+        requests = [request(pool_set('rbd')), request(pool_set('data')), request(pool_set('rbd', 'size', 2)),
+                    request(pool_set('metadata')), request(('osd setcrushmap', {'data': 'map'})),
+                    request(pool_set('other'))]
+        for r in requests:
+            scheduler.add(r)
+        scheduler.flush()
+
+        # The change to rbd waits for the first, and the CRUSH change (and all after it) for everything
+        self.assertEqual([c[0][0] for c in start.call_args_list], [requests[0:2]])
+
+        scheduler.finished(requests[1])
+        self.assertEqual(start.call_count, 1)
+        scheduler.finished(requests[0])
+        self.assertEqual([c[0][0] for c in start.call_args_list], [requests[0:2], requests[2:4]])
+
+        scheduler.finished(requests[2])
+        scheduler.finished(requests[3])
+        self.assertEqual(start.call_args[0][0], [requests[4]])
+        scheduler.finished(requests[4])
+        self.assertEqual(start.call_args[0][0], [requests[5]])
+
+        # Requests that it didn't start are ignored
+        scheduler.finished(request(pool_set('rbd')))
+        self.assertEqual(start.call_count, 4)
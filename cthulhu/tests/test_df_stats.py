@@ -0,0 +1,83 @@
+from django.utils.unittest import TestCase
+from mock import patch
+
+from calamari_common.remote.base import Unavailable
+from cthulhu.manager import df_stats
+from cthulhu.manager.df_stats import DfStats, parse_df_stats
+
+
+DF = {
+    'stats': {'total_bytes': 4096 * 1024, 'total_used_bytes': 1024 * 1024, 'total_avail_bytes': 3072 * 1024,
+              'total_objects': 3},
+    'pools': [
+        {'name': 'rbd', 'id': 2, 'stats': {'bytes_used': 2048, 'objects': 1}},
+        {'name': 'data', 'id': 0, 'stats': {'bytes_used': 100, 'objects': 2}}
+    ]
+}
+
+PG_POOLS = [
+    {'poolid': 0, 'stat_sum': {'num_bytes': 100, 'num_objects': 2, 'num_object_clones': 0, 'num_object_copies': 6,
+                               'num_objects_missing_on_primary': 0, 'num_objects_unfound': 0,
+                               'num_objects_degraded': 1, 'num_read': 5, 'num_read_kb': 50, 'num_write': 7,
+                               'num_write_kb': 70}},
+    {'poolid': 2, 'stat_sum': {'num_bytes': 2048, 'num_objects': 1}}
+]
+
+
+class TestDfStats(TestCase):
+    def test_parse(self):
+        cluster, pools = parse_df_stats(DF, PG_POOLS)
+        self.assertEqual(cluster, {'kb': 4096, 'kb_used': 1024, 'kb_avail': 3072, 'num_objects': 3})
+        self.assertEqual([(p['id'], p['name']) for p in pools], [(0, 'data'), (2, 'rbd')])
+        self.assertEqual(pools[0]['num_kb'], 1)
+        self.assertEqual(pools[0]['num_object_copies'], 6)
+        self.assertEqual((pools[0]['num_rd'], pools[0]['num_rd_kb'], pools[0]['num_wr'], pools[0]['num_wr_kb']),
+                         (5, 50, 7, 70))
+        self.assertEqual(pools[1]['num_kb'], 2)
+        self.assertEqual(pools[1]['num_rd'], 0)
+
+    def test_parse_firefly(self):
+        df = dict(DF, stats={'total_space': 4096, 'total_used': 1024, 'total_avail': 3072})
+        cluster, pools = parse_df_stats(df, PG_POOLS)
+        self.assertEqual(cluster, {'kb': 4096, 'kb_used': 1024, 'kb_avail': 3072, 'num_objects': 3})
+
+    @patch.object(df_stats, 'remote')
+    def test_collection(self, remote):
+        remote.run_job.return_value = 'jid1'
+        stats = DfStats('abc', 'ceph', 60)
+        self.assertEqual(stats.get()['updated'], None)
+
+        stats.tick('mon1')
+        self.assertEqual(stats.jid, 'jid1')
+        remote.run_job.assert_called_once_with('mon1', 'ceph.get_df_stats', {'fsid': 'abc', 'cluster_name': 'ceph'})
+
+        # Doesn't start another while one is in progress, even if asked to
+        stats.tick('mon1')
+        collected = stats.refresh('mon1')
+        self.assertEqual(remote.run_job.call_count, 1)
+
+        stats.on_job_complete(True, {'fsid': 'abc', 'df': DF, 'pg_pools': PG_POOLS})
+        self.assertTrue(collected.is_set())
+        self.assertEqual(stats.jid, None)
+        result = stats.get()
+        self.assertNotEqual(result['updated'], None)
+        self.assertEqual(len(result['pools']), 2)
+
+        # Not due again until the period has passed
+        stats.tick('mon1')
+        self.assertEqual(remote.run_job.call_count, 1)
+        stats.refresh('mon1')
+        self.assertEqual(remote.run_job.call_count, 2)
+
+    @patch.object(df_stats, 'remote')
+    def test_failure(self, remote):
+        remote.run_job.return_value = 'jid1'
+        stats = DfStats('abc', 'ceph', 60)
+        collected = stats.refresh('mon1')
+        stats.on_job_complete(False, "Traceback...")
+        self.assertTrue(collected.is_set())
+        self.assertEqual(stats.get()['updated'], None)
+
+        remote.run_job.side_effect = Unavailable()
+        self.assertFalse(stats.refresh('mon1').is_set())
+        self.assertEqual(stats.jid, None)
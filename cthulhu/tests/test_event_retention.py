@@ -0,0 +1,81 @@
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.utils.unittest import TestCase
+from mock import patch
+from sqlalchemy import create_engine
+
+from calamari_common.db.event import Event
+from calamari_common.types import CRITICAL, WARNING, INFO
+from cthulhu.persistence import persister
+from cthulhu.util import now
+
+
+class TestEventRetention(TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Event.__table__.create(engine)
+        persister.Session.configure(bind=engine)
+        self.persister = persister.Persister()
+        self.session = self.persister._session
+
+        t_now = now()
+        for days_ago in range(0, 10):
+            for severity in (CRITICAL, WARNING, INFO):
+                self.session.add(Event(when=t_now - datetime.timedelta(days=days_ago, hours=1),
+                                       severity=severity,
+                                       message="%s days ago" % days_ago))
+        self.session.commit()
+
+        self.archive_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_path)
+
+    def _count(self, severity):
+        return self.session.query(Event).filter_by(severity=severity).count()
+
+    def test_parse_retention(self):
+        self.assertEqual(persister.parse_event_retention("CRITICAL=0, warning=7,INFO=1"), {
+            WARNING: datetime.timedelta(days=7),
+            INFO: datetime.timedelta(days=1)
+        })
+
+    @patch.object(persister, 'EVENT_RETENTION', {WARNING: datetime.timedelta(days=5), INFO: datetime.timedelta(days=2)})
+    @patch.object(persister, 'EVENT_PRUNE_BATCH_SIZE', 3)
+    def test_prune_in_batches(self):
+        self.persister._prune_events()
+        self.session.commit()
+        # One batch of each severity goes, and another call is queued for the rest
+        self.assertEqual(self._count(CRITICAL), 10)
+        self.assertEqual(self._count(WARNING), 7)
+        self.assertEqual(self._count(INFO), 7)
+        self.assertEqual(self.persister._queue.qsize(), 1)
+
+        while not self.persister._queue.empty():
+            call = self.persister._queue.get()
+            call.fn(*call.args, **call.kwargs)
+            self.session.commit()
+
+        self.assertEqual(self._count(CRITICAL), 10)
+        self.assertEqual(self._count(WARNING), 5)
+        self.assertEqual(self._count(INFO), 2)
+
+    @patch.object(persister, 'EVENT_RETENTION', {INFO: datetime.timedelta(days=8)})
+    def test_archive(self):
+        with patch.object(persister, 'EVENT_ARCHIVE_PATH', self.archive_path):
+            self.persister._prune_events()
+        self.session.commit()
+
+        archived = []
+        for filename in sorted(os.listdir(self.archive_path)):
+            self.assertTrue(filename.startswith("cthulhu_event-") and filename.endswith(".jsonl.gz"))
+            archived.extend([json.loads(l) for l in gzip.open(os.path.join(self.archive_path, filename))])
+
+        self.assertEqual(sorted([e['message'] for e in archived]), ["8 days ago", "9 days ago"])
+        self.assertEqual(set([e['severity'] for e in archived]), set(["INFO"]))
+        self.assertEqual(self._count(INFO), 8)
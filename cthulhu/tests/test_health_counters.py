@@ -0,0 +1,56 @@
+from django.utils.unittest import TestCase
+
+from calamari_common.types import OsdMap, MdsMap, MonStatus, PgSummary, MonMap
+from cthulhu.manager.health_counters import HealthCounters
+from tests.util import load_fixture
+
+
+class TestHealthCounters(TestCase):
+    def setUp(self):
+        self.counters = HealthCounters()
+
+    def test_empty(self):
+        self.assertEqual(self.counters.counters['osd']['ok'], {'count': 0, 'states': {}})
+        self.assertEqual(self.counters.counters['mds'],
+                         {'total': 0, 'up_in': 0, 'up_not_in': 0, 'not_up_not_in': 0})
+        self.assertEqual(self.counters.counters['pg']['critical'], {'count': 0, 'states': {}})
+
+    def test_osd(self):
+        osd_map = load_fixture('osd_map.json')
+        osd_map['osds'][0]['up'] = 0
+        self.counters.on_sync_object(OsdMap, osd_map)
+        osd = self.counters.counters['osd']
+        self.assertEqual(osd['ok']['count'], len(osd_map['osds']) - 1)
+        self.assertEqual(osd['warn'], {'count': 1, 'states': {'down/in': 1}})
+        self.assertEqual(osd['critical'], {'count': 0, 'states': {}})
+
+    def test_mds(self):
+        self.counters.on_sync_object(MdsMap, load_fixture('mds_map.json'))
+        mds = self.counters.counters['mds']
+        self.assertEqual(mds['total'], mds['up_in'] + mds['up_not_in'] + mds['not_up_not_in'])
+
+    def test_mon(self):
+        self.counters.on_sync_object(MonStatus, {'quorum': [0, 2], 'monmap': {'mons': [
+            {'rank': 0}, {'rank': 1}, {'rank': 2}
+        ]}})
+        mon = self.counters.counters['mon']
+        self.assertEqual(mon['ok'], {'count': 2, 'states': {'in': 2}})
+        self.assertEqual(mon['critical'], {'count': 1, 'states': {'out': 1}})
+
+    def test_pg(self):
+        self.counters.on_sync_object(PgSummary, {'all': {
+            'active+clean': 10,
+            'active+degraded': 3,
+            'stale+active+clean': 2,
+            'newstate': 1
+        }})
+        pg = self.counters.counters['pg']
+        self.assertEqual(pg['ok'], {'count': 10, 'states': {'active': 10, 'clean': 10}})
+        self.assertEqual(pg['warn'], {'count': 3, 'states': {'degraded': 3}})
+        self.assertEqual(pg['critical'], {'count': 3, 'states': {'stale': 2, 'newstate': 1}})
+
+    def test_only_section_updated(self):
+        osd = self.counters.counters['osd']
+        self.counters.on_sync_object(PgSummary, {'all': {'active+clean': 1}})
+        self.counters.on_sync_object(MonMap, {})
+        self.assertIs(self.counters.counters['osd'], osd)
@@ -1,8 +1,11 @@
 from django.utils.unittest import TestCase
 from django.utils.unittest.case import skipIf
+from mock import MagicMock
 
 import os
 
+from calamari_common.types import Config, MonMap
+
 if os.environ.get('CALAMARI_CONFIG'):
     from cthulhu.manager import manager, rpc, cluster_monitor, plugin_monitor
 
@@ -48,6 +51,20 @@ class TestClusterMonitor(TestCase):
     def testCreateClusterMonitor(self):
         pass
 
+    @skipIf(os.environ.get('CALAMARI_CONFIG') is None, "needs CALAMARI_CONFIG set")
+    def testRefreshSnapshots(self):
+        snapshots = MagicMock()
+        monitor = cluster_monitor.ClusterMonitor('abc', 'ceph', None, None, None, None, snapshots)
+        monitor._sync_objects.set_map(MonMap, 10, {'epoch': 10})
+        monitor._sync_objects.set_map(Config, 'd41d8cd9', {'osd_pool_default_size': '3'})
+
+        # Everything we have is published again, and nothing we don't
+        monitor.refresh_snapshots()
+        self.assertEqual(sorted(c[0] for c in snapshots.publish.call_args_list), [
+            ('abc', 'config', 'd41d8cd9', {'osd_pool_default_size': '3'}),
+            ('abc', 'mon_map', 10, {'epoch': 10})
+        ])
+
 
 class TestPluginMonitor(TestCase):
     def setUp(self):
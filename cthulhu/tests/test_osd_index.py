@@ -0,0 +1,143 @@
+from django.utils.unittest import TestCase
+from mock import MagicMock
+
+from calamari_common.types import OsdMap, PgSummary, NotFound, ServiceId, OSD, POOL
+from cthulhu.manager.cluster_monitor import ClusterMonitor
+from cthulhu.manager.osd_index import OsdIndex
+from cthulhu.manager.rpc import RpcInterface
+from cthulhu.manager.server_monitor import ServerMonitor, ServerState, ServiceState
+from tests.util import load_fixture
+
+FSID = 'abc123'
+
+PG_SUMMARY = {
+    'by_osd': {
+        0: {'active+clean': 10},
+        1: {'active+clean': 8, 'active+degraded': 2},
+        4: {'peering': 1}
+    },
+    'by_pool': {
+        2: {'active+clean': 64},
+        6: {'active+degraded': 8, 'active+clean': 56}
+    }
+}
+
+
+class TestOsdIndex(TestCase):
+    def setUp(self):
+        osd_map_data = load_fixture('interesting_osd_map.json')
+        osd_map_data['osds'][3]['up'] = 0
+        for device in osd_map_data['crush']['devices']:
+            device['class'] = 'ssd' if device['id'] < 2 else 'hdd'
+        self.osd_map = OsdMap(12, osd_map_data)
+        self.servers = ServerMonitor(MagicMock(), MagicMock(), MagicMock())
+        for fqdn, osd_ids in [('gravel1.rockery', [0, 1]), ('gravel2.rockery', [2, 3])]:
+            self.servers.inject_server(ServerState(fqdn, fqdn.split(".")[0], managed=True,
+                                                   last_contact=None, boot_time=None, ceph_version=None))
+            for osd_id in osd_ids:
+                self.servers.inject_service(ServiceState(FSID, OSD, str(osd_id)), fqdn)
+
+        valid_commands = dict((i, {'valid_commands': ['scrub']}) for i in self.osd_map.osds_by_id.keys())
+        self.index = OsdIndex(FSID, self.osd_map, PG_SUMMARY, self.servers, valid_commands)
+
+    def _ids(self, list_filter):
+        return [r['id'] for r in self.index.select(list_filter)]
+
+    def test_rows(self):
+        self.assertEqual(self._ids({}), [0, 1, 2, 3, 4, 5])
+
+        row = self.index.get(0)
+        self.assertEqual(row['uuid'], self.osd_map.osds_by_id[0]['uuid'])
+        self.assertEqual(row['reweight'], float(self.osd_map.osd_tree_node_by_id[0]['reweight']))
+        self.assertEqual(row['pools'], [2, 4, 5, 6, 7])
+        self.assertEqual(row['backend_device_node'], 'sdb')
+        self.assertEqual(row['osd_journal'], None)
+        self.assertEqual(row['valid_commands'], ['scrub'])
+        self.assertEqual(sorted(row['crush_node_ancestry']), [[-5, -1], [-2, -1]])
+        self.assertEqual(row['server'], 'gravel1.rockery')
+        self.assertEqual(row['host'], 'gravel1')
+        self.assertEqual(self.index.get(1)['pg_states'], {'active': 10, 'clean': 8, 'degraded': 2})
+
+        self.assertEqual(self.index.get(5)['server'], None)
+        self.assertRaises(NotFound, self.index.get, 99)
+
+    def test_select(self):
+        self.assertEqual(self._ids({'id__in': [3, 1, 99]}), [1, 3])
+        self.assertEqual(self._ids({'pool': 6}), [0, 2, 4])
+        self.assertRaises(NotFound, self.index.select, {'pool': 99})
+        self.assertEqual(self._ids({'host': 'gravel2'}), [2, 3])
+        self.assertEqual(self._ids({'host': 'gravel2.rockery'}), [2, 3])
+        self.assertEqual(self._ids({'host': 'nowhere'}), [])
+        self.assertEqual(self._ids({'pg_states': ['degraded', 'peering']}), [1, 4])
+        self.assertEqual(self._ids({'up': False}), [3])
+        self.assertEqual(self._ids({'up': True, 'in': True}), [0, 1, 2, 4, 5])
+        self.assertEqual(self._ids({'crush_ancestor': -3}), [2, 3])
+        self.assertEqual(self._ids({'crush_ancestor': -1}), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(self._ids({'device_class': 'ssd'}), [0, 1])
+
+        # Criteria combine
+        self.assertEqual(self._ids({'pool': 7, 'pg_states': ['clean']}), [0, 1])
+        self.assertEqual(self._ids({'pool': 6, 'host': 'gravel1', 'id__in': [0, 1]}), [0])
+
+    def test_cluster_monitor_cache(self):
+        cluster = ClusterMonitor(FSID, 'ceph', MagicMock(), self.servers, MagicMock(), MagicMock())
+        cluster._sync_objects.set_map(OsdMap, 12, self.osd_map.data)
+        cluster._sync_objects.set_map(PgSummary, 'a', PG_SUMMARY)
+
+        index = cluster.get_osd_index()
+        self.assertEqual(index.get(0)['server'], 'gravel1.rockery')
+        self.assertIs(cluster.get_osd_index(), index)
+
+        # A change to the PG summary or to the servers means a rebuild
+        cluster._sync_objects.set_map(PgSummary, 'b', {'by_osd': {}})
+        rebuilt = cluster.get_osd_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.get(1)['pg_states'], {})
+
+        self.servers.forget_service(self.servers.services[ServiceId(FSID, OSD, '0')])
+        self.assertEqual(cluster.get_osd_index().get(0)['server'], None)
+
+
+class TestListPage(TestCase):
+    def setUp(self):
+        osd_map = OsdMap(12, load_fixture('interesting_osd_map.json'))
+        servers = ServerMonitor(MagicMock(), MagicMock(), MagicMock())
+        for fqdn, osd_ids in [('gravel2.rockery', [0, 1, 2]), ('gravel1.rockery', [3, 4, 5])]:
+            servers.inject_server(ServerState(fqdn, fqdn.split(".")[0], managed=True,
+                                              last_contact=None, boot_time=None, ceph_version=None))
+            for osd_id in osd_ids:
+                servers.inject_service(ServiceState(FSID, OSD, str(osd_id)), fqdn)
+
+        cluster = ClusterMonitor(FSID, 'ceph', MagicMock(), servers, MagicMock(), MagicMock())
+        cluster._sync_objects.set_map(OsdMap, 12, osd_map.data)
+        cluster._sync_objects.set_map(PgSummary, 'a', PG_SUMMARY)
+
+        manager = MagicMock()
+        manager.clusters = {FSID: cluster}
+        self.rpc = RpcInterface(manager)
+
+    def test_osds(self):
+        page = self.rpc.list_page(FSID, OSD, {}, 'host,-id', 2, 3)
+        self.assertEqual(page['count'], 6)
+        self.assertEqual([r['id'] for r in page['results']], [3, 2, 1])
+
+        page = self.rpc.list_page(FSID, OSD, {'pool': 6}, None, 0, None)
+        self.assertEqual(page['count'], 3)
+        self.assertEqual([r['id'] for r in page['results']], [0, 2, 4])
+
+        self.assertRaises(ValueError, self.rpc.list_page, FSID, OSD, {}, 'uuid', 0, None)
+
+    def test_pools(self):
+        page = self.rpc.list_page(FSID, POOL, {}, None, 0, None)
+        self.assertEqual([p['pool'] for p in page['results']], [2, 4, 5, 6, 7])
+
+        page = self.rpc.list_page(FSID, POOL, {}, '-name', 0, 2)
+        self.assertEqual(page['count'], 5)
+        names = sorted([p['pool_name'] for p in self.rpc.list_page(FSID, POOL, {}, None, 0, None)['results']],
+                       reverse=True)
+        self.assertEqual([p['pool_name'] for p in page['results']], names[:2])
+
+        page = self.rpc.list_page(FSID, POOL, {'pg_states': ['degraded']}, None, 0, None)
+        self.assertEqual([p['pool'] for p in page['results']], [6])
+        page = self.rpc.list_page(FSID, POOL, {'id__in': [7, 2, 99], 'pg_states': ['clean']}, None, 0, None)
+        self.assertEqual([p['pool'] for p in page['results']], [2])
@@ -62,6 +62,18 @@ class TestOsdMap(UnitTestCase):
             2: all_osds
         })
 
+    def test_crush_ancestry(self):
+        """
+        That the ancestry of every node is worked out up front, following
+        all of an OSD's parents but only the first parent of a bucket
+        """
+        osd_map = OsdMap(None, INTERESTING_OSD_MAP)
+
+        self.assertEqual(sorted(osd_map.crush_ancestry_by_node_id[0]), [[-5, -1], [-2, -1]])
+        self.assertEqual(osd_map.crush_ancestry_by_node_id[3], [[-3, -1]])
+        self.assertEqual(osd_map.crush_ancestry_by_node_id[-3], [[-1]])
+        self.assertEqual(osd_map.crush_ancestry_by_node_id[-1], [])
+
 
 class TestCrushNodes(UnitTestCase):
 
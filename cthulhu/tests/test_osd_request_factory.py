@@ -2,7 +2,7 @@ from django.utils.unittest import TestCase
 from mock import MagicMock
 
 from cthulhu.manager.osd_request_factory import OsdRequestFactory
-from cthulhu.manager.user_request import RadosRequest
+from cthulhu.manager.user_request import BulkOsdModifyingRequest, RadosRequest
 from calamari_common.types import OSD_IMPLEMENTED_COMMANDS, OsdMap
 
 
@@ -84,3 +84,55 @@ class TestOsdMapUpdates(TestCase):
                                                               'norecover': False,
                                                               'noup': True,
                                                               'pause': True}))
+
+
+class TestBulkOsdUpdate(TestCase):
+    def setUp(self):
+        osd_map = MagicMock()
+        osd_map.osds_by_id = dict((i, {'up': True, 'in': True}) for i in range(0, 4))
+        osd_map.osd_tree_node_by_id = dict((i, {'reweight': 1.0}) for i in range(0, 4))
+        fake_cluster_monitor = MagicMock()
+        fake_cluster_monitor.configure_mock(**{'name': 'ceph', 'fsid': 12345,
+                                               'get_sync_object.return_value': osd_map})
+        self.factory = OsdRequestFactory(fake_cluster_monitor)
+
+    def test_coalesce(self):
+        request = self.factory.update_many(None, [
+            {'id': 0, 'in': False}, {'id': 1, 'in': False, 'reweight': 0.5},
+            {'id': 2, 'up': False}, {'id': 3, 'in': True}])
+        self.assertIsInstance(request, BulkOsdModifyingRequest)
+        self.assertEqual(request._commands, [
+            ('osd out', {'ids': ['0', '1']}),
+            ('osd down', {'ids': ['2']}),
+            ('osd reweight', {'id': 1, 'weight': 0.5})])
+        self.assertEqual([o['outcome'] for o in request.outcomes], ['pending', 'pending', 'pending', 'unchanged'])
+
+    def test_no_op(self):
+        self.assertEqual(self.factory.update_many(None, [{'id': 0, 'in': True}, {'id': 1, 'reweight': 1.0}]), None)
+
+    def test_partial_failure(self):
+        request = self.factory.update_many(None, [
+            {'id': 0, 'in': False}, {'id': 1, 'reweight': 0.5}, {'id': 2, 'reweight': 0.5}])
+        request.state = request.SUBMITTED
+        request.jid = 'jid1'
+        request.fail_jid({'error': True, 'results': [None], 'error_status': "EINVAL",
+                          'versions': {'osd_map': 10}})
+
+        # The 'osd out' was applied, so wait for the map it produced
+        self.assertEqual(request.awaiting_versions, {OsdMap: 10})
+        self.assertEqual(request.outcomes, [{'id': 0, 'outcome': 'complete'},
+                                            {'id': 1, 'outcome': 'failed'},
+                                            {'id': 2, 'outcome': 'skipped'}])
+
+        osd_map = OsdMap(10, None)
+        request.on_map(OsdMap, osd_map)
+        self.assertEqual(request.state, request.COMPLETE)
+        self.assertTrue(request.error)
+
+    def test_first_command_fails(self):
+        request = self.factory.update_many(None, [{'id': 0, 'in': False}, {'id': 1, 'in': False}])
+        request.state = request.SUBMITTED
+        request.jid = 'jid1'
+        request.fail_jid({'error': True, 'results': [], 'error_status': "EINVAL", 'versions': {'osd_map': 10}})
+        self.assertEqual(request.state, request.COMPLETE)
+        self.assertEqual([o['outcome'] for o in request.outcomes], ['failed', 'failed'])
@@ -0,0 +1,250 @@
+from django.utils.unittest import TestCase
+from mock import MagicMock, patch
+from sqlalchemy import create_engine
+
+from calamari_common.db.request import UserRequestRecord
+from calamari_common.types import OsdMap, PgSummary
+from cthulhu.manager import command_scheduler, request_collection, rpc, user_request
+from cthulhu.manager.request_collection import RequestCollection
+from cthulhu.manager.rpc import RpcInterface
+from cthulhu.manager.user_request import RadosRequest, OsdMapModifyingRequest, UserRequest
+from cthulhu.persistence import persister
+
+
+class RequestCollectionTest(TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        UserRequestRecord.__table__.create(engine)
+        persister.Session.configure(bind=engine)
+        self.persister = persister.Persister()
+
+        self.manager = MagicMock()
+        self.manager.persister = self.persister
+        with patch.object(request_collection, 'get_remote'), patch.object(rpc, 'get_remote'):
+            self.requests = RequestCollection(self.manager)
+            self.manager.requests = self.requests
+            self.rpc = RpcInterface(self.manager)
+
+        # Start requests as they're submitted, unless a test says otherwise
+        merge_window = patch.object(command_scheduler, 'MERGE_WINDOW', 0)
+        merge_window.start()
+        self.addCleanup(merge_window.stop)
+
+    def _flush(self):
+        while not self.persister._queue.empty():
+            call = self.persister._queue.get()
+            call.fn(*call.args, **call.kwargs)
+        self.persister._session.commit()
+
+    @patch.object(user_request, 'remote')
+    def _run(self, count, remote, request_class=RadosRequest):
+        requests = []
+        for i in range(0, count):
+            remote.run_job.return_value = "jid%s" % i
+            request = request_class("Request %s" % i, 'abc', 'ceph', [])
+            self.requests.submit(request, 'mon1')
+            requests.append(request)
+        return requests
+
+    def _complete(self, request, osd_map_epoch=None):
+        self.requests.on_completion('mon1', request.jid, True,
+                                    {'error': False, 'results': [], 'versions': {'osd_map': osd_map_epoch}},
+                                    'ceph.rados_commands', {})
+
+
+class TestRequestHistory(RequestCollectionTest):
+    @patch.object(request_collection, 'COMPLETED_REQUEST_LIMIT', 2)
+    def test_evict(self):
+        requests = self._run(5)
+        for request in requests[0:4]:
+            self._complete(request)
+        self._flush()
+
+        # Only the two most recently completed, and the one still running, are kept in memory
+        self.assertEqual(sorted(r.id for r in self.requests.get_all()), sorted(r.id for r in requests[2:]))
+
+        # The rest can still be read
+        evicted = self.rpc.get_request(requests[0].id)
+        self.assertEqual(evicted['headline'], "Request 0")
+        self.assertEqual(evicted['state'], 'complete')
+        self.assertEqual(evicted['requested_at'], requests[0].requested_at.isoformat())
+        self.assertEqual(self.rpc.cancel_request(requests[0].id)['state'], 'complete')
+
+    @patch.object(request_collection, 'COMPLETED_REQUEST_LIMIT', 2)
+    def test_list(self):
+        requests = self._run(5)
+        for request in requests[0:4]:
+            self._complete(request)
+        self._flush()
+
+        newest_first = [r.id for r in reversed(requests)]
+        listing = self.rpc.list_requests({})
+        self.assertEqual(listing['count'], 5)
+        self.assertEqual([r['id'] for r in listing['results']], newest_first)
+
+        # Pages span the requests in memory and in the database
+        page = self.rpc.list_requests({}, 2, 2)
+        self.assertEqual(page['count'], 5)
+        self.assertEqual([r['id'] for r in page['results']], newest_first[2:4])
+
+        listing = self.rpc.list_requests({'state': 'complete'}, 0, 10)
+        self.assertEqual([r['id'] for r in listing['results']], newest_first[1:])
+        listing = self.rpc.list_requests({'state': 'submitted'}, 0, 10)
+        self.assertEqual([r['id'] for r in listing['results']], newest_first[0:1])
+        self.assertEqual(self.rpc.list_requests({'fsid': 'other'})['count'], 0)
+
+    @patch.object(request_collection, 'COMPLETED_REQUEST_LIMIT', 2)
+    def test_list_cursor(self):
+        requests = self._run(5)
+        for request in requests[0:4]:
+            self._complete(request)
+        self._flush()
+
+        def ids(direction, request, count=False):
+            cursor = [direction, request.requested_at.isoformat(), request.id] if request else None
+            listing = self.rpc.list_requests({}, 0, 2, cursor, count)
+            return listing['count'], [r['id'] for r in listing['results']]
+
+        # Pages either side of a request, across those in memory and in the database
+        self.assertEqual(ids('next', None), (None, [requests[4].id, requests[3].id]))
+        self.assertEqual(ids('next', requests[3]), (None, [requests[2].id, requests[1].id]))
+        self.assertEqual(ids('next', requests[1]), (None, [requests[0].id]))
+        self.assertEqual(ids('prev', requests[0]), (None, [requests[2].id, requests[1].id]))
+        self.assertEqual(ids('prev', requests[2]), (None, [requests[4].id, requests[3].id]))
+
+        # Counting counts everything, not just what's beyond the cursor
+        self.assertEqual(ids('next', requests[1], count=True), (5, [requests[0].id]))
+
+
+class TestWaitingRequests(RequestCollectionTest):
+    def test_on_map(self):
+        self.manager.clusters['abc'].get_sync_object.return_value = OsdMap(5, None)
+        requests = self._run(3, request_class=OsdMapModifyingRequest)
+        for request, epoch in zip(requests, [10, 12, 10]):
+            self._complete(request, epoch)
+        self.assertEqual(len(self.requests.get_all(UserRequest.SUBMITTED)), 3)
+
+        # Maps that nobody is waiting for wake nobody
+        with patch.object(OsdMapModifyingRequest, 'on_map') as on_map:
+            self.requests.on_map('abc', OsdMap, OsdMap(9, None))
+            self.requests.on_map('abc', PgSummary, PgSummary(1, None))
+            self.requests.on_map('other', OsdMap, OsdMap(20, None))
+            self.assertFalse(on_map.called)
+
+        self.requests.on_map('abc', OsdMap, OsdMap(11, None))
+        self.assertEqual([r.state for r in requests], ['complete', 'submitted', 'complete'])
+        self.assertEqual(self.requests.get_all(UserRequest.SUBMITTED), [requests[1]])
+        self.assertEqual(len(self.requests.get_all(UserRequest.COMPLETE)), 2)
+
+        self.requests.on_map('abc', OsdMap, OsdMap(12, None))
+        self.assertEqual(requests[1].state, 'complete')
+        self.assertEqual(self.requests.get_all(UserRequest.SUBMITTED), [])
+
+    def test_cancel_while_waiting(self):
+        self.manager.clusters['abc'].get_sync_object.return_value = OsdMap(5, None)
+        request = self._run(1, request_class=OsdMapModifyingRequest)[0]
+        self._complete(request, 10)
+        self.requests.cancel(request.id)
+
+        with patch.object(OsdMapModifyingRequest, 'on_map') as on_map:
+            self.requests.on_map('abc', OsdMap, OsdMap(10, None))
+            self.assertFalse(on_map.called)
+
+
+class TestMerging(RequestCollectionTest):
+    def _pool_update(self, pool_name, size=3):
+        return OsdMapModifyingRequest("Modifying pool '%s'" % pool_name, 'abc', 'ceph', [
+            ('osd pool set', {'pool': pool_name, 'var': 'size', 'val': size}),
+            ('osd pool set', {'pool': pool_name, 'var': 'min_size', 'val': 2})
+        ])
+
+    @patch.object(command_scheduler, 'remote')
+    @patch.object(user_request, 'remote')
+    def test_merge(self, remote, batch_remote):
+        self.manager.clusters['abc'].get_sync_object.return_value = OsdMap(5, None)
+        batch_remote.run_job.return_value = 'jid1'
+        remote.run_job.return_value = 'jid2'
+
+        with patch.object(command_scheduler, 'MERGE_WINDOW', 10):
+            requests = [self._pool_update(name) for name in ('rbd', 'data', 'metadata')]
+            for request in requests:
+                self.requests.submit(request, 'mon1')
+        self.assertFalse(batch_remote.run_job.called)
+        self.assertEqual([r.state for r in requests], ['submitted'] * 3)
+
+        self.requests.flush()
+        batch_remote.run_job.assert_called_once_with('mon1', 'ceph.rados_commands', {
+            'fsid': 'abc', 'cluster_name': 'ceph',
+            'commands': requests[0].commands + requests[1].commands + requests[2].commands})
+        self.assertEqual([r.jid for r in requests], ['jid1'] * 3)
+
+        # The second request's second command fails
+        self.requests.on_completion('mon1', 'jid1', True, {
+            'error': True, 'results': [None, None, None], 'error_status': "EINVAL", 'versions': {'osd_map': 7}
+        }, 'ceph.rados_commands', {})
+
+        # The first goes on as if it ran alone, the second fails...
+        self.assertEqual(requests[0].awaiting_versions, {OsdMap: 7})
+        self.assertEqual(requests[1].state, 'complete')
+        self.assertEqual(requests[1].error_message, "EINVAL")
+
+        # ...and the third, which never ran, is started in a job of its own
+        remote.run_job.assert_called_once_with('mon1', 'ceph.rados_commands', {
+            'fsid': 'abc', 'cluster_name': 'ceph', 'commands': requests[2].commands})
+        self.assertEqual(requests[2].jid, 'jid2')
+        self._complete(requests[2], 8)
+
+        self.requests.on_map('abc', OsdMap, OsdMap(8, None))
+        self.assertEqual([r.state for r in requests], ['complete'] * 3)
+        self.assertEqual([r.error for r in requests], [False, True, False])
+
+    @patch.object(command_scheduler, 'remote')
+    @patch.object(user_request, 'remote')
+    def test_cancel(self, remote, batch_remote):
+        batch_remote.run_job.return_value = 'jid1'
+        with patch.object(command_scheduler, 'MERGE_WINDOW', 10):
+            requests = [self._pool_update(name) for name in ('rbd', 'data', 'metadata')]
+            for request in requests:
+                self.requests.submit(request, 'mon1')
+
+        # Cancelled before it starts, it is left out of the job
+        self.requests.cancel(requests[0].id)
+        self.requests.flush()
+        self.assertEqual(batch_remote.run_job.call_args[0][2]['commands'], requests[1].commands + requests[2].commands)
+
+        # The job isn't cancelled while another request still needs it
+        self.requests.cancel(requests[1].id)
+        self.assertFalse(self.requests._remote.cancel.called)
+        self.requests.cancel(requests[2].id)
+        self.requests._remote.cancel.assert_called_once_with('mon1', 'jid1')
+
+    @patch.object(command_scheduler, 'remote')
+    @patch.object(user_request, 'remote')
+    def test_conflict_after_failure(self, remote, batch_remote):
+        self.manager.clusters['abc'].get_sync_object.return_value = OsdMap(5, None)
+        batch_remote.run_job.return_value = 'jid1'
+        remote.run_job.side_effect = ['jid2', 'jid3']
+
+        # The third conflicts with the second, so goes in a job after theirs
+        with patch.object(command_scheduler, 'MERGE_WINDOW', 10):
+            requests = [self._pool_update('rbd'), self._pool_update('foo', 2), self._pool_update('foo', 3)]
+            for request in requests:
+                self.requests.submit(request, 'mon1')
+        self.requests.flush()
+        self.assertEqual(batch_remote.run_job.call_args[0][2]['commands'], requests[0].commands + requests[1].commands)
+        self.assertFalse(remote.run_job.called)
+        self.assertEqual(requests[2].jid, None)
+
+        # The first fails before the second's commands run, so the second runs again alone...
+        self.requests.on_completion('mon1', 'jid1', True, {
+            'error': True, 'results': [None], 'error_status': "EINVAL", 'versions': {'osd_map': 6}
+        }, 'ceph.rados_commands', {})
+        self.assertEqual(remote.run_job.call_count, 1)
+        self.assertEqual(remote.run_job.call_args[0][2]['commands'], requests[1].commands)
+
+        # ...and the third still waits for it, so that the pool ends up with the size asked for last
+        self.assertEqual(requests[2].jid, None)
+        self._complete(requests[1], 7)
+        self.assertEqual(remote.run_job.call_count, 2)
+        self.assertEqual(remote.run_job.call_args[0][2]['commands'], requests[2].commands)
+        self.assertEqual(requests[2].jid, 'jid3')
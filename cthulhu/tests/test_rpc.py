@@ -1,6 +1,14 @@
+import logging
+
 from django.utils.unittest import TestCase
 from mock import MagicMock
+import msgpack
+
+from calamari_common.types import OsdMap, OSD, SERVER, ServiceId, NotFound
 from cthulhu.manager.rpc import RpcInterface
+from tests.util import load_fixture
+
+log = logging.getLogger(__name__)
 
 
 class TestRpc(TestCase):
@@ -24,3 +32,85 @@ class TestRpc(TestCase):
     def test_get_sync_object_happy_path(self):
         osd_map = self.rpc.get_sync_object(12345, 'osd_map', ['osd_tree_node_by_id'])
         assert osd_map == {1: 'a node'}
+
+
+class TestRpcMultiGet(TestCase):
+    def setUp(self):
+        self.osd_map = OsdMap(12, load_fixture('interesting_osd_map.json'))
+
+        cluster = MagicMock()
+        cluster.get_sync_object.return_value = self.osd_map
+        cluster.get_sync_object_data.return_value = self.osd_map.data
+        cluster.get_valid_commands.side_effect = lambda object_type, ids: dict((i, {'valid_commands': []}) for i in ids)
+
+        manager = MagicMock()
+        manager.clusters = {'abc123': cluster}
+        manager.servers.list_by_service.side_effect = lambda service_ids: [(s, 'server%s' % s.service_id)
+                                                                           for s in service_ids]
+
+        self.rpc = RpcInterface(manager)
+
+    def test_multi_get(self):
+        result = self.rpc.multi_get('abc123', [
+            ['list', OSD, {'id__in': [1, 2]}],
+            ['get_sync_object', 'osd_map', ['osd_pools', 1]],
+            ['server_by_service', OSD, [1]],
+            ['get_valid_commands', OSD, None]
+        ])
+
+        self.assertEqual(result['osd_map_version'], 12)
+        osds, pools, servers, commands = result['results']
+        self.assertEqual([o['osd'] for o in osds], [1, 2])
+        self.assertEqual(pools, self.osd_map.osd_pools[1])
+        self.assertEqual(servers, [(ServiceId('abc123', OSD, '1'), 'server1')])
+        self.assertEqual(sorted(commands.keys()), sorted(self.osd_map.osds_by_id.keys()))
+
+    def test_get_sync_object_versions(self):
+        self.assertEqual(self.rpc.get_sync_object_versions('abc123', ['osd_map']), [12])
+        self.rpc._manager.servers.generation = 3
+        self.assertEqual(self.rpc.get_sync_object_versions('abc123', ['osd_map', SERVER]), [12, 3])
+        self.assertRaises(NotFound, self.rpc.get_sync_object_versions, 'nonexistent', ['osd_map'])
+
+    def test_multi_get_errors(self):
+        self.assertRaises(NotFound, self.rpc.multi_get, 'abc123', [['get_sync_object', 'osd_map', ['osds_by_id', 999]]])
+        self.assertRaises(NotImplementedError, self.rpc.multi_get, 'abc123', [['delete', OSD, 1]])
+
+
+class TestRpcProjection(TestCase):
+    """
+    get_sync_object with a selector, and how much less data that sends than
+    the whole object for the selectors that the v1 views use.
+    """
+    SELECTORS = {
+        'health_counters': 'osds[up,in]',
+        'osd_list': 'pools[pool,pool_name]'
+    }
+
+    def setUp(self):
+        self.osd_map = OsdMap(7883, load_fixture('osd_map-7883.json'))
+
+        cluster = MagicMock()
+        cluster.get_sync_object.return_value = self.osd_map
+        cluster.get_sync_object_data.return_value = self.osd_map.data
+
+        manager = MagicMock()
+        manager.clusters = {'abc123': cluster}
+        self.rpc = RpcInterface(manager)
+
+    def test_fields(self):
+        result = self.rpc.get_sync_object('abc123', 'osd_map', None, 'epoch,osds[osd,up]')
+        self.assertEqual(sorted(result.keys()), ['epoch', 'osds'])
+        self.assertEqual(result['osds'][0], {'osd': self.osd_map.data['osds'][0]['osd'],
+                                             'up': self.osd_map.data['osds'][0]['up']})
+
+        # Projection applies beneath the path, and accepts a list of dotted paths
+        self.assertEqual(self.rpc.get_sync_object('abc123', 'osd_map', ['osds_by_id', 0], ['uuid']),
+                         {'uuid': self.osd_map.osds_by_id[0]['uuid']})
+
+    def test_bytes_moved(self):
+        full = len(msgpack.packb(self.rpc.get_sync_object('abc123', 'osd_map')))
+        for name, selector in self.SELECTORS.items():
+            projected = len(msgpack.packb(self.rpc.get_sync_object('abc123', 'osd_map', None, selector)))
+            log.info("%s: %s bytes projected, %s bytes full (%.1f%%)" % (
+                name, projected, full, projected * 100.0 / full))
+            self.assertLess(projected, full / 2)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Measure how many datapoints per second the calamari-lite carbon receivers
+can ingest, using the stats that minion-sim's StatsSender would send for
+a simulated cluster.
+
+    CALAMARI_CONFIG=dev/calamari.conf python dev/ingest_bench.py --hosts 20 --intervals 30
+"""
+
+import argparse
+import cPickle
+import time
+
+import gevent
+import gevent.event
+from gevent import socket
+
+from calamari_lite.carbon import PlaintextReceiver, PickleReceiver, FRAME_HEADER
+from calamari_lite.tsdb import TimeSeriesStore
+from minion_sim.ceph_cluster import CephCluster
+
+
+class CountingStore(TimeSeriesStore):
+    def __init__(self, expected, *args, **kwargs):
+        super(CountingStore, self).__init__(*args, **kwargs)
+        self.count = 0
+        self.expected = expected
+        self.done = gevent.event.Event()
+
+    def update(self, stat, value, timestamp):
+        super(CountingStore, self).update(stat, value, timestamp)
+        self.count += 1
+        if self.count == self.expected:
+            self.done.set()
+
+
+def generate(hosts, osds_per_host, intervals, period=60):
+    """
+    :return: A list of (path, (timestamp, value)) for each interval, as each
+             simulated host would send them
+    """
+    cluster = CephCluster()
+    fqdns = ["node%s.example.com" % i for i in range(0, hosts)]
+    cluster.create(fqdns, osds_per_host=osds_per_host)
+
+    start = int(time.time()) - intervals * period
+    datapoints = []
+    for i in range(0, intervals):
+        for fqdn in fqdns:
+            datapoints.extend((path, (start + i * period, value)) for path, value in cluster.get_stats(fqdn))
+    return datapoints
+
+
+def plaintext_payload(datapoints):
+    return ["".join("%s %s %s\n" % (path, value, timestamp) for path, (timestamp, value) in datapoints)]
+
+
+def pickle_payload(datapoints, batch_size):
+    frames = []
+    for i in range(0, len(datapoints), batch_size):
+        frame = cPickle.dumps(datapoints[i:i + batch_size], protocol=2)
+        frames.append(FRAME_HEADER.pack(len(frame)) + frame)
+    return frames
+
+
+def run(receiver_class, payload, expected, connections, timeout):
+    """
+    :return: Seconds taken to ingest all the datapoints, or None if they weren't
+             all ingested within ``timeout`` seconds, e.g. because some were malformed
+    """
+    store = CountingStore(expected, 60, 24 * 3600)
+    receiver = receiver_class(store, ('127.0.0.1', 0))
+    receiver.start()
+
+    def send(chunks):
+        conn = socket.create_connection(receiver.address)
+        for chunk in chunks:
+            conn.sendall(chunk)
+        conn.close()
+
+    started = time.time()
+    senders = [gevent.spawn(send, payload) for _ in range(0, connections)]
+    try:
+        if not store.done.wait(timeout=timeout):
+            return None
+        return time.time() - started
+    finally:
+        gevent.killall(senders)
+        receiver.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--osds-per-host', type=int, default=4)
+    parser.add_argument('--intervals', type=int, default=30)
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Send the stats this many times at once, on separate connections")
+    parser.add_argument('--batch-size', type=int, default=500, help="Datapoints per pickle batch")
+    parser.add_argument('--timeout', type=float, default=300,
+                        help="Seconds to wait for each receiver to ingest everything")
+    args = parser.parse_args()
+
+    datapoints = generate(args.hosts, args.osds_per_host, args.intervals)
+    expected = len(datapoints) * args.connections
+    print "%s datapoints per connection, %s connections" % (len(datapoints), args.connections)
+
+    for name, receiver_class, payload in [
+        ('plaintext', PlaintextReceiver, plaintext_payload(datapoints)),
+        ('pickle', PickleReceiver, pickle_payload(datapoints, args.batch_size))
+    ]:
+        elapsed = run(receiver_class, payload, expected, args.connections, args.timeout)
+        if elapsed is None:
+            print "%-10s timed out after %ss" % (name, args.timeout)
+        else:
+            print "%-10s %8.0f datapoints/s (%.2fs)" % (name, expected / elapsed, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+Compare how long the REST API takes to serialize a large OSD list with
+rest_framework's OsdSerializer and with the CompiledSerializer built from it,
+checking that both give the same JSON.
+
+    CALAMARI_CONFIG=dev/calamari.conf python dev/serializer_bench.py --osds 10000
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "calamari_web.settings")
+
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from calamari_rest.serializers.compiled import CompiledSerializer  # noqa
+from calamari_rest.serializers.v2 import OsdSerializer  # noqa
+from calamari_rest.views.rpc_view import DataObject  # noqa
+
+
+def osd_rows(count, osds_per_host=10):
+    """
+    :return: A list of OSD rows like the ones cthulhu's OsdIndex gives the OSD list
+    """
+    rows = []
+    for osd_id in range(0, count):
+        host = osd_id / osds_per_host
+        rows.append({
+            'osd': osd_id,
+            'uuid': str(uuid.UUID(int=osd_id + 1)),
+            'up': 1,
+            'in': 1,
+            'reweight': 1.0,
+            'server': "node%s.example.com" % host,
+            'pools': [0, 1, 2],
+            'valid_commands': ['scrub', 'deep_scrub', 'repair'],
+            'public_addr': "192.168.0.%s:%s/%s" % (host % 256, 6800 + osd_id % osds_per_host, osd_id),
+            'cluster_addr': "10.0.0.%s:%s/%s" % (host % 256, 6800 + osd_id % osds_per_host, osd_id),
+            'crush_node_ancestry': [[-(host + 2), -1]],
+            'backend_partition_path': "/dev/sd%s1" % chr(ord('b') + osd_id % osds_per_host),
+            'backend_device_node': "/dev/sd%s" % chr(ord('b') + osd_id % osds_per_host),
+            'osd_data': "/var/lib/ceph/osd/ceph-%s" % osd_id,
+            'osd_journal': "/var/lib/ceph/osd/ceph-%s/journal" % osd_id
+        })
+    return rows
+
+
+def drf(rows):
+    return [OsdSerializer(DataObject(row)).data for row in rows]
+
+
+def compiled(rows):
+    serializer = CompiledSerializer.get(OsdSerializer)
+    return [serializer.to_native(DataObject(row)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument('--osds', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3, help="Take the best of this many runs of each")
+    args = parser.parse_args()
+
+    rows = osd_rows(args.osds)
+    outputs = {}
+    for name, serialize in [('drf', drf), ('compiled', compiled)]:
+        timings = []
+        for _ in range(0, args.repeat):
+            started = time.time()
+            outputs[name] = serialize(rows)
+            timings.append(time.time() - started)
+        print "%-10s %6.2fs (%.1fus per OSD)" % (name, min(timings), min(timings) * 1000000.0 / args.osds)
+
+    if JSONRenderer().render(outputs['drf']) != JSONRenderer().render(outputs['compiled']):
+        print "Output differs!"
+        raise SystemExit(1)
+    print "Output identical"
+
+
+if __name__ == '__main__':
+    main()
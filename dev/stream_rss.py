@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+Measure how much the peak RSS of a REST API process grows while it encodes
+a large OSD list as JSON, rendered whole by JSONRenderer or streamed by
+StreamingJSONResponse.  Each way is measured in a fresh process, against one
+that only builds the OSD rows.
+
+    CALAMARI_CONFIG=dev/calamari.conf python dev/stream_rss.py --osds 10000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "calamari_web.settings")
+
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from calamari_rest.renderers import StreamedList, StreamingJSONResponse  # noqa
+from calamari_rest.serializers.compiled import CompiledSerializer  # noqa
+from calamari_rest.serializers.v2 import OsdSerializer  # noqa
+from calamari_rest.views.rpc_view import DataObject  # noqa
+from serializer_bench import osd_rows  # noqa
+
+
+def baseline(rows, to_native):
+    return 0
+
+
+def render(rows, to_native):
+    return len(JSONRenderer().render([to_native(row) for row in rows]))
+
+
+def stream(rows, to_native):
+    return sum(len(chunk) for chunk in StreamingJSONResponse(StreamedList(rows, to_native)))
+
+
+MODES = {'baseline': baseline, 'render': render, 'stream': stream}
+
+
+def measure(mode, osds):
+    """
+    Encode the OSD list in this process
+
+    :return: (bytes of JSON, peak RSS in kB)
+    """
+    rows = osd_rows(osds)
+    serializer = CompiledSerializer.get(OsdSerializer)
+    size = MODES[mode](rows, lambda row: serializer.to_native(DataObject(row)))
+    return size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument('--osds', type=int, default=10000)
+    parser.add_argument('--mode', choices=sorted(MODES.keys()),
+                        help="Measure one way in this process and print the result, rather than comparing them")
+    args = parser.parse_args()
+
+    if args.mode:
+        print "%s %s" % measure(args.mode, args.osds)
+        return
+
+    results = {}
+    for mode in ['baseline', 'render', 'stream']:
+        output = subprocess.check_output([sys.executable, __file__, '--osds', str(args.osds), '--mode', mode])
+        results[mode] = [int(n) for n in output.split()]
+
+    baseline_rss = results['baseline'][1]
+    for mode in ['render', 'stream']:
+        size, rss = results[mode]
+        print "%-8s %.1fMB of JSON, peak RSS +%.1fMB" % (mode, size / 1048576.0, (rss - baseline_rss) / 1024.0)
+
+
+if __name__ == '__main__':
+    main()
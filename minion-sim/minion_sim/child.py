@@ -87,6 +87,7 @@ def main():
             fsid = service['fsid']
         assert fsid is not None
 
+        results = []
         for command in commands:
             prefix, args = command
             try:
@@ -142,16 +143,17 @@ def main():
                 status = cluster.get_heartbeat(fsid)
                 return {
                     'error': True,
-                    'results': [],
+                    'results': results,
                     'error_status': e.__str__(),
                     'fsid': fsid,
                     'versions': status['versions']
                 }
+            results.append(None)
 
         status = cluster.get_heartbeat(fsid)
         return {
             'error': False,
-            'results': [None for n in commands],
+            'results': results,
             'error_status': '',
             'fsid': fsid,
             'versions': status['versions']
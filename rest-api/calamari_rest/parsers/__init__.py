@@ -0,0 +1,16 @@
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class MsgPackParser(BaseParser):
+    """
+    Parses msgpack request bodies, the counterpart to MsgPackRenderer
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), encoding='utf-8')
+        except (ValueError, msgpack.ExtraData, msgpack.UnpackException) as e:
+            raise ParseError('msgpack parse error - %s' % e)
@@ -1,4 +1,9 @@
-from rest_framework.renderers import BrowsableAPIRenderer, StaticHTMLRenderer
+import json
+
+from django.http import StreamingHttpResponse
+import msgpack
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, StaticHTMLRenderer, JSONRenderer
+from rest_framework.response import Response
 
 
 class CalamariBrowsableAPIRenderer(BrowsableAPIRenderer):
@@ -8,3 +13,121 @@ class CalamariBrowsableAPIRenderer(BrowsableAPIRenderer):
         else:
             renderer = super(CalamariBrowsableAPIRenderer, self).get_default_renderer(view)
             return renderer
+
+
+class MsgPackRenderer(BaseRenderer):
+    """
+    A compact binary alternative to JSON, for clients that pull large
+    resources such as OSD lists and sync objects.  Values that JSON can't
+    represent directly (e.g. datetimes) are converted as they are for JSON.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        return msgpack.packb(materialize(data), default=JSONRenderer.encoder_class().default)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    For views that serve Server-Sent Events.  They build their own streaming
+    response, this just lets content negotiation select them, and renders
+    error responses as a single 'error' event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return "event: error\ndata: %s\n\n" % json.dumps(data)
+
+
+class StreamedList(object):
+    """
+    A list in the data for a StreamingJSONResponse whose items are only converted
+    into something JSON-serializable (e.g. by a serializer) as they are encoded, so
+    that the converted items need never all be in memory at once.
+    """
+    def __init__(self, items, to_native=None):
+        self.items = items
+        self.to_native = to_native
+
+    def __iter__(self):
+        for item in self.items:
+            yield self.to_native(item) if self.to_native else item
+
+
+def materialize(data):
+    """
+    Replace any StreamedLists in ``data`` with ordinary lists
+    """
+    if isinstance(data, StreamedList):
+        return list(data)
+    elif isinstance(data, dict) and any(isinstance(v, StreamedList) for v in data.values()):
+        return data.__class__((k, materialize(v)) for k, v in data.items())
+    return data
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """
+    A response whose JSON body is encoded piece by piece as it is sent, rather
+    than being built as one string first.  Containers are encoded an item at a time
+    down to ``depth`` levels (and StreamedLists at any level), so that peak memory
+    is bounded by the largest item rather than the whole response.  The output
+    is byte-for-byte what JSONRenderer would have produced.
+    """
+    # Pieces are gathered into chunks of at least this many bytes, to
+    # avoid a write to the client for every item.
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, data, depth=2, status=None):
+        self._encoder = JSONRenderer.encoder_class(ensure_ascii=JSONRenderer.ensure_ascii)
+        self._depth = depth
+        super(StreamingJSONResponse, self).__init__(self._chunks(data), content_type=JSONRenderer.media_type,
+                                                    status=status)
+
+    def _iter_json(self, data, depth):
+        if isinstance(data, StreamedList) or (depth > 0 and isinstance(data, (list, tuple))):
+            yield "["
+            for i, item in enumerate(data):
+                if i:
+                    yield ", "
+                for piece in self._iter_json(item, depth - 1):
+                    yield piece
+            yield "]"
+        elif depth > 0 and isinstance(data, dict):
+            yield "{"
+            for i, (key, value) in enumerate(data.items()):
+                yield (", " if i else "") + self._encoder.encode(key) + ": "
+                for piece in self._iter_json(value, depth - 1):
+                    yield piece
+            yield "}"
+        else:
+            yield self._encoder.encode(data)
+
+    def _chunks(self, data):
+        chunk = []
+        size = 0
+        for piece in self._iter_json(data, self._depth):
+            chunk.append(piece)
+            size += len(piece)
+            if size >= self.CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield "".join(chunk)
+
+
+def streaming_response(request, data, depth=2, status=None):
+    """
+    A StreamingJSONResponse for ``data`` if the client negotiated plain JSON,
+    else a normal Response (e.g. for the browsable API, or an indented JSON request).
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if data is not None and isinstance(renderer, JSONRenderer) and 'indent' not in (request.accepted_media_type or ''):
+        return StreamingJSONResponse(data, depth=depth, status=status)
+    else:
+        return Response(materialize(data), status=status)
@@ -286,7 +286,8 @@ class CrushRuleSetSerializer(serializers.Serializer):
 
 class RequestSerializer(serializers.Serializer):
     class Meta:
-        fields = ('id', 'state', 'error', 'error_message', 'headline', 'status', 'requested_at', 'completed_at')
+        fields = ('id', 'state', 'error', 'error_message', 'headline', 'status', 'requested_at', 'completed_at',
+                  'outcomes')
 
     id = serializers.CharField(help_text="A globally unique ID for this request")
     state = serializers.CharField(help_text="One of '{complete}', '{submitted}'".format(
@@ -298,6 +299,9 @@ class RequestSerializer(serializers.Serializer):
                                              "activity, if it has more than one stage.  May be null.")
     requested_at = serializers.DateTimeField(help_text="Time at which the request was received by calamari server")
     completed_at = serializers.DateTimeField(help_text="Time at which the request completed, may be null.")
+    outcomes = serializers.Field(help_text="For requests modifying several objects at once, a list of the ``id`` of "
+                                           "each object and its ``outcome``: one of 'pending', 'complete', 'failed', "
+                                           "'skipped' or 'unchanged'.  Null for other requests.")
 
 
 class SaltKeySerializer(ValidatingSerializer):
@@ -430,17 +434,18 @@ class CliSerializer(serializers.Serializer):
 
 class ClusterStatsSerializer(serializers.Serializer):
     class Meta:
-        fields = ('kb', 'num_objects', 'kb_avail', 'kb_used')
+        fields = ('kb', 'num_objects', 'kb_avail', 'kb_used', 'updated')
 
     kb = serializers.IntegerField(help_text='total kb')
     num_objects = serializers.IntegerField(help_text='total number of objects')
     kb_avail = serializers.IntegerField(help_text='available kb')
     kb_used = serializers.IntegerField(help_text='used kb')
+    updated = serializers.DateTimeField(help_text='Time at which the stats were collected')
 
 
 class PoolStatsSerializer(serializers.Serializer):
     class Meta:
-        fields = ('name', 'num_objects_unfound', 'num_objects_missing_on_primary', 'num_object_clones', 'num_objects', 'num_object_copies', 'num_bytes', 'num_rd_kb', 'num_wr_kb', 'num_kb', 'num_wr', 'num_objects_degraded', 'num_rd')
+        fields = ('name', 'num_objects_unfound', 'num_objects_missing_on_primary', 'num_object_clones', 'num_objects', 'num_object_copies', 'num_bytes', 'num_rd_kb', 'num_wr_kb', 'num_kb', 'num_wr', 'num_objects_degraded', 'num_rd', 'updated')
 
     name = serializers.CharField()
     num_objects_unfound = serializers.IntegerField()
@@ -455,3 +460,4 @@ class PoolStatsSerializer(serializers.Serializer):
     num_wr = serializers.IntegerField()
     num_objects_degraded = serializers.IntegerField()
     num_rd = serializers.IntegerField()
+    updated = serializers.DateTimeField(help_text='Time at which the stats were collected')
@@ -85,7 +85,7 @@ urlpatterns = patterns(
         calamari_rest.views.v2.ClusterStatsViewSet.as_view({'get': 'retrieve'})),
 
     url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/osd$',
-        calamari_rest.views.v2.OsdViewSet.as_view({'get': 'list'}),
+        calamari_rest.views.v2.OsdViewSet.as_view({'get': 'list', 'patch': 'update_many'}),
         name='cluster-osd-list'),
     url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/osd/(?P<osd_id>\d+)$',
         calamari_rest.views.v2.OsdViewSet.as_view({'get': 'retrieve', 'patch': 'update'}),
@@ -117,6 +117,9 @@ urlpatterns = patterns(
     url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/sync_object/(?P<sync_type>[a-zA-Z0-9-_]+)$',
         calamari_rest.views.v2.SyncObject.as_view({'get': 'retrieve'}),
         name='cluster-sync-object'),
+    url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/sync_object/(?P<sync_type>[a-zA-Z0-9-_]+)/history$',
+        calamari_rest.views.v2.SyncObjectHistory.as_view({'get': 'history'}),
+        name='cluster-sync-object-history'),
     url(r'^server/(?P<fqdn>[a-zA-Z0-9-\.]+)/debug_job',
         calamari_rest.views.v2.DebugJob.as_view({'post': 'create'}),
         name='server-debug-job'),
@@ -148,6 +151,12 @@ urlpatterns = patterns(
     url(r'^server/(?P<fqdn>[a-zA-Z0-9-\.]+)/event$',
         calamari_rest.views.v2.EventViewSet.as_view({'get': 'list_server'})),
 
+    # Notifications of changes to all of the above
+    url(r'^changes$',
+        calamari_rest.views.v2.ChangeFeedViewSet.as_view({'get': 'list'})),
+    url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/changes$',
+        calamari_rest.views.v2.ChangeFeedViewSet.as_view({'get': 'list'})),
+
     # Ceph CLI access
     url(r'^cluster/(?P<fsid>[a-zA-Z0-9-]+)/cli$',
         calamari_rest.views.v2.CliViewSet.as_view({'post': 'create'}))
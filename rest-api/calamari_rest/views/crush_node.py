@@ -1,20 +1,9 @@
-import logging
-
-log = logging.getLogger(__name__)
+from calamari_common.types import crush_ancestry
 
 
 def lookup_ancestry(osd_id, parent_map):
-    log.info('lookup' + str(parent_map))
-    ancestries = []
-    for parent in parent_map.get(osd_id, []):
-        parent_id = parent.get('id')
-        ancestry = [parent_id]
-        while(parent and parent_id is not None):
-            parent = parent_map.get(parent_id, [])
-            if parent:
-                parent_id = parent[0].get('id')
-                if parent_id is not None:
-                    ancestry.append(parent_id)
-        ancestries.append(ancestry)
-
-    return ancestries
+    """
+    Prefer OsdMap.crush_ancestry_by_node_id, which has this worked out
+    for every node in the CRUSH tree, to calling this per node.
+    """
+    return crush_ancestry(osd_id, parent_map)
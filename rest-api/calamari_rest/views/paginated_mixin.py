@@ -1,20 +1,25 @@
+import base64
+from collections import OrderedDict
+import json
+
+from dateutil.parser import parse as dateutil_parse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from rest_framework.exceptions import ParseError
-from rest_framework.pagination import PaginationSerializer
+from rest_framework.templatetags.rest_framework import replace_query_param
+
+from calamari_rest.renderers import StreamedList
+from calamari_rest.serializers.compiled import CompiledSerializer
 
 
 class PaginatedMixin(object):
     default_page_size = 10
+    max_page_size = 1000
 
-    @property
-    def _pagination_serializer(self):
-        if not hasattr(self, '__pagination_serializer'):
-            class LocalPaginationSerializer(PaginationSerializer):
-                class Meta:
-                    object_serializer_class = self.serializer_class
-
-            self.__pagination_serializer = LocalPaginationSerializer
-        return self.__pagination_serializer
+    def _serialized(self, objects):
+        """
+        ``objects`` as a StreamedList of their representations by ``serializer_class``
+        """
+        return StreamedList(objects, CompiledSerializer.get(self.serializer_class).to_native)
 
     def _paginate(self, request, objects):
         # Pagination is, of course, separate to databaseyness, so you might think
@@ -32,5 +37,170 @@ class PaginatedMixin(object):
         except (ValueError, EmptyPage, PageNotAnInteger) as e:
             # Raise 400 is 'page' or 'page_size' were bad
             raise ParseError(str(e))
-        ps = self._pagination_serializer(instance=page, context={'request': request})
-        return ps.data
+
+        url = request.build_absolute_uri()
+        return OrderedDict([
+            ('count', paginator.count),
+            ('next', replace_query_param(url, 'page', page.next_page_number()) if page.has_next() else None),
+            ('previous', replace_query_param(url, 'page', page.previous_page_number()) if page.has_previous() else None),
+            ('results', self._serialized(page.object_list))
+        ])
+
+    def _get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get('page_size', self.default_page_size))
+        except ValueError:
+            raise ParseError("page_size must be an integer")
+        if page_size < 1:
+            raise ParseError("page_size must be at least 1")
+        return min(page_size, self.max_page_size)
+
+    def _paginate_slice(self, request, get_slice):
+        """
+        Page number pagination of a collection that is filtered and sliced elsewhere
+        (i.e. by cthulhu), giving the same response format as ``_paginate``.
+
+        :param get_slice: Callable taking an offset and a limit, and returning a dict with
+                          'count', the size of the whole collection, and 'results', the
+                          objects in the slice ready for ``serializer_class``
+        :return: Data for ``streaming_response``
+        """
+        page_size = self._get_page_size(request)
+        try:
+            page_number = int(request.GET.get('page', 1))
+        except ValueError:
+            raise ParseError("page must be an integer")
+        if page_number < 1:
+            raise ParseError("page must be at least 1")
+
+        page = get_slice((page_number - 1) * page_size, page_size)
+        if page_number > 1 and not page['results']:
+            raise ParseError("That page contains no results")
+
+        url = request.build_absolute_uri()
+        next_url = None
+        prev_url = None
+        if page_number * page_size < page['count']:
+            next_url = replace_query_param(url, 'page', page_number + 1)
+        if page_number > 1:
+            prev_url = replace_query_param(url, 'page', page_number - 1)
+
+        return OrderedDict([
+            ('count', page['count']),
+            ('next', next_url),
+            ('previous', prev_url),
+            ('results', self._serialized(page['results']))
+        ])
+
+    def _encode_cursor(self, direction, when, object_id):
+        return base64.urlsafe_b64encode(json.dumps([direction, when.isoformat(), object_id]))
+
+    def _decode_cursor(self, cursor, id_type=int):
+        try:
+            direction, when, object_id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            if direction not in ('next', 'prev'):
+                raise ValueError(direction)
+            return direction, dateutil_parse(when), id_type(object_id)
+        except (TypeError, ValueError):
+            raise ParseError("Invalid cursor '%s'" % cursor)
+
+    def _cursor_args(self, request, id_type=int):
+        """
+        :return: 4-tuple of page size, whether to count the whole result set, and the
+                 direction and (when, id) key of the ``cursor`` parameter
+        """
+        page_size = self._get_page_size(request)
+        count = request.GET.get('count', 'false').lower() in ('true', '1')
+        cursor = request.GET.get('cursor')
+        if cursor:
+            direction, when, object_id = self._decode_cursor(cursor, id_type)
+            return page_size, count, direction, (when, object_id)
+        else:
+            return page_size, count, 'next', None
+
+    def _cursor_page(self, request, direction, key, objects, has_more, count, get_key):
+        """
+        Data for ``streaming_response`` from a page of keyset pagination
+
+        :param objects: The page, most recent first, fetched in ``direction`` from ``key``
+        :param has_more: Whether there was anything beyond the page in ``direction``
+        :param get_key: Callable giving the (when, id) key of one of ``objects``
+        """
+        if direction == 'next':
+            has_next, has_prev = has_more, key is not None
+        else:
+            has_next, has_prev = True, has_more
+
+        url = request.build_absolute_uri()
+        next_url = None
+        prev_url = None
+        if objects and has_next:
+            next_url = replace_query_param(url, 'cursor', self._encode_cursor('next', *get_key(objects[-1])))
+        if objects and has_prev:
+            prev_url = replace_query_param(url, 'cursor', self._encode_cursor('prev', *get_key(objects[0])))
+
+        return OrderedDict([
+            ('count', count),
+            ('next', next_url),
+            ('previous', prev_url),
+            ('results', self._serialized(objects))
+        ])
+
+    def _paginate_cursor(self, request, query, when_column, id_column):
+        """
+        Keyset pagination on a sqlalchemy query, ordered by (when, id) descending, so that
+        reading any page costs an index range scan of page_size rows rather than a COUNT(*)
+        and an OFFSET scan over everything before it.  Returns data for ``streaming_response``.
+
+        The first page is requested with an empty ``cursor`` parameter, subsequent pages
+        by following the ``next`` and ``previous`` links.  ``count`` is only populated
+        if the caller passes ``?count=true``, as it requires a scan of the whole result set.
+        """
+        page_size, count, direction, key = self._cursor_args(request)
+        count = query.count() if count else None
+
+        if direction == 'next':
+            if key is not None:
+                when, object_id = key
+                query = query.filter((when_column < when) | ((when_column == when) & (id_column < object_id)))
+            query = query.order_by(when_column.desc(), id_column.desc())
+        else:
+            when, object_id = key
+            query = query.filter((when_column > when) | ((when_column == when) & (id_column > object_id)))
+            query = query.order_by(when_column.asc(), id_column.asc())
+
+        # Fetch one extra row to learn whether there is anything beyond this page
+        objects = list(query.limit(page_size + 1))
+        has_more = len(objects) > page_size
+        objects = objects[:page_size]
+        if direction == 'prev':
+            objects.reverse()
+
+        return self._cursor_page(request, direction, key, objects, has_more, count, lambda o: (o.when, o.id))
+
+    def _paginate_cursor_slice(self, request, get_page, when_field, id_field, id_type=int):
+        """
+        Keyset pagination, as ``_paginate_cursor``, of a collection that is filtered and
+        sliced elsewhere (i.e. by cthulhu).
+
+        :param get_page: Callable taking a cursor ([direction, when, id], or None for the
+                         first page), a limit and whether to count the whole collection,
+                         and returning a dict with 'count' and the 'results' after the
+                         cursor, most recent first, as dicts ready for ``serializer_class``
+        :param when_field: The key of the ISO 8601 time in each result to page by
+        :param id_field: The key of the ID in each result, to order those with the same time
+        """
+        page_size, count, direction, key = self._cursor_args(request, id_type)
+        cursor = [direction, key[0].isoformat(), key[1]] if key is not None else None
+
+        # Fetch one extra to learn whether there is anything beyond this page
+        page = get_page(cursor, page_size + 1, count)
+        objects = page['results']
+        has_more = len(objects) > page_size
+        if direction == 'next':
+            objects = objects[:page_size]
+        else:
+            objects = objects[-page_size:]
+
+        return self._cursor_page(request, direction, key, objects, has_more, page['count'],
+                                 lambda o: (dateutil_parse(o[when_field]), o[id_field]))
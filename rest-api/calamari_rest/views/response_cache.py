@@ -0,0 +1,93 @@
+"""
+A cache of rendered REST API responses, for resources that are built
+from sync objects whose versions are known before doing the work
+of building the response.
+"""
+from collections import defaultdict, OrderedDict
+import threading
+
+from calamari_common.config import CalamariConfig
+config = CalamariConfig()
+
+
+class ResponseCache(object):
+    """
+    An LRU cache of rendered response bodies, capped by their total size
+    in bytes.  Each entry is stored against a key identifying the resource
+    (e.g. its URL and content type) along with a version tag (e.g. an ETag
+    derived from sync object versions): a lookup with a different version
+    tag to the stored one drops the entry, so that responses built from old
+    versions don't sit in the cache until they are evicted.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # Key to (version tag, content, content type), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = defaultdict(int)
+
+    @classmethod
+    def get(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(config.getint('calamari_web', 'response_cache_size'))
+            return cls._instance
+
+    def lookup(self, key, version):
+        """
+        :return: A 2-tuple of content and content type, or None
+        """
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                self._stats['misses'] += 1
+                return None
+
+            if entry[0] != version:
+                self._bytes -= len(entry[1])
+                self._stats['invalidations'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            # Re-insert to mark as most recently used
+            self._entries[key] = entry
+            self._stats['hits'] += 1
+            return entry[1], entry[2]
+
+    def store(self, key, version, content, content_type):
+        if len(content) > self.max_bytes:
+            return
+
+        with self._lock:
+            try:
+                old = self._entries.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._bytes -= len(old[1])
+
+            self._entries[key] = (version, content, content_type)
+            self._bytes += len(content)
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            return stats
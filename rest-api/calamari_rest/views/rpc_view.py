@@ -5,7 +5,10 @@ Helpers for writing django views and rest_framework ViewSets that get
 their data from cthulhu with zeroRPC
 """
 from collections import defaultdict
+import functools
+import hashlib
 import logging
+import threading
 
 # Suppress warning from ZeroRPC's use of old gevent API
 import warnings
@@ -14,6 +17,7 @@ warnings.filterwarnings("ignore", category=DeprecationWarning,
 warnings.filterwarnings("ignore", category=DeprecationWarning,
                         message=".*gevent.coros has been renamed to gevent.lock.*")
 
+from django.http import HttpResponse, HttpResponseNotModified
 from rest_framework import status
 import time
 
@@ -26,10 +30,18 @@ except ImportError:
     zerorpc = None
 
 from calamari_common.config import CalamariConfig
+from calamari_common.snapshot import SnapshotReader
 from calamari_common.types import NotFound
+from calamari_rest.renderers import StreamingJSONResponse
 from calamari_rest.viewsets import RoleLimitedViewSet
+from calamari_rest.views.response_cache import ResponseCache
 config = CalamariConfig()
 
+if config.get('cthulhu', 'snapshot_path'):
+    snapshots = SnapshotReader(config.get('cthulhu', 'snapshot_path'), config.getint('cthulhu', 'snapshot_max_age'))
+else:
+    snapshots = None
+
 
 class DataObject(object):
     """
@@ -68,32 +80,275 @@ if zerorpc is not None:
                     method_name, sum(times) * 1000.0 / len(times), min(times) * 1000.0, max(times) * 1000.0
                 ))
             log.debug("Total time in RPC: %sms" % (total * 1000))
+            self.method_times.clear()
+
+    class RpcClientPool(object):
+        """
+        A process-wide pool of connected clients to cthulhu, so that serving
+        a request doesn't mean setting up and tearing down a ZMQ socket.
+
+        Clients that have been idle for longer than ``check_interval`` are
+        pinged before being handed out, and replaced if the ping fails.  Clients
+        that saw a LostRemote are discarded on release rather than being pooled,
+        so the next checkout reconnects.  When all ``size`` clients are busy,
+        extra clients are created and closed again on release.
+        """
+        # Seconds to wait for a health check ping before giving up on a client
+        PING_TIMEOUT = 5
+
+        _instance = None
+        _instance_lock = threading.Lock()
+
+        def __init__(self, url, size, check_interval):
+            self.url = url
+            self.size = size
+            self.check_interval = check_interval
+
+            self._lock = threading.Lock()
+            # Idle clients, as (client, last used time), most recently used last
+            self._idle = []
+            self._in_use = 0
+            self._stats = defaultdict(int)
+
+        @classmethod
+        def get(cls):
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(config.get('cthulhu', 'rpc_url'),
+                                        config.getint('cthulhu', 'rpc_pool_size'),
+                                        config.getint('cthulhu', 'rpc_pool_check_interval'))
+                return cls._instance
+
+        def _connect(self):
+            client = ProfiledRpcClient()
+            client.connect(self.url)
+            self._stats['connects'] += 1
+            return client
+
+        def _healthy(self, client):
+            self._stats['health_checks'] += 1
+            try:
+                client._zerorpc_ping(timeout=self.PING_TIMEOUT)
+            except (LostRemote, zerorpc.TimeoutExpired):
+                self._stats['health_check_failures'] += 1
+                return False
+            else:
+                return True
+            finally:
+                # Don't attribute the ping to the request that checked the client out
+                client.method_times.clear()
+
+        def checkout(self):
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._in_use += 1
+                if self._idle:
+                    client, last_used = self._idle.pop()
+                else:
+                    client, last_used = None, None
+
+            if client is not None and time.time() - last_used > self.check_interval and not self._healthy(client):
+                self._close(client)
+                client = None
+
+            if client is None:
+                try:
+                    client = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._in_use -= 1
+                    raise
+
+            return client
+
+        def release(self, client, lost=False):
+            with self._lock:
+                self._in_use -= 1
+                if not lost and len(self._idle) < self.size:
+                    self._idle.append((client, time.time()))
+                    return
+
+            if lost:
+                self._stats['lost'] += 1
+            else:
+                self._stats['overflow'] += 1
+            self._close(client)
+
+        def _close(self, client):
+            try:
+                client.close()
+            except Exception:
+                pass
+
+        def stats(self):
+            with self._lock:
+                stats = dict(self._stats)
+                stats['idle'] = len(self._idle)
+                stats['in_use'] = self._in_use
+                return stats
 else:
     class ProfiledRpcClient(object):
         pass
 
 
+def etag_sync_objects(*sync_types):
+    """
+    Decorator for the GET handlers of RPCViewSets whose output is a pure function
+    of some of a cluster's sync objects (and the request URL).  Pass SERVER as well
+    for views that include what the server monitor knows, like the hosts of OSDs,
+    which may change without any sync object changing.  The response gets an
+    ETag built from the fsid and the versions of those sync objects, and requests
+    with a matching If-None-Match get a 304 after a single cheap RPC, without
+    running the handler.  Rendered JSON responses are cached against the same
+    versions, so that the handler only runs for the first request after a change.
+
+    The decorated method must take the cluster's fsid as its first argument after the request.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, request, fsid, *args, **kwargs):
+            return self._versioned_response(request, fsid, sync_types,
+                                            lambda: fn(self, request, fsid, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
 class RPCViewSet(RoleLimitedViewSet):
     serializer_class = None
     log = logging.getLogger('django.request.profile')
 
+    # Streamed responses are only cached if they are no bigger than this fraction of
+    # the cache, so that streaming a large response doesn't mean holding all of it
+    STREAM_CACHE_FRACTION = 16
+
     def __init__(self, *args, **kwargs):
         if zerorpc is None:
             raise RuntimeError("Cannot run without zerorpc")
 
         super(RPCViewSet, self).__init__(*args, **kwargs)
-        self.client = ProfiledRpcClient()
+        self.client = None
+        self._client_lost = False
+        self._cache_as = None
 
     def dispatch(self, request, *args, **kwargs):
-        self.client.connect(config.get('cthulhu', 'rpc_url'))
+        pool = None
+        if self.client is None:
+            pool = RpcClientPool.get()
+            self.client = pool.checkout()
         a = time.time()
         try:
             return super(RPCViewSet, self).dispatch(request, *args, **kwargs)
         finally:
             b = time.time()
-            self.client.close()
             self.log.debug("[%sms] %s" % ((b - a) * 1000.0, request.path))
             self.client.report(self.log)
+            if pool is not None:
+                pool.release(self.client, lost=self._client_lost)
+                self.log.debug("RPC pool: %s" % pool.stats())
+                self.client = None
+
+    def _get_sync_object(self, fsid, sync_type):
+        """
+        Get a whole sync object, from cthulhu's published snapshot if there is one,
+        else over RPC.  The result must not be modified, as it may be shared
+        with other requests.
+        """
+        snapshot = snapshots.get(fsid, sync_type) if snapshots is not None else None
+        if snapshot is not None:
+            return snapshot.data
+        else:
+            return self.client.get_sync_object(fsid, sync_type)
+
+    def _get_sync_object_versions(self, fsid, sync_types):
+        # There is no snapshot of the server monitor's generation (SERVER), so views
+        # that depend on it always check versions over RPC
+        if snapshots is not None:
+            versions = []
+            for sync_type in sync_types:
+                snapshot = snapshots.get(fsid, sync_type)
+                if snapshot is None:
+                    break
+                versions.append(snapshot.version)
+            else:
+                return versions
+
+        return self.client.get_sync_object_versions(fsid, list(sync_types))
+
+    def _sync_object_etag(self, request, fsid, sync_types):
+        versions = self._get_sync_object_versions(fsid, sync_types)
+        # The same resource may be rendered differently depending on query
+        # parameters and content negotiation, so those go into the tag too
+        key = repr((fsid, zip(sync_types, versions), request.get_full_path(), request.META.get('HTTP_ACCEPT')))
+        return '"%s"' % hashlib.md5(key).hexdigest()
+
+    def _etag_matches(self, request, etag):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return False
+        # GZipMiddleware marks the ETags of responses that it compresses, so
+        # clients send those back with the mark on
+        return etag in [t.strip().replace(';gzip"', '"') for t in if_none_match.split(",")] \
+            or if_none_match.strip() == '*'
+
+    def _versioned_response(self, request, fsid, sync_types, handler):
+        """
+        Serve a response built by ``handler`` from the given sync objects, using
+        the ETag of their versions to answer with a 304 or a cached rendering where possible.
+        """
+        etag = self._sync_object_etag(request, fsid, sync_types)
+        if self._etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            cache_key = (request.get_full_path(), request.META.get('HTTP_ACCEPT'))
+            cached = ResponseCache.get().lookup(cache_key, etag)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = handler()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                # Rendering happens in finalize_response
+                self._cache_as = (cache_key, etag)
+        response['ETag'] = etag
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(RPCViewSet, self).finalize_response(request, response, *args, **kwargs)
+        if self._cache_as is not None and response.status_code == status.HTTP_200_OK:
+            cache = ResponseCache.get()
+            if isinstance(response, StreamingJSONResponse):
+                response.streaming_content = self._cache_streamed(
+                    cache, response.streaming_content, self._cache_as, response['Content-Type'])
+            elif isinstance(response, Response) and response.accepted_renderer.format in ('json', 'msgpack'):
+                # The browsable API's HTML is not cached, as it is different for each user
+                response.render()
+                cache.store(self._cache_as[0], self._cache_as[1], response.content, response['Content-Type'])
+                self.log.debug("Response cache: %s" % cache.stats())
+        self._cache_as = None
+        return response
+
+    def _cache_streamed(self, cache, chunks, cache_as, content_type):
+        """
+        Pass through the chunks of a streamed response, storing them in the cache
+        once complete, unless the response is too big to be worth keeping a copy of
+        while it's streamed.
+        """
+        limit = cache.max_bytes / self.STREAM_CACHE_FRACTION
+        content = []
+        size = 0
+        for chunk in chunks:
+            if content is not None:
+                size += len(chunk)
+                if size <= limit:
+                    content.append(chunk)
+                else:
+                    content = None
+            yield chunk
+
+        if content is not None:
+            cache.store(cache_as[0], cache_as[1], "".join(content), content_type)
+            self.log.debug("Response cache: %s" % cache.stats())
 
     @property
     def help(self):
@@ -107,6 +362,7 @@ class RPCViewSet(RoleLimitedViewSet):
         try:
             return super(RPCViewSet, self).handle_exception(exc)
         except LostRemote as e:
+            self._client_lost = True
             return Response({'detail': "RPC error ('%s')" % e},
                             status=status.HTTP_503_SERVICE_UNAVAILABLE, exception=True)
         except RemoteError as e:
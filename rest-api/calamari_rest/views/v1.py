@@ -1,4 +1,3 @@
-from collections import defaultdict
 import logging
 import socket
 
@@ -35,7 +34,7 @@ else:
     from graphite.render.datalib import fetchData
 
 from calamari_rest.viewsets import RoleLimitedViewSet  # noqa
-from calamari_common.types import POOL, OSD, ServiceId, OsdMap, PgSummary, MdsMap, MonStatus  # noqa
+from calamari_common.types import POOL, OSD, ServiceId, OsdMap  # noqa
 
 try:
     from calamari_rest.version import VERSION
@@ -55,51 +54,93 @@ config = CalamariConfig()
 log = logging.getLogger('django.request')
 
 
-def _get_latest_graphite(metric):
+# Where calamari-lite's ShallowCarbonCache serves the latest values of the stats it receives
+CARBON_CACHE_RPC = "tcp://127.0.0.1:5051"
+
+
+def _glob_metrics(metrics):
+    """
+    Group metric paths that differ only in their second to last part (such as the
+    pool ID in ceph.cluster.<fsid>.pool.<id>.num_objects), so that each group can be
+    fetched from graphite with one wildcard path instead of one path per metric.
+
+    :return: A dict of graphite path expression to the metrics it stands for
+    """
+    groups = {}
+    for metric in metrics:
+        parts = metric.split('.')
+        key = tuple(parts[:-2] + ['*'] + parts[-1:]) if len(parts) > 2 else (metric,)
+        groups.setdefault(key, []).append(metric)
+
+    return dict(('.'.join(key) if len(group) > 1 else group[0], group) for key, group in groups.items())
+
+
+def _get_latest_graphite(metrics):
     """
-    Get the latest value of a named graphite metric
+    Get the latest values of some named graphite metrics
     """
 
     tzinfo = pytz.timezone("UTC")
     until_time = parseATTime('now', tzinfo)
 
-    def _get(from_time):
-        series = fetchData({
-            'startTime': from_time,
-            'endTime': until_time,
-            'now': until_time,
-            'localOnly': False},
-            metric
-        )
-        try:
-            return [k for k in series[0] if k is not None][-1]
-        except IndexError:
-            return None
+    def _get(from_time, path_expr, wanted):
+        found = {}
+        for series in fetchData({
+                'startTime': from_time,
+                'endTime': until_time,
+                'now': until_time,
+                'localOnly': False},
+                path_expr):
+            # A wildcard may also match series that weren't asked for
+            if series.name not in wanted:
+                continue
+            try:
+                found[series.name] = [k for k in series if k is not None][-1]
+            except IndexError:
+                pass
+        return found
 
     # In case the cluster has been offline for some time, try looking progressively
     # further back in time for data.  This would not be necessary if graphite simply
-    # let us ask for the latest value (Calamari issue #6876)
+    # let us ask for the latest value (Calamari issue #6876).  Each wider window
+    # is only searched for the metrics that the narrower ones didn't find.
+    result = dict((metric, None) for metric in metrics)
+    remaining = set(result.keys())
     for trange in ['-1min', '-10min', '-60min', '-1d', '-7d']:
-        val = _get(parseATTime(trange, tzinfo))
-        if val is not None:
-            return val
+        if not remaining:
+            break
+        from_time = parseATTime(trange, tzinfo)
+        for path_expr, group in sorted(_glob_metrics(remaining).items()):
+            found = _get(from_time, path_expr, set(group))
+            result.update(found)
+            remaining.difference_update(found)
+
+    for metric in sorted(remaining):
+        log.warn("No graphite data for %s" % metric)
 
-    log.warn("No graphite data for %s" % metric)
+    return result
 
 
-def get_latest_graphite(metric):
+def get_latest_values(metrics):
     """
-    Wrapper to hide the case where graphite is unavailable
+    Get the latest values of some metrics, hiding the case where graphite is unavailable
+
+    :param metrics: A list of metric paths
+    :return: A dict of metric path to its latest value, or None if there is no data for it
     """
+    if not metrics:
+        return {}
+
     if graphite is not None:
-        return _get_latest_graphite(metric)
+        return _get_latest_graphite(metrics)
     else:
-        # In the absence of graphite, talk to a ShallowCarbonCache instance
+        # In the absence of graphite, talk to a ShallowCarbonCache instance, which
+        # keeps the latest value of each stat as it receives it
         client = zerorpc.Client()
         try:
-            client.connect("tcp://127.0.0.1:5051")
+            client.connect(CARBON_CACHE_RPC)
 
-            return client.get_latest([metric])[metric]
+            return client.get_latest(list(metrics))
         finally:
             client.close()
 
@@ -126,17 +167,20 @@ class Space(RPCViewSet):
         # the new ones are already in bytes.  Check new versions first
         # so that old relics in the database after upgrade stop being
         # used.
-        if get_latest_graphite(df_path('total_used_bytes')) is not None:
+        latest = get_latest_values([df_path('total_used_bytes'), df_path('total_bytes'),
+                                    df_path('total_avail_bytes')])
+        if latest[df_path('total_used_bytes')] is not None:
             space = {
-                'used_bytes': get_latest_graphite(df_path('total_used_bytes')),
-                'capacity_bytes': get_latest_graphite(df_path('total_bytes')),
-                'free_bytes': get_latest_graphite(df_path('total_avail_bytes'))
+                'used_bytes': latest[df_path('total_used_bytes')],
+                'capacity_bytes': latest[df_path('total_bytes')],
+                'free_bytes': latest[df_path('total_avail_bytes')]
             }
         else:
+            latest = get_latest_values([df_path('total_used'), df_path('total_space'), df_path('total_avail')])
             space = {
-                'used_bytes': to_bytes(get_latest_graphite(df_path('total_used'))),
-                'capacity_bytes': to_bytes(get_latest_graphite(df_path('total_space'))),
-                'free_bytes': to_bytes(get_latest_graphite(df_path('total_avail')))
+                'used_bytes': to_bytes(latest[df_path('total_used')]),
+                'capacity_bytes': to_bytes(latest[df_path('total_space')]),
+                'free_bytes': to_bytes(latest[df_path('total_avail')])
             }
 
         return Response(ClusterSpaceSerializer(DataObject({
@@ -157,174 +201,14 @@ class Health(RPCViewSet):
 
 
 class HealthCounters(RPCViewSet):
+    """
+    The counts of OSDs, MDSs, mons and PGs by health, as maintained by
+    the Calamari server when the cluster's maps change.
+    """
     serializer_class = ClusterHealthCountersSerializer
 
-    PG_FIELDS = ['pgid', 'acting', 'up', 'state']
-
-    CRIT_STATES = set(['stale', 'down', 'peering', 'inconsistent', 'incomplete', 'inactive'])
-    WARN_STATES = set(['creating', 'recovery_wait', 'recovering', 'replay',
-                       'splitting', 'degraded', 'remapped', 'scrubbing', 'repair',
-                       'wait_backfill', 'backfilling', 'backfill_toofull'])
-    OKAY_STATES = set(['active', 'clean'])
-
-    @classmethod
-    def generate(cls, osd_map, mds_map, mon_status, pg_summary):
-        return {
-            'osd': cls._calculate_osd_counters(osd_map),
-            'mds': cls._calculate_mds_counters(mds_map),
-            'mon': cls._calculate_mon_counters(mon_status),
-            'pg': cls._calculate_pg_counters(pg_summary),
-        }
-
-    @classmethod
-    def _calculate_mon_counters(cls, mon_status):
-        mons = mon_status['monmap']['mons']
-        quorum = mon_status['quorum']
-        ok, warn, crit = 0, 0, 0
-        for mon in mons:
-            rank = mon['rank']
-            if rank in quorum:
-                ok += 1
-            # TODO: use 'have we had a salt heartbeat recently' here instead
-            # elif self.try_mon_connect(mon):
-            #    warn += 1
-            else:
-                crit += 1
-        return {
-            'ok': {
-                'count': ok,
-                'states': {} if ok == 0 else {'in': ok},
-            },
-            'warn': {
-                'count': warn,
-                'states': {} if warn == 0 else {'up': warn},
-            },
-            'critical': {
-                'count': crit,
-                'states': {} if crit == 0 else {'out': crit},
-            }
-        }
-
-    @classmethod
-    def _pg_counter_helper(cls, states, classifier, count, stats):
-        matched_states = classifier.intersection(states)
-        if len(matched_states) > 0:
-            stats[0] += count
-            for state in matched_states:
-                stats[1][state] += count
-            return True
-        return False
-
-    @classmethod
-    def _calculate_pg_counters(cls, pg_summary):
-        # Although the mon already has a copy of this (in 'status' output),
-        # it's such a simple thing to recalculate here and simplifies our
-        # sync protocol.
-
-        all_states = cls.CRIT_STATES | cls.WARN_STATES | cls.OKAY_STATES
-
-        pgs_by_state = pg_summary['all']
-        ok, warn, crit = [[0, defaultdict(int)] for _ in range(3)]
-        for state_name, count in pgs_by_state.items():
-            states = map(lambda s: s.lower(), state_name.split("+"))  # noqa
-            if cls._pg_counter_helper(states, cls.CRIT_STATES, count, crit):
-                pass
-            elif cls._pg_counter_helper(states, cls.WARN_STATES, count, warn):
-                pass
-            elif cls._pg_counter_helper(states, cls.OKAY_STATES, count, ok):
-                pass
-            else:
-                # Uncategorised state, assume it's critical.  This shouldn't usually
-                # happen, but want to avoid breaking if ceph adds a state.
-                crit[0] += count
-                for state in states:
-                    if state not in all_states or state in cls.CRIT_STATES:
-                        crit[1][state] += count
-
-        return {
-            'ok': {
-                'count': ok[0],
-                'states': dict(ok[1]),
-            },
-            'warn': {
-                'count': warn[0],
-                'states': dict(warn[1]),
-            },
-            'critical': {
-                'count': crit[0],
-                'states': dict(crit[1]),
-            },
-        }
-
-    @classmethod
-    def _calculate_osd_counters(cls, osd_map):
-        osds = osd_map['osds']
-        counters = {
-            'total': len(osds),
-            'not_up_not_in': 0,
-            'not_up_in': 0,
-            'up_not_in': 0,
-            'up_in': 0
-        }
-        for osd in osds:
-            up, inn = osd['up'], osd['in']
-            if not up and not inn:
-                counters['not_up_not_in'] += 1
-            elif not up and inn:
-                counters['not_up_in'] += 1
-            elif up and not inn:
-                counters['up_not_in'] += 1
-            elif up and inn:
-                counters['up_in'] += 1
-        warn_count = counters['up_not_in'] + counters['not_up_in']
-        warn_states = {}
-        if counters['up_not_in'] > 0:
-            warn_states['up/out'] = counters['up_not_in']
-        if counters['not_up_in'] > 0:
-            warn_states['down/in'] = counters['not_up_in']
-        return {
-            'ok': {
-                'count': counters['up_in'],
-                'states': {} if counters['up_in'] == 0 else {'up/in': counters['up_in']},
-            },
-            'warn': {
-                'count': warn_count,
-                'states': {} if warn_count == 0 else warn_states,
-            },
-            'critical': {
-                'count': counters['not_up_not_in'],
-                'states': {} if counters['not_up_not_in'] == 0 else {'down/out': counters['not_up_not_in']},
-            },
-        }
-
-    @classmethod
-    def _calculate_mds_counters(cls, mds_map):
-        up = len(mds_map['up'])
-        inn = len(mds_map['in'])
-        total = len(mds_map['info'])
-        return {
-            'total': total,
-            'up_in': inn,
-            'up_not_in': up - inn,
-            'not_up_not_in': total - up,
-        }
-
     def get(self, request, fsid):
-        osd_data = self.client.get_sync_object(fsid, OsdMap.str, async=True)
-        mds_data = self.client.get_sync_object(fsid, MdsMap.str, async=True)
-        pg_summary = self.client.get_sync_object(fsid, PgSummary.str, async=True)
-        mon_status = self.client.get_sync_object(fsid, MonStatus.str, async=True)
-        mds_data = mds_data.get()
-        osd_data = osd_data.get()
-        pg_summary = pg_summary.get()
-        mon_status = mon_status.get()
-
-        counters = self.generate(osd_data, mds_data, mon_status, pg_summary)
-
-        return Response(ClusterHealthCountersSerializer(DataObject({
-            'counters': counters,
-            'cluster_update_time': self.client.get_cluster(fsid)['update_time']
-        })).data)
+        return Response(ClusterHealthCountersSerializer(DataObject(self.client.get_health_counters(fsid))).data)
 
 
 class OSDList(RPCViewSet):
@@ -337,99 +221,46 @@ class OSDList(RPCViewSet):
     OSD_FIELDS = ['uuid', 'up', 'in', 'up_from', 'public_addr',
                   'cluster_addr', 'heartbeat_back_addr', 'heartbeat_front_addr']
 
-    def _filter_by_pg_state(self, osds, pg_states, osds_by_pg_state):
-        """Filter the cluster OSDs by PG states.
-`
-        Note that we can't do any nice DB querying here because we aren't
-        normalizing out our data to fit the relational model. Thus, this is a
-        bit hacky.
-
-        We are modifying the OSD field of this instance of a cluster based on
-        the filtering, and passing the result to the serializer. Do not do
-        anything like a .save() on this instance; it's just a vehicle for the
-        filtered OSDs.
-        """
-        pg_states = set(map(lambda s: s.lower(), pg_states.split(",")))  # noqa
-        target_osds = set([])
-        for state, state_osds in osds_by_pg_state.iteritems():
-            if state in pg_states:
-                target_osds |= set(state_osds)
-        return [o for o in osds if o['id'] in target_osds]
-
-    def generate(self, pg_summary, osd_map, service_to_server, servers):
-        fqdn_to_server = dict([(s['fqdn'], s) for s in servers])
-
-        # map osd id to pg states
-        pg_states_by_osd = defaultdict(lambda: defaultdict(lambda: 0))  # noqa
-        # map osd id to set of pools
-        pools_by_osd = defaultdict(lambda: set([]))  # noqa
-        # map pg state to osd ids
-        osds_by_pg_state = defaultdict(lambda: set([]))  # noqa
-
-        # get the list of pools
-        pools_by_id = dict((p_id, p['pool_name']) for (p_id, p) in osd_map.pools_by_id.items())
-
-        for pool_id, osds in osd_map.osds_by_pool.items():
-            for osd_id in osds:
-                pools_by_osd[osd_id].add(pools_by_id[pool_id])
-
-        for osd_id, osd_pg_summary in pg_summary['by_osd'].items():
-            for state_tuple, count in osd_pg_summary.items():
-                for state in state_tuple.split("+"):
-                    osds_by_pg_state[state].add(osd_id)
-                    pg_states_by_osd[osd_id][state] += count
-
-        # convert set() to list to make JSON happy
-        osds_by_pg_state = dict((k, list(v)) for k, v in
-                                osds_by_pg_state.iteritems())
-
-        # Merge the PgSummary data into the OsdMap data
-        def fixup_osd(osd):
-            osd_id = osd['osd']
-            data = dict((k, osd[k]) for k in self.OSD_FIELDS)
-            data.update({'id': osd_id})
-            data.update({'osd': osd_id})
-            data.update({'pg_states': dict(pg_states_by_osd[osd_id])})
-            data.update({'pools': list(pools_by_osd[osd_id])})
-
+    # The part of the OSD map that we need to name pools, rather than fetching the whole thing
+    OSD_MAP_FIELDS = "pools[pool,pool_name]"
+
+    def generate(self, osd_rows, osd_map):
+        if not osd_map:
+            return []
+
+        pool_names = dict((p['pool'], p['pool_name']) for p in osd_map['pools'])
+
+        def fixup_osd(row):
+            data = dict((k, row[k]) for k in self.OSD_FIELDS)
+            data.update({
+                'id': row['osd'],
+                'osd': row['osd'],
+                'pg_states': row['pg_states'],
+                'pools': [pool_names[p] for p in row['pools']],
+                'fqdn': row['server'],
+                'host': row['host']
+            })
             return data
 
-        osds = map(fixup_osd, osd_map.osds_by_id.values())
-
-        # Apply the ServerMonitor data
-        for o, (service_id, fqdn) in zip(osds, service_to_server):
-            o['fqdn'] = fqdn
-            if fqdn is not None:
-                o['host'] = fqdn_to_server[fqdn]['hostname']
-            else:
-                o['host'] = None
-
-        return osds, osds_by_pg_state
+        return [fixup_osd(r) for r in osd_rows]
 
     def get(self, request, fsid):
-        servers = self.client.server_list_cluster(fsid, async=True)
-        osd_data = self.client.get_sync_object(fsid, OsdMap.str, async=True)
-        osds = self.client.list(fsid, OSD, {}, async=True)
-        pg_summary = self.client.get_sync_object(fsid, PgSummary.str, async=True)
-        osds = osds.get()
-        servers = servers.get()
-        osd_data = osd_data.get()
-        pg_summary = pg_summary.get()
-
-        osd_map = OsdMap(None, osd_data)
+        list_filter = {}
+        pg_states = request.QUERY_PARAMS.get('pg_states', None)
+        if pg_states:
+            list_filter['pg_states'] = [s.lower() for s in pg_states.split(",")]
 
-        server_info = self.client.server_by_service([ServiceId(fsid, OSD, str(osd['osd'])) for osd in osds], async=True)
-        server_info = server_info.get()
+        osd_rows, osds_by_pg_state, osd_map = self.client.multi_get(fsid, [
+            ['list_osd_rows', list_filter],
+            ['get_osds_by_pg_state'],
+            ['get_sync_object', OsdMap.str, None, self.OSD_MAP_FIELDS]
+        ])['results']
 
-        osds, osds_by_pg_state = self.generate(pg_summary, osd_map, server_info, servers)
+        osds = self.generate(osd_rows, osd_map)
 
-        if not osds or not osds_by_pg_state:
+        if not osd_map or not osds_by_pg_state:
             return Response([], status.HTTP_202_ACCEPTED)
 
-        pg_states = request.QUERY_PARAMS.get('pg_states', None)
-        if pg_states:
-            osds = self._filter_by_pg_state(osds, pg_states, osds_by_pg_state)
-
         osd_list = DataObject({
             # 'osds': [DataObject({'osd': o}) for o in osds],
             'osds': osds,
@@ -639,25 +470,30 @@ class ServerViewSet(RPCViewSet):
 class PoolViewSet(RPCViewSet):
     serializer_class = PoolSerializer
 
-    def pool_object(self, pool_data, cluster):
-        return DataObject({
+    def _stat_path(self, cluster, pool_data, stat_name):
+        return "ceph.cluster.%s.pool.%s.%s" % (cluster['id'], pool_data['pool'], stat_name)
+
+    def pool_objects(self, pools_data, cluster):
+        latest = get_latest_values([self._stat_path(cluster, p, stat_name)
+                                    for p in pools_data for stat_name in ('num_objects', 'num_bytes')])
+        return [DataObject({
             'id': pool_data['pool'],
             'cluster': cluster['id'],
             'pool_id': pool_data['pool'],
             'name': pool_data['pool_name'],
             'quota_max_objects': pool_data['quota_max_objects'],
             'quota_max_bytes': pool_data['quota_max_bytes'],
-            'used_objects': get_latest_graphite("ceph.cluster.%s.pool.%s.num_objects" % (cluster['id'], pool_data['pool'])),
-            'used_bytes': get_latest_graphite("ceph.cluster.%s.pool.%s.num_bytes" % (cluster['id'], pool_data['pool']))
-        })
+            'used_objects': latest[self._stat_path(cluster, pool_data, 'num_objects')],
+            'used_bytes': latest[self._stat_path(cluster, pool_data, 'num_bytes')]
+        }) for pool_data in pools_data]
 
     def list(self, request, fsid):
         cluster = self.client.get_cluster(fsid)
-        pools = [self.pool_object(p, cluster) for p in self.client.list(fsid, POOL, {})]
+        pools = self.pool_objects(self.client.list(fsid, POOL, {}), cluster)
 
         return Response(PoolSerializer(pools, many=True).data)
 
     def retrieve(self, request, fsid, pool_id):
         cluster = self.client.get_cluster(fsid)
-        pool = self.pool_object(self.client.get(fsid, POOL, int(pool_id)), cluster)
+        pool = self.pool_objects([self.client.get(fsid, POOL, int(pool_id))], cluster)[0]
         return Response(PoolSerializer(pool).data)
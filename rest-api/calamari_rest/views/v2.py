@@ -1,15 +1,22 @@
 from collections import defaultdict
+import copy
 from dateutil.parser import parse as dateutil_parse
+from dateutil.tz import tzutc
+import json
 import logging
 import shlex
 
-from django.http import Http404
+import msgpack
+
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework.exceptions import ParseError, APIException, PermissionDenied
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import status
+from rest_framework.settings import api_settings
 
 from calamari_rest.parsers.v2 import CrushMapParser
+from calamari_rest.renderers import EventStreamRenderer, streaming_response
 
 from calamari_common.remote import get_remote
 
@@ -22,22 +29,28 @@ from calamari_rest.views.exceptions import ServiceUnavailable
 from calamari_rest.views.paginated_mixin import PaginatedMixin
 from rest_framework.permissions import IsAuthenticated
 from calamari_rest.views.remote_view_set import RemoteViewSet
-from calamari_rest.views.rpc_view import RPCViewSet, DataObject
+from calamari_rest.views import rpc_view
+from calamari_rest.views.rpc_view import RPCViewSet, DataObject, etag_sync_objects
 from calamari_rest.permissions import IsRoleAllowed
-from calamari_rest.views.crush_node import lookup_ancestry
 from calamari_common.config import CalamariConfig
 from calamari_common.types import CRUSH_MAP, CRUSH_RULE, CRUSH_NODE, CRUSH_TYPE, POOL, OSD, USER_REQUEST_COMPLETE, USER_REQUEST_SUBMITTED, \
-    OSD_IMPLEMENTED_COMMANDS, MON, OSD_MAP, SYNC_OBJECT_TYPES, ServiceId, severity_from_str, SEVERITIES
+    OSD_IMPLEMENTED_COMMANDS, MON, OSD_MAP, SYNC_OBJECT_TYPES, SYNC_OBJECT_STR_TYPE, ServiceId, severity_from_str, SEVERITIES, \
+    OSD_SORT_KEYS, POOL_SORT_KEYS, SERVER
+from calamari_common.util import parse_selector, project
 
 from django.views.decorators.csrf import csrf_exempt
 
 try:
     from calamari_common.db.event import Event
+    from calamari_common.db.sync_object import SyncObject as SyncObjectRecord
 except ImportError:
     # No database available
     class Event(object):
         pass
 
+    class SyncObjectRecord(object):
+        pass
+
 
 remote = get_remote()
 
@@ -77,6 +90,12 @@ state is one of 'complete', 'submitted'.
 The returned records are ordered by the 'requested_at' attribute, in descending order (i.e.
 the first page of results contains the most recent requests).
 
+Completed requests are kept indefinitely.  Paging through them by page number (``?page=<n>``)
+means counting them all and reading every request before the page, so for long histories
+pass an empty ``?cursor=`` parameter to switch to cursor pagination instead, and follow the
+``next`` and ``previous`` links in the response to move between pages.  Cursor pages do not
+count the total number of requests unless ``?count=true`` is also passed.
+
 To cancel a request while it is running, send an empty POST to ``request/<request id>/cancel``.
     """
     serializer_class = RequestSerializer
@@ -97,8 +116,18 @@ To cancel a request while it is running, send an empty POST to ``request/<reques
         if filter_state is not None and filter_state not in valid_states:
             raise ParseError("State must be one of %s" % ", ".join(valid_states))
 
-        requests = self.client.list_requests({'state': filter_state, 'fsid': fsid})
-        return Response(self._paginate(request, requests))
+        filter_args = {'state': filter_state, 'fsid': fsid}
+        if 'cursor' in request.GET:
+            def get_page(cursor, limit, count):
+                return self.client.list_requests(filter_args, 0, limit, cursor, count)
+
+            return streaming_response(request, self._paginate_cursor_slice(request, get_page, 'requested_at', 'id',
+                                                                           id_type=str))
+        else:
+            def get_slice(offset, limit):
+                return self.client.list_requests(filter_args, offset, limit)
+
+            return streaming_response(request, self._paginate_slice(request, get_slice))
 
 
 class CrushMapViewSet(RPCViewSet):
@@ -107,6 +136,7 @@ Allows retrieval and replacement of a crushmap as a whole
     """
     parser_classes = (CrushMapParser,)
 
+    @etag_sync_objects(OSD_MAP)
     def retrieve(self, request, fsid):
         crush_map = self.client.get_sync_object(fsid, 'osd_map')['crush_map_text']
         return Response(crush_map)
@@ -137,10 +167,12 @@ The CRUSH algorithm distributes data objects among storage devices according to
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @etag_sync_objects(OSD_MAP)
     def list(self, request, fsid):
         crush_nodes = self.client.list(fsid, CRUSH_NODE, {})
         return Response(self.serializer_class(crush_nodes).data)
 
+    @etag_sync_objects(OSD_MAP)
     def retrieve(self, request, fsid, node_id):
         crush_node = self.client.get(fsid, CRUSH_NODE, int(node_id))
         if crush_node:
@@ -170,6 +202,7 @@ together to a pool.
     """
     serializer_class = CrushRuleSerializer
 
+    @etag_sync_objects(OSD_MAP)
     def list(self, request, fsid):
         rules = self.client.list(fsid, CRUSH_RULE, {})
         osds_by_rule_id = self.client.get_sync_object(fsid, 'osd_map', ['osds_by_rule_id'])
@@ -177,6 +210,7 @@ together to a pool.
             rule['osd_count'] = len(osds_by_rule_id[rule['rule_id']])
         return Response(CrushRuleSerializer([DataObject(r) for r in rules], many=True).data)
 
+    @etag_sync_objects(OSD_MAP)
     def retrieve(self, request, fsid, rule_id):
         crush_rule = self.client.get(fsid, CRUSH_RULE, int(rule_id))
         osds_by_rule_id = self.client.get_sync_object(fsid, 'osd_map', ['osds_by_rule_id'])
@@ -234,6 +268,7 @@ A CRUSH rule is used by Ceph to decide where to locate placement groups on OSDs.
     """
     serializer_class = CrushRuleSetSerializer
 
+    @etag_sync_objects(OSD_MAP)
     def list(self, request, fsid):
         rules = self.client.list(fsid, CRUSH_RULE, {})
         osds_by_rule_id = self.client.get_sync_object(fsid, 'osd_map', ['osds_by_rule_id'])
@@ -257,10 +292,12 @@ By convention, there is one leaf bucket type and it is type 0; however, you may
     """
     serializer_class = CrushTypeSerializer
 
+    @etag_sync_objects(OSD_MAP)
     def list(self, request, fsid):
         crush_types = self.client.list(fsid, CRUSH_TYPE, {})
         return Response(self.serializer_class(crush_types).data)
 
+    @etag_sync_objects(OSD_MAP)
     def retrieve(self, request, fsid, type_id):
         crush_type = self.client.get(fsid, CRUSH_TYPE, int(type_id))
         return Response(self.serializer_class(DataObject(crush_type)).data)
@@ -416,17 +453,19 @@ Configuration settings from a Ceph Cluster.
     serializer_class = ConfigSettingSerializer
 
     def _get_config(self, fsid):
-        ceph_config = self.client.get_sync_object(fsid, 'config')
+        ceph_config = self._get_sync_object(fsid, 'config')
         if not ceph_config:
             raise ServiceUnavailable("Cluster configuration unavailable")
         else:
             return ceph_config
 
+    @etag_sync_objects('config')
     def list(self, request, fsid):
         ceph_config = self._get_config(fsid)
         settings = [DataObject({'key': k, 'value': v}) for (k, v) in ceph_config.items()]
         return Response(self.serializer_class(settings, many=True).data)
 
+    @etag_sync_objects('config')
     def retrieve(self, request, fsid, key):
         ceph_config = self._get_config(fsid)
         try:
@@ -441,7 +480,42 @@ def _config_to_bool(config_val):
     return {'true': True, 'false': False}[config_val.lower()]
 
 
-class PoolViewSet(RPCViewSet, RequestReturner):
+class SlicedListMixin(PaginatedMixin):
+    """
+    For RPCViewSets listing OSDs or pools, which cthulhu filters, sorts and
+    slices from its indexes so that only the requested page comes over RPC.
+    """
+    def _list_page(self, request, fsid, object_type, list_filter, sort_keys, wrap):
+        ordering = request.GET.get('ordering')
+        if ordering:
+            for key in ordering.split(","):
+                if key.strip().lstrip("-") not in sort_keys:
+                    raise ParseError("Cannot sort by '%s', must be one of %s" % (
+                        key.strip().lstrip("-"), ", ".join(sorted(sort_keys.keys()))))
+
+        def get_slice(offset, limit):
+            page = self.client.list_page(fsid, object_type, list_filter, ordering, offset, limit)
+            page['results'] = [wrap(o) for o in page['results']]
+            return page
+
+        if 'page' in request.GET or 'page_size' in request.GET:
+            return streaming_response(request, self._paginate_slice(request, get_slice))
+        else:
+            return streaming_response(request, self._serialized(get_slice(0, None)['results']))
+
+    def _pg_states_filter(self, request, list_filter):
+        if 'pg_states' in request.GET:
+            list_filter['pg_states'] = [state.strip().lower() for state in request.GET['pg_states'].split(",")]
+
+    def _list_sync_types(self, list_filter, sync_types):
+        # Only the pg_states filter makes a list depend on the PG summary, which
+        # changes far more often than anything else that it's built from
+        if 'pg_states' in list_filter:
+            return sync_types + ['pg_summary']
+        return sync_types
+
+
+class PoolViewSet(RPCViewSet, RequestReturner, SlicedListMixin):
     """
 Manage Ceph storage pools.
 
@@ -449,6 +523,26 @@ To get the default values which will be used for any fields omitted from a POST,
 a GET with the ?defaults argument.  The returned pool object will contain all attributes,
 but those without static defaults will be set to null.
 
+The list of pools may be filtered, sorted and paginated:
+
+::
+
+    # Pass a series of ``id__in[]`` parameters to specify a list of pool IDs
+    /api/v2/cluster/<fsid>/pool?id__in[]=1&id__in[]=2
+
+    # Pass a ``pg_states`` parameter set to a comma separated list of PG
+    # states, to get pools with PGs in any of those states
+    /api/v2/cluster/<fsid>/pool?pg_states=degraded,peering
+
+    # Pass an ``ordering`` parameter with a comma separated list of any of
+    # id, name, size, min_size, pg_num and crush_ruleset, each optionally
+    # prefixed with '-' for descending order
+    /api/v2/cluster/<fsid>/pool?ordering=-pg_num,name
+
+    # Pass ``page`` and/or ``page_size`` parameters to get one page of
+    # results, with ``count``, ``next`` and ``previous`` attributes
+    /api/v2/cluster/<fsid>/pool?page=2&page_size=50
+
     """
     serializer_class = PoolSerializer
 
@@ -498,11 +592,21 @@ but those without static defaults will be set to null.
 
     def list(self, request, fsid):
         if 'defaults' in request.GET:
-            return self._defaults(fsid)
+            return self._versioned_response(request, fsid, [OSD_MAP, 'config'], lambda: self._defaults(fsid))
 
-        pools = [PoolDataObject(p) for p in self.client.list(fsid, POOL, {})]
-        return Response(PoolSerializer(pools, many=True).data)
+        list_filter = {}
+        if 'id__in[]' in request.GET:
+            try:
+                list_filter['id__in'] = [int(i) for i in request.GET.getlist("id__in[]")]
+            except ValueError:
+                return Response("Invalid pool ID in list", status=status.HTTP_400_BAD_REQUEST)
+        self._pg_states_filter(request, list_filter)
 
+        return self._versioned_response(
+            request, fsid, self._list_sync_types(list_filter, [OSD_MAP]),
+            lambda: self._list_page(request, fsid, POOL, list_filter, POOL_SORT_KEYS, PoolDataObject))
+
+    @etag_sync_objects(OSD_MAP)
     def retrieve(self, request, fsid, pool_id):
         pool = PoolDataObject(self.client.get(fsid, POOL, int(pool_id)))
         return Response(PoolSerializer(pool).data)
@@ -595,7 +699,7 @@ but those without static defaults will be set to null.
             errors['name'].append('Pool with name {name} already exists'.format(name=data['name']))
 
 
-class OsdViewSet(RPCViewSet, RequestReturner):
+class OsdViewSet(RPCViewSet, RequestReturner, SlicedListMixin):
     """
 Manage Ceph OSDs.
 
@@ -605,6 +709,14 @@ where <command> is one of ("scrub", "deep-scrub", "repair")
 
 e.g. Initiate a scrub on OSD 0 by POSTing {} to api/v2/cluster/<fsid>/osd/0/command/scrub
 
+Modify several OSDs at once by doing a PATCH to api/v2/cluster/<fsid>/osd with a list
+of objects, each with the ``id`` of an OSD and the attributes to change.  This makes a
+single request, which reports the ``outcome`` of each OSD in its ``outcomes`` attribute:
+
+::
+
+    [{"id": 1, "in": false}, {"id": 2, "in": false}, {"id": 3, "reweight": 0.5}]
+
 Filtering is available on this resource:
 
 ::
@@ -616,6 +728,36 @@ Filtering is available on this resource:
     # that you wish to receive.
     /api/v2/cluster/<fsid>/osd?id__in[]=2&id__in[]=3
 
+    # Pass a ``host`` URL parameter set to a server's FQDN or hostname
+    /api/v2/cluster/<fsid>/osd?host=node1
+
+    # Pass a ``pg_states`` URL parameter set to a comma separated list of
+    # PG states, to get OSDs with PGs in any of those states
+    /api/v2/cluster/<fsid>/osd?pg_states=degraded,peering
+
+    # Pass ``up`` and/or ``in`` URL parameters set to true or false
+    /api/v2/cluster/<fsid>/osd?up=false
+
+    # Pass a ``crush_ancestor`` URL parameter set to a CRUSH node ID, to
+    # get the OSDs beneath that node
+    /api/v2/cluster/<fsid>/osd?crush_ancestor=-3
+
+    # Pass a ``device_class`` URL parameter set to a CRUSH device class
+    /api/v2/cluster/<fsid>/osd?device_class=ssd
+
+The list may also be sorted and paginated:
+
+::
+
+    # Pass an ``ordering`` parameter with a comma separated list of any of
+    # id, up, in, reweight, server, host and device_class, each optionally
+    # prefixed with '-' for descending order
+    /api/v2/cluster/<fsid>/osd?ordering=host,-reweight
+
+    # Pass ``page`` and/or ``page_size`` parameters to get one page of
+    # results, with ``count``, ``next`` and ``previous`` attributes
+    /api/v2/cluster/<fsid>/osd?page=2&page_size=100
+
     """
     serializer_class = OsdSerializer
 
@@ -637,95 +779,36 @@ Filtering is available on this resource:
             except ValueError:
                 return Response("Invalid OSD ID in list", status=status.HTTP_400_BAD_REQUEST)
 
-        # Get data
-        osds = self.client.list(fsid, OSD, list_filter, async=True)
-        parent_map = self.client.get_sync_object(fsid, 'osd_map', ['parent_bucket_by_node_id'], async=True)
-        osd_to_pools = self.client.get_sync_object(fsid, 'osd_map', ['osd_pools'], async=True)
-        crush_nodes = self.client.get_sync_object(fsid, 'osd_map', ['osd_tree_node_by_id'], async=True)
-        osd_metadata = self.client.get_sync_object(fsid, 'osd_map', ['metadata_by_id'], async=True)
-        osds = osds.get()
-
-        # Get data depending on OSD list
-        server_info = self.client.server_by_service([ServiceId(fsid, OSD, str(osd['osd'])) for osd in osds], async=True)
-        osd_commands = self.client.get_valid_commands(fsid, OSD, [x['osd'] for x in osds], async=True)
-
-        # Preparation complete, await all data to serialize result
-        parent_map = parent_map.get()
-        osd_to_pools = osd_to_pools.get()
-        crush_nodes = crush_nodes.get()
-        osd_metadata = osd_metadata.get()
-        server_info = server_info.get()
-        osd_commands = osd_commands.get()
-
-        # Build OSD data objects
-        for o in osds:
-            # An OSD being in the OSD map does not guarantee its presence in the CRUSH
-            # map, as "osd crush rm" and "osd rm" are separate operations.
-            try:
-                o.update({'reweight': float(crush_nodes[o['osd']]['reweight'])})
-            except KeyError:
-                log.warning("No CRUSH data available for OSD {0}".format(o['osd']))
-                o.update({'reweight': 0.0})
+        if 'host' in request.GET:
+            list_filter['host'] = request.GET['host']
 
-        for o, (service_id, fqdn) in zip(osds, server_info):
-            o['server'] = fqdn
+        self._pg_states_filter(request, list_filter)
 
-        for o in osds:
-            o['pools'] = osd_to_pools[o['osd']]
-            try:
-                o['backend_device_node'] = osd_metadata[o['osd']]['backend_filestore_dev_node']
-            except KeyError:
-                o['backend_device_node'] = None
-            try:
-                o['backend_partition_path'] = osd_metadata[o['osd']]['backend_filestore_partition_path']
-            except KeyError:
-                o['backend_partition_path'] = None
-            try:
-                o['osd_data'] = osd_metadata[o['osd']]['osd_data']
-            except KeyError:
-                o['osd_data'] = None
+        for flag in ('up', 'in'):
+            if flag in request.GET:
+                try:
+                    list_filter[flag] = _config_to_bool(request.GET[flag])
+                except KeyError:
+                    return Response("'%s' must be true or false" % flag, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'crush_ancestor' in request.GET:
             try:
-                o['osd_journal'] = osd_metadata[o['osd']]['osd_journal']
-            except KeyError:
-                o['osd_journal'] = None
-            o.update(osd_commands[o['osd']])
-            o.update({'crush_node_ancestry': lookup_ancestry(o['osd'], parent_map)})
+                list_filter['crush_ancestor'] = int(request.GET['crush_ancestor'])
+            except ValueError:
+                return Response("CRUSH node ID must be an integer", status=status.HTTP_400_BAD_REQUEST)
+
+        if 'device_class' in request.GET:
+            list_filter['device_class'] = request.GET['device_class']
 
-        return Response(self.serializer_class([DataObject(o) for o in osds], many=True).data)
+        # The server and host of each OSD come from the server monitor
+        return self._versioned_response(
+            request, fsid, self._list_sync_types(list_filter, [OSD_MAP, SERVER]),
+            lambda: self._list_page(request, fsid, OSD, list_filter, OSD_SORT_KEYS, DataObject))
 
     @csrf_exempt
+    @etag_sync_objects(OSD_MAP, SERVER)
     def retrieve(self, request, fsid, osd_id):
-        osd = self.client.get_sync_object(fsid, 'osd_map', ['osds_by_id', int(osd_id)])
-        crush_node = self.client.get_sync_object(fsid, 'osd_map', ['osd_tree_node_by_id', int(osd_id)])
-        osd['reweight'] = float(crush_node['reweight'])
-        osd['server'] = self.client.server_by_service([ServiceId(fsid, OSD, osd_id)])[0][1]
-
-        pools = self.client.get_sync_object(fsid, 'osd_map', ['osd_pools', int(osd_id)])
-        osd['pools'] = pools
-
-        osd_metadata = self.client.get_sync_object(fsid, 'osd_map', ['metadata_by_id', int(osd_id)])
-        try:
-            osd['backend_device_node'] = osd_metadata['backend_filestore_dev_node']
-        except KeyError:
-            osd['backend_device_node'] = None
-        try:
-            osd['backend_partition_path'] = osd_metadata['backend_filestore_partition_path']
-        except KeyError:
-            osd['backend_partition_path'] = None
-        try:
-            osd['osd_data'] = osd_metadata['osd_data']
-        except KeyError:
-            osd['osd_data'] = None
-        try:
-            osd['osd_journal'] = osd_metadata['osd_journal']
-        except KeyError:
-            osd['osd_journal'] = None
-
-        osd_commands = self.client.get_valid_commands(fsid, OSD, [int(osd_id)])
-        osd.update(osd_commands[int(osd_id)])
-        parent_map = self.client.get_sync_object(fsid, 'osd_map', ['parent_bucket_by_node_id'])
-        osd.update({'crush_node_ancestry': lookup_ancestry(osd['osd'], parent_map)})
-
+        osd = self.client.get_osd_row(fsid, int(osd_id))
         return Response(self.serializer_class(DataObject(osd)).data)
 
     def update(self, request, fsid, osd_id):
@@ -735,6 +818,37 @@ Filtering is available on this resource:
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def update_many(self, request, fsid):
+        if not isinstance(request.DATA, list) or not request.DATA:
+            return Response("Expected a list of OSDs", status=status.HTTP_400_BAD_REQUEST)
+
+        osds_attributes = []
+        errors = []
+        seen = set()
+        for datum in request.DATA:
+            # JSON true and false are bools, which are ints to Python
+            if not isinstance(datum, dict) or not isinstance(datum.get('id'), int) or isinstance(datum['id'], bool):
+                errors.append({'id': 'Required during %s' % request.method})
+                continue
+            elif datum['id'] in seen:
+                errors.append({'id': 'Duplicate OSD ID'})
+                continue
+            seen.add(datum['id'])
+
+            attributes = dict(datum)
+            del attributes['id']
+            serializer = self.serializer_class(data=attributes)
+            if serializer.is_valid(request.method):
+                errors.append({})
+                osds_attributes.append(dict(serializer.get_data(), id=datum['id']))
+            else:
+                errors.append(serializer.errors)
+
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return self._return_request(self.client.update_many(fsid, OSD, osds_attributes))
+
     def apply(self, request, fsid, osd_id, command):
         if command in self.client.get_valid_commands(fsid, OSD, [int(osd_id)]).get(int(osd_id)).get('valid_commands'):
             return Response(self.client.apply(fsid, OSD, int(osd_id), command), status=202)
@@ -765,6 +879,7 @@ Manage flags in the OsdMap
     """
     serializer_class = OsdConfigSerializer
 
+    @etag_sync_objects(OSD_MAP)
     def osd_config(self, request, fsid):
         osd_map = self.client.get_sync_object(fsid, OSD_MAP, ['flags'])
         return Response(osd_map)
@@ -787,12 +902,77 @@ such as the cluster maps
     """
 
     def retrieve(self, request, fsid, sync_type):
-        return Response(self.client.get_sync_object(fsid, sync_type))
+        return self._versioned_response(request, fsid, [sync_type],
+                                        lambda: streaming_response(request, self._get_sync_object(fsid, sync_type)))
 
     def describe(self, request, fsid):
         return Response([s.str for s in SYNC_OBJECT_TYPES])
 
 
+class SyncObjectHistory(DatabaseViewSet):
+    """
+The versions of a sync object that the Calamari server has stored, oldest first,
+within the time range given by the ``from`` and ``to`` ISO8601 parameters (either
+may be omitted).  Each item has ``version``, ``when`` and ``data`` attributes.
+
+Pass ``fields`` as a comma separated list of dotted paths to return only part of
+each version's data, e.g. ``?fields=epoch,osds.osd,osds.up,osds.in`` (or equivalently
+``?fields=epoch,osds[osd,up,in]``) for the OSD up/in history.  The response is streamed,
+so arbitrarily long ranges may be requested.
+    """
+    # Rows to fetch from the database at a time while streaming
+    BATCH_SIZE = 100
+
+    def _parse_time(self, request, param):
+        value = request.GET.get(param)
+        if not value:
+            return None
+        try:
+            when = dateutil_parse(value)
+        except (TypeError, ValueError):
+            raise ParseError("Invalid '%s' time '%s'" % (param, value))
+        if when.tzinfo is not None:
+            # Stored times are naive UTC
+            when = when.astimezone(tzutc()).replace(tzinfo=None)
+        return when
+
+    def history(self, request, fsid, sync_type):
+        if sync_type not in SYNC_OBJECT_STR_TYPE:
+            raise Http404("Sync object type '%s' not found" % sync_type)
+
+        time_from = self._parse_time(request, 'from')
+        time_to = self._parse_time(request, 'to')
+        fields = request.GET.get('fields')
+        if fields:
+            try:
+                fields = parse_selector(fields)
+            except ValueError as e:
+                raise ParseError(str(e))
+
+        query = self.session.query(SyncObjectRecord.version, SyncObjectRecord.when, SyncObjectRecord.data).filter(
+            SyncObjectRecord.fsid == fsid, SyncObjectRecord.sync_type == sync_type)
+        if time_from is not None:
+            query = query.filter(SyncObjectRecord.when >= time_from)
+        if time_to is not None:
+            query = query.filter(SyncObjectRecord.when < time_to)
+        query = query.order_by(SyncObjectRecord.when, SyncObjectRecord.version).yield_per(self.BATCH_SIZE)
+
+        def generate():
+            yield "["
+            for i, (version, when, data) in enumerate(query):
+                data = msgpack.unpackb(data)
+                if fields:
+                    data = project(data, fields)
+                yield ("," if i else "") + json.dumps({
+                    'version': version,
+                    'when': when.replace(tzinfo=tzutc()).isoformat() if when.tzinfo is None else when.isoformat(),
+                    'data': data
+                })
+            yield "]"
+
+        return StreamingHttpResponse(generate(), content_type="application/json")
+
+
 class DebugJob(RPCViewSet, RequestReturner):
     """
 For debugging and automated testing only.
@@ -928,12 +1108,24 @@ This resource supports "more severe than" filtering on the severity
 attribute.  Pass the desired severity threshold as a URL parameter
 in a GET, such as ``?severity=RECOVERY`` to show everything but INFO.
 
+By default this resource is paginated by page number (``?page=<n>``).  For
+large event histories, pass an empty ``?cursor=`` parameter to switch to
+cursor pagination instead, and follow the ``next`` and ``previous`` links
+in the response to move between pages.  Cursor pages do not count the total
+number of events unless ``?count=true`` is also passed.
+
     """
     serializer_class = EventSerializer
 
     @property
     def queryset(self):
-        return self.session.query(Event).order_by(Event.when.desc())
+        return self.session.query(Event)
+
+    def _paginate_events(self, request, queryset):
+        if 'cursor' in request.GET:
+            return self._paginate_cursor(request, queryset, Event.when, Event.id)
+        else:
+            return self._paginate(request, queryset.order_by(Event.when.desc(), Event.id.desc()))
 
     def _filter_by_severity(self, request, queryset=None):
         if queryset is None:
@@ -948,13 +1140,132 @@ in a GET, such as ``?severity=RECOVERY`` to show everything but INFO.
         return queryset.filter(Event.severity <= severity)
 
     def list(self, request):
-        return Response(self._paginate(request, self._filter_by_severity(request)))
+        return streaming_response(request, self._paginate_events(request, self._filter_by_severity(request)))
 
     def list_cluster(self, request, fsid):
-        return Response(self._paginate(request, self._filter_by_severity(request, self.queryset.filter_by(fsid=fsid))))
+        return streaming_response(request, self._paginate_events(
+            request, self._filter_by_severity(request, self.queryset.filter_by(fsid=fsid))))
 
     def list_server(self, request, fqdn):
-        return Response(self._paginate(request, self._filter_by_severity(request, self.queryset.filter_by(fqdn=fqdn))))
+        return streaming_response(request, self._paginate_events(
+            request, self._filter_by_severity(request, self.queryset.filter_by(fqdn=fqdn))))
+
+
+class ChangeFeedViewSet(RPCViewSet):
+    """
+Notifications of changes to cluster state, so that clients can wait for something
+to change and then fetch only what changed, instead of polling every resource.
+
+A GET without a ``since`` parameter returns at once with a ``since`` token.  A GET
+with ``?since=<token>`` waits for up to ``timeout`` seconds (default and maximum 20)
+for something to happen after that token, then returns ``changes``, a list of
+notifications, and a new ``since`` token to pass next time.  If ``reset`` is true,
+the token was not recognised (e.g. Calamari server restarted, or the client fell
+too far behind), and the client should assume that everything changed.
+
+Each notification has a ``type`` of:
+
+- ``sync_object``, with ``fsid``, ``sync_type`` and the new ``version``
+- ``request``, with ``id``, ``fsid``, ``state`` and ``error``, when a request
+  starts or completes
+- ``event``, with ``severity``, ``message`` and ``when``, and the ``fsid``, ``fqdn``
+  etc. that the event relates to
+
+Clients that accept ``text/event-stream`` get Server-Sent Events instead: each
+notification is a ``change`` event, with the ``since`` token as the event ID
+so that a reconnecting EventSource resumes where it left off.
+
+Waiting is only done under calamari-lite, whose server can hold many requests
+open at once.  Elsewhere (e.g. Apache's mod_wsgi, which gives each request a whole
+worker process) a waiting client would tie up a worker, so a GET returns at once
+with whatever changes there are, and an event stream sends those then ends, for the
+EventSource to reconnect and poll again after its ``retry`` interval.
+
+    """
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (EventStreamRenderer,)
+
+    DEFAULT_TIMEOUT = 20
+
+    # Milliseconds for an EventSource to wait before reconnecting
+    SSE_RETRY = 5000
+
+    # Set in the WSGI environ by servers that may hold requests open without
+    # tying up a worker (calamari-lite's gevent server)
+    LONG_POLL_ENVIRON = 'calamari.long_poll'
+
+    def _get_timeout(self, request):
+        try:
+            timeout = float(request.GET.get('timeout', self.DEFAULT_TIMEOUT))
+        except ValueError:
+            raise ParseError("timeout must be a number")
+        if timeout < 0:
+            raise ParseError("timeout must not be negative")
+        return timeout
+
+    def _format_changes(self, result):
+        token = result['since']
+        if result['reset']:
+            return "id: %s\nevent: reset\ndata: {}\n\n" % token
+        elif result['changes']:
+            return "".join("event: change\ndata: %s\n\n" % json.dumps(c) for c in result['changes'][:-1]) + \
+                "id: %s\nevent: change\ndata: %s\n\n" % (token, json.dumps(result['changes'][-1]))
+        else:
+            return None
+
+    def _event_poll(self, since, fsid):
+        result = self.client.get_changes(since, 0, fsid)
+        content = "retry: %s\nid: %s\n\n" % (self.SSE_RETRY, since or result['since'])
+        if since is not None:
+            content += self._format_changes(result) or "id: %s\n\n" % result['since']
+        response = HttpResponse(content, content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def _event_stream(self, since, fsid):
+        pool = rpc_view.RpcClientPool.get()
+
+        def generate():
+            # The view's client goes back to the pool when the view returns,
+            # so the stream has its own for as long as it runs
+            client = pool.checkout()
+            lost = False
+            try:
+                token = since
+                if token is None:
+                    token = client.get_changes(None, 0, fsid)['since']
+                yield "retry: %s\nid: %s\n\n" % (self.SSE_RETRY, token)
+
+                while True:
+                    result = client.get_changes(token, self.DEFAULT_TIMEOUT, fsid)
+                    client.method_times.clear()
+                    token = result['since']
+                    # Keep the connection alive through proxies when nothing changed
+                    yield self._format_changes(result) or ": keepalive\n\n"
+            except rpc_view.LostRemote:
+                lost = True
+            finally:
+                client.method_times.clear()
+                pool.release(client, lost=lost)
+
+        response = StreamingHttpResponse(generate(), content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, fsid=None):
+        since = request.GET.get('since', request.META.get('HTTP_LAST_EVENT_ID')) or None
+        timeout = self._get_timeout(request)
+        long_poll = request.META.get(self.LONG_POLL_ENVIRON, False)
+
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            # Check the cluster exists before starting a stream of its changes
+            if fsid is not None and self.client.get_cluster(fsid) is None:
+                return Response("Cluster %s not found" % fsid, status=status.HTTP_404_NOT_FOUND)
+            if long_poll:
+                return self._event_stream(since, fsid)
+            else:
+                return self._event_poll(since, fsid)
+        else:
+            return Response(self.client.get_changes(since, timeout if long_poll else 0, fsid))
 
 
 class LogTailViewSet(RemoteViewSet):
@@ -1039,8 +1350,8 @@ useful to show users data from the /status sub-url, which returns the
     serializer_class = MonSerializer
 
     def _get_mons(self, fsid):
-        mon_status = self.client.get_sync_object(fsid, 'mon_status')
-        quorum_status = self.client.get_sync_object(fsid, 'quorum_status')
+        mon_status = copy.deepcopy(self._get_sync_object(fsid, 'mon_status'))
+        quorum_status = self._get_sync_object(fsid, 'quorum_status')
         quorum_leader_name = quorum_status.get('quorum_leader_name')
         if not mon_status:
             raise Http404("No mon data available")
@@ -1113,6 +1424,7 @@ useful to show users data from the /status sub-url, which returns the
             # I think the cluster map is lying about there being a quorum at all
             for m in mons:
                 m['in_quorum'] = False
+                m['leader'] = False
         else:  # describe that one of the mons is the leader
             for m in mons:
                 if m.get('name') == quorum_leader_name:
@@ -1209,32 +1521,51 @@ not a problem.
         return Response(self.serializer_class(DataObject(result)).data)
 
 
-class ClusterStatsViewSet(RemoteViewSet):
+class DfStatsViewSet(RPCViewSet):
+    """
+Base for the views of the cluster and pool stats that the Calamari server collects
+periodically.
+    """
+    def _get_df_stats(self, request, fsid):
+        refresh = request.GET.get('refresh', 'false').lower() in ('true', '1')
+        stats = self.client.get_df_stats(fsid, refresh)
+        if stats['updated'] is None:
+            raise ServiceUnavailable("Stats for cluster %s have not been collected yet" % fsid)
+        return stats
+
+    def _stats_object(self, stats, updated):
+        return DataObject(dict(stats, updated=dateutil_parse(updated)))
+
+
+class ClusterStatsViewSet(DfStatsViewSet):
     """
-Allows retrieval of cluster statistics
+Allows retrieval of cluster statistics.  These are collected periodically rather than
+on each request: ``updated`` is the time they were collected.  Pass ``?refresh=true``
+to have them collected afresh.
     """
     serializer_class = ClusterStatsSerializer
 
     def retrieve(self, request, fsid):
-        name = self.client.get_cluster(fsid)['name']
-        result = self.run_mon_job(fsid, "ceph.cluster_stats", [name])
-        return Response(self.serializer_class(DataObject(result)).data)
+        stats = self._get_df_stats(request, fsid)
+        return Response(self.serializer_class(self._stats_object(stats['cluster'], stats['updated'])).data)
 
 
-class PoolStatsViewSet(RemoteViewSet):
+class PoolStatsViewSet(DfStatsViewSet):
     """
-Allows retrieval of pool statistics
+Allows retrieval of pool statistics.  These are collected periodically rather than
+on each request: ``updated`` is the time they were collected.  Pass ``?refresh=true``
+to have them collected afresh.
     """
     serializer_class = PoolStatsSerializer
 
     def retrieve(self, request, fsid, pool_id):
-        name = self.client.get_cluster(fsid)['name']
-        result = self.run_mon_job(fsid, "ceph.pool_stats", [name, [int(pool_id)]])
-        if(len(result) != 1):
-            raise ParseError("pool_stats returned %d pool item(s) for %s" % (len(result), str(pool_id)))
-        return Response(self.serializer_class(result[0]).data)
+        stats = self._get_df_stats(request, fsid)
+        for pool in stats['pools']:
+            if pool['id'] == int(pool_id):
+                return Response(self.serializer_class(self._stats_object(pool, stats['updated'])).data)
+        raise Http404("Pool %s not found" % pool_id)
 
     def list(self, request, fsid):
-        name = self.client.get_cluster(fsid)['name']
-        result = self.run_mon_job(fsid, "ceph.pool_stats", [name, []])
-        return Response(self.serializer_class(result, many=True).data)
+        stats = self._get_df_stats(request, fsid)
+        return Response(self.serializer_class([self._stats_object(pool, stats['updated'])
+                                               for pool in stats['pools']], many=True).data)
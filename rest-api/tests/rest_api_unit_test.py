@@ -1,11 +1,29 @@
+import json
 
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from rest_framework.test import APIClient
 from django.test import TestCase
 import mock
 from gevent.event import AsyncResult
 
 import calamari_rest.views.rpc_view
+from calamari_rest.views.response_cache import ResponseCache
+
+
+class StreamingAPIClient(APIClient):
+    """
+    An APIClient which decodes the body of streamed JSON responses into ``response.data``,
+    as it is for ordinary DRF responses.
+    """
+    def request(self, **kwargs):
+        response = super(StreamingAPIClient, self).request(**kwargs)
+        if isinstance(response, StreamingHttpResponse) and not response.has_header('Content-Encoding') \
+                and response['Content-Type'].startswith('application/json'):
+            content = "".join(response.streaming_content)
+            response.streaming_content = [content]
+            response.data = json.loads(content)
+        return response
 
 
 class RestApiUnitTest(TestCase):
@@ -16,6 +34,7 @@ class RestApiUnitTest(TestCase):
     def setUp(self):
         # Patch in a mock for RPCs
         rpc = mock.Mock()
+        rpc.get_sync_object_versions = mock.Mock(side_effect=lambda fsid, sync_types: [1 for t in sync_types])
         self.rpc = rpc
         old_init = calamari_rest.views.rpc_view.RPCViewSet.__init__
 
@@ -26,11 +45,14 @@ class RestApiUnitTest(TestCase):
         self._old_init = old_init
         calamari_rest.views.rpc_view.RPCViewSet.__init__ = init
 
+        # Don't serve responses cached by other tests
+        ResponseCache.get().clear()
+
         # Create a user to log in as
         User.objects.create_superuser(self.USERNAME, 'admin@admin.com', self.PASSWORD)
 
         # A client for performing requests to the API
-        self.client = APIClient()
+        self.client = StreamingAPIClient()
         if self.login:
             self.client.login(username='admin', password='admin')
 
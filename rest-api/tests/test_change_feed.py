@@ -0,0 +1,84 @@
+import json
+
+import mock
+
+from calamari_rest.views import rpc_view
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestChangeFeed(RestApiUnitTest):
+    CHANGES = {'since': 'f00-2', 'reset': False, 'changes': [
+        {'type': 'sync_object', 'fsid': 'abc', 'sync_type': 'osd_map', 'version': 10},
+        {'type': 'request', 'fsid': 'abc', 'id': 'req1', 'state': 'complete', 'error': False}
+    ]}
+
+    def setUp(self):
+        super(TestChangeFeed, self).setUp()
+        self.rpc.get_changes = mock.Mock(return_value=self.CHANGES)
+
+    # As calamari-lite's server sets it
+    LONG_POLL = {'calamari.long_poll': True}
+
+    def test_long_poll(self):
+        response = self.client.get("/api/v2/changes?since=f00-0&timeout=5", **self.LONG_POLL)
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data, self.CHANGES)
+        self.rpc.get_changes.assert_called_once_with('f00-0', 5, None)
+
+    def test_cluster(self):
+        response = self.client.get("/api/v2/cluster/abc/changes?since=f00-0", **self.LONG_POLL)
+        self.assertStatus(response, 200)
+        self.rpc.get_changes.assert_called_once_with('f00-0', 20, 'abc')
+
+    def test_poll(self):
+        # Servers that can't hold requests open without tying up a worker don't wait
+        response = self.client.get("/api/v2/changes?since=f00-0&timeout=5")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data, self.CHANGES)
+        self.rpc.get_changes.assert_called_once_with('f00-0', 0, None)
+
+    def test_bad_timeout(self):
+        self.assertStatus(self.client.get("/api/v2/changes?since=f00-0&timeout=soon"), 400)
+        self.assertStatus(self.client.get("/api/v2/changes?since=f00-0&timeout=-1"), 400)
+
+    def test_event_stream(self):
+        client = mock.Mock()
+        client.get_changes = mock.Mock(side_effect=[self.CHANGES, rpc_view.LostRemote()])
+        pool = mock.Mock()
+        pool.checkout = mock.Mock(return_value=client)
+
+        with mock.patch.object(rpc_view.RpcClientPool, 'get', return_value=pool):
+            response = self.client.get("/api/v2/changes", HTTP_ACCEPT='text/event-stream',
+                                       HTTP_LAST_EVENT_ID='f00-0', **self.LONG_POLL)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            content = "".join(response.streaming_content)
+
+        self.assertTrue(content.startswith("retry: 5000\nid: f00-0\n\n"))
+        messages = content.split("\n\n")[1:-1]
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0].split("\n")[0], "event: change")
+        last_id, event, data = messages[1].split("\n")
+        self.assertEqual((last_id, event), ("id: f00-2", "event: change"))
+        self.assertEqual(json.loads(data[len("data: "):]), self.CHANGES['changes'][-1])
+        pool.release.assert_called_once_with(client, lost=True)
+
+    def test_event_poll(self):
+        with mock.patch.object(rpc_view.RpcClientPool, 'get') as get_pool:
+            response = self.client.get("/api/v2/changes", HTTP_ACCEPT='text/event-stream',
+                                       HTTP_LAST_EVENT_ID='f00-0')
+            self.assertFalse(get_pool.called)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.rpc.get_changes.assert_called_once_with('f00-0', 0, None)
+
+        # The changes so far, then the stream ends for the EventSource to reconnect
+        messages = response.content.split("\n\n")
+        self.assertEqual(messages[0], "retry: 5000\nid: f00-0")
+        self.assertEqual(len(messages), 4)
+        self.assertEqual(messages[2].split("\n")[0], "id: f00-2")
+
+    def test_event_stream_no_cluster(self):
+        self.rpc.get_cluster = mock.Mock(return_value=None)
+        response = self.client.get("/api/v2/cluster/abc/changes", HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,53 @@
+import datetime
+
+from dateutil.tz import tzutc
+from django.utils.unittest import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from calamari_common.db.event import Event
+from calamari_common.types import INFO, WARNING, CRUSH_RULE_TYPE_ERASURE
+from calamari_rest.serializers.compiled import CompiledSerializer
+from calamari_rest.serializers.v2 import OsdSerializer, PoolSerializer, EventSerializer, RequestSerializer
+from calamari_rest.views.rpc_view import DataObject
+from calamari_rest.views.v2 import PoolDataObject
+
+
+class TestCompiledSerializer(TestCase):
+    def _check(self, serializer_class, objects):
+        compiled = CompiledSerializer.get(serializer_class)
+        for obj in objects:
+            expected = serializer_class(obj).data
+            self.assertEqual(compiled.to_native(obj), expected)
+            self.assertEqual(JSONRenderer().render(compiled.to_native(obj)), JSONRenderer().render(expected))
+
+    def test_osd(self):
+        self._check(OsdSerializer, [DataObject({
+            'osd': i, 'id': i, 'uuid': 'aaa-%s' % i, 'up': i % 2, 'in': 1,
+            'public_addr': '1.2.3.4:6800/1', 'cluster_addr': u'1.2.3.4:6801/1',
+            'reweight': 0.5, 'server': 'server1' if i else None, 'pools': [0, 2],
+            'backend_device_node': None, 'backend_partition_path': '/dev/sdb1',
+            'osd_data': '/var/lib/ceph/osd/ceph-%s' % i, 'osd_journal': None,
+            'valid_commands': ['scrub'], 'crush_node_ancestry': [[-2, -1]]
+        }) for i in range(0, 3)])
+
+    def test_pool(self):
+        self._check(PoolSerializer, [PoolDataObject({
+            'pool': i, 'pool_name': 'pool%s' % i, 'size': 3, 'min_size': 2, 'pg_num': 64, 'pg_placement_num': 64,
+            'crush_ruleset': 0, 'crash_replay_interval': 0, 'flags': i, 'quota_max_objects': 0,
+            'quota_max_bytes': 1024, 'type': CRUSH_RULE_TYPE_ERASURE if i else 1, 'erasure_code_profile': 'default'
+        }) for i in range(0, 4)])
+
+    def test_event(self):
+        self._check(EventSerializer, [
+            Event(when=datetime.datetime(2014, 1, 1, tzinfo=tzutc()), severity=INFO, message="event"),
+            Event(when=datetime.datetime(2014, 1, 1, 12, 30, 5, 123), severity=WARNING, message=u"caf\xe9")
+        ])
+
+    def test_dict(self):
+        self._check(RequestSerializer, [{
+            'id': 'abc', 'state': 'complete', 'error': False, 'error_message': None, 'headline': 'Doing a thing',
+            'status': None, 'requested_at': datetime.datetime(2014, 1, 1, tzinfo=tzutc()), 'completed_at': None
+        }])
+
+    def test_cached(self):
+        self.assertIs(CompiledSerializer.get(OsdSerializer), CompiledSerializer.get(OsdSerializer))
@@ -11,6 +11,7 @@ class TestCrushMap(TestCase):
 
     def setUp(self):
         self.request = mock.Mock()
+        self.request.META = {}
 
         with mock.patch('calamari_rest.views.v2.RPCViewSet'):
             self.cmvs = CrushMapViewSet()
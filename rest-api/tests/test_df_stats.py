@@ -0,0 +1,43 @@
+import json
+
+import mock
+
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestDfStats(RestApiUnitTest):
+    STATS = {
+        'updated': '2015-01-01T12:00:00+00:00',
+        'cluster': {'kb': 4096, 'kb_used': 1024, 'kb_avail': 3072, 'num_objects': 3},
+        'pools': [dict([(field, 0) for field in [
+            'num_objects_unfound', 'num_objects_missing_on_primary', 'num_object_clones', 'num_objects',
+            'num_object_copies', 'num_bytes', 'num_rd_kb', 'num_wr_kb', 'num_kb', 'num_wr',
+            'num_objects_degraded', 'num_rd']], id=pool_id, name='pool%s' % pool_id) for pool_id in (0, 2)]
+    }
+
+    def setUp(self):
+        super(TestDfStats, self).setUp()
+        self.rpc.get_df_stats = mock.Mock(return_value=self.STATS)
+
+    def test_cluster(self):
+        response = self.client.get("/api/v2/cluster/abc/stats")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['kb_used'], 1024)
+        self.assertEqual(json.loads(response.content)['updated'], '2015-01-01T12:00:00Z')
+        self.rpc.get_df_stats.assert_called_once_with('abc', False)
+
+    def test_pools(self):
+        response = self.client.get("/api/v2/cluster/abc/pool/stats?refresh=true")
+        self.assertStatus(response, 200)
+        self.assertEqual([p['name'] for p in response.data], ['pool0', 'pool2'])
+        self.rpc.get_df_stats.assert_called_once_with('abc', True)
+
+        response = self.client.get("/api/v2/cluster/abc/pool/2/stats")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['name'], 'pool2')
+
+        self.assertStatus(self.client.get("/api/v2/cluster/abc/pool/1/stats"), 404)
+
+    def test_not_collected(self):
+        self.rpc.get_df_stats = mock.Mock(return_value={'updated': None, 'cluster': None, 'pools': []})
+        self.assertStatus(self.client.get("/api/v2/cluster/abc/stats"), 503)
@@ -0,0 +1,95 @@
+import mock
+
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestEtag(RestApiUnitTest):
+    def setUp(self):
+        super(TestEtag, self).setUp()
+        self.versions = {'osd_map': 10, 'config': 'abc', 'server': 1}
+        self.rpc.get_sync_object_versions = mock.Mock(
+            side_effect=lambda fsid, sync_types: [self.versions[t] for t in sync_types])
+        self.rpc.list = mock.Mock(return_value=[])
+
+    def test_not_modified(self):
+        response = self.client.get("/api/v2/cluster/abc123/crush_rule_set")
+        self.assertStatus(response, 200)
+        etag = response['ETag']
+
+        response = self.client.get("/api/v2/cluster/abc123/crush_rule_set", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Only the version check went over RPC
+        self.assertEqual(self.rpc.list.call_count, 1)
+        self.rpc.get_sync_object_versions.assert_called_with("abc123", ['osd_map'])
+
+    def test_changed(self):
+        etag = self.client.get("/api/v2/cluster/abc123/crush_rule_set")['ETag']
+        self.versions['osd_map'] = 11
+        response = self.client.get("/api/v2/cluster/abc123/crush_rule_set", HTTP_IF_NONE_MATCH=etag)
+        self.assertStatus(response, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def _mock_osd_row(self):
+        self.rpc.get_osd_row = mock.Mock(return_value={
+            'osd': 1, 'id': 1, 'uuid': 'aaa', 'up': 1, 'in': 1, 'public_addr': '1.2.3.4:6800/1',
+            'cluster_addr': '1.2.3.4:6801/1', 'reweight': 1.0, 'server': None, 'host': None, 'pools': [],
+            'backend_device_node': None, 'backend_partition_path': None, 'osd_data': None, 'osd_journal': None,
+            'valid_commands': [], 'crush_node_ancestry': [], 'pg_states': {}, 'device_class': None
+        })
+
+    def test_server_generation(self):
+        # An OSD's host may be discovered without the OSD map changing
+        self._mock_osd_row()
+        etag = self.client.get("/api/v2/cluster/abc123/osd/1")['ETag']
+        self.rpc.get_sync_object_versions.assert_called_with("abc123", ['osd_map', 'server'])
+
+        self.versions['server'] = 2
+        response = self.client.get("/api/v2/cluster/abc123/osd/1", HTTP_IF_NONE_MATCH=etag)
+        self.assertStatus(response, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_varies_by_url(self):
+        self.rpc.get_sync_object = mock.Mock(return_value={'osd_pool_default_size': '3'})
+        a = self.client.get("/api/v2/cluster/abc123/config")['ETag']
+        b = self.client.get("/api/v2/cluster/abc123/config/osd_pool_default_size")['ETag']
+        self.assertNotEqual(a, b)
+
+        response = self.client.get("/api/v2/cluster/abc123/config/osd_pool_default_size", HTTP_IF_NONE_MATCH="%s, %s" % (a, b))
+        self.assertEqual(response.status_code, 304)
+
+    def test_sync_object(self):
+        self.rpc.get_sync_object = mock.Mock(return_value={'epoch': 10})
+        etag = self.client.get("/api/v2/cluster/abc123/sync_object/osd_map")['ETag']
+        response = self.client.get("/api/v2/cluster/abc123/sync_object/osd_map", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.rpc.get_sync_object.call_count, 1)
+
+    def test_cached_response(self):
+        self.rpc.list.return_value = [{'ruleset': 0, 'rule_id': 0, 'rule_name': 'data', 'type': 1,
+                                       'min_size': 1, 'max_size': 10, 'steps': []}]
+        self.rpc.get_sync_object = mock.Mock(return_value={0: [1, 2]})
+        first = self.client.get("/api/v2/cluster/abc123/crush_rule_set")
+        second = self.client.get("/api/v2/cluster/abc123/crush_rule_set")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.rpc.list.call_count, 1)
+
+        # A new map version means building the response again
+        self.versions['osd_map'] = 11
+        self.assertEqual(self.client.get("/api/v2/cluster/abc123/crush_rule_set").content, first.content)
+        self.assertEqual(self.rpc.list.call_count, 2)
+
+    def test_cached_server_fields(self):
+        self._mock_osd_row()
+        self.client.get("/api/v2/cluster/abc123/osd/1")
+        self.client.get("/api/v2/cluster/abc123/osd/1")
+        self.assertEqual(self.rpc.get_osd_row.call_count, 1)
+
+        # The OSD gets a server, in the same OSD map epoch
+        self.rpc.get_osd_row.return_value = dict(self.rpc.get_osd_row.return_value, server='node1', host='node1')
+        self.versions['server'] = 2
+        response = self.client.get("/api/v2/cluster/abc123/osd/1")
+        self.assertEqual(response.data['server'], 'node1')
+        self.assertEqual(self.rpc.get_osd_row.call_count, 2)
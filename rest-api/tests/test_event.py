@@ -0,0 +1,80 @@
+import datetime
+
+from dateutil.tz import tzutc
+
+from calamari_common.db.event import Event
+from calamari_common.types import INFO, WARNING
+from calamari_rest.views.database_view_set import DatabaseViewSet
+from calamari_rest.views.v2 import EventViewSet
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestEventPagination(RestApiUnitTest):
+    EVENT_COUNT = 25
+
+    def setUp(self):
+        super(TestEventPagination, self).setUp()
+
+        # Instantiating a DatabaseViewSet sets up the engine and session
+        self.session = EventViewSet().session
+        Event.__table__.create(DatabaseViewSet.engine, checkfirst=True)
+
+        # Several events share a timestamp, to check that the cursor breaks ties on id
+        t0 = datetime.datetime(2014, 1, 1, tzinfo=tzutc())
+        for i in range(0, self.EVENT_COUNT):
+            self.session.add(Event(
+                when=t0 + datetime.timedelta(seconds=i / 2),
+                severity=WARNING if i % 5 == 0 else INFO,
+                message="event %s" % i,
+                fsid="abc123" if i % 2 else "def456"
+            ))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.query(Event).delete()
+        self.session.commit()
+        super(TestEventPagination, self).tearDown()
+
+    def _walk(self, url):
+        messages = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertStatus(response, 200)
+            pages.append(response.data)
+            messages.extend([e['message'] for e in response.data['results']])
+            url = response.data['next']
+        return messages, pages
+
+    def test_page_number_mode(self):
+        response = self.client.get("/api/v2/event?page_size=10&page=2")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['count'], self.EVENT_COUNT)
+        self.assertEqual([e['message'] for e in response.data['results']],
+                         ["event %s" % i for i in range(14, 4, -1)])
+
+    def test_cursor_matches_page_number_order(self):
+        expected = ["event %s" % i for i in range(self.EVENT_COUNT - 1, -1, -1)]
+        messages, pages = self._walk("/api/v2/event?page_size=4&cursor=")
+        self.assertEqual(messages, expected)
+        self.assertEqual(len(pages), 7)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNone(pages[0]['count'])
+
+    def test_cursor_previous(self):
+        first = self.client.get("/api/v2/event?page_size=4&cursor=").data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_filters_and_count(self):
+        response = self.client.get("/api/v2/cluster/abc123/event?page_size=100&cursor=&count=true&severity=WARNING")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([e['message'] for e in response.data['results']], ["event 15", "event 5"])
+        self.assertIsNone(response.data['next'])
+
+    def test_bad_cursor(self):
+        response = self.client.get("/api/v2/event?cursor=garbage")
+        self.assertStatus(response, 400)
@@ -0,0 +1,72 @@
+import mock
+
+from calamari_rest.views import v1
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestLatestValues(RestApiUnitTest):
+    POOL = {'pool': 0, 'pool_name': 'rbd', 'quota_max_objects': 0, 'quota_max_bytes': 0}
+
+    def setUp(self):
+        super(TestLatestValues, self).setUp()
+        self.rpc.get_cluster = mock.Mock(return_value={'id': 'abc', 'name': 'ceph', 'update_time': None})
+        self.rpc.list = mock.Mock(return_value=[dict(self.POOL, pool=i, pool_name='pool%s' % i)
+                                                for i in range(0, 100)])
+
+        self.carbon = mock.Mock()
+        self.carbon.get_latest = mock.Mock(
+            side_effect=lambda paths: dict((p, 1.0 if p.endswith('num_bytes') else None) for p in paths))
+        self._patches = [mock.patch.object(v1, 'graphite', None),
+                         mock.patch.object(v1.zerorpc, 'Client', return_value=self.carbon)]
+        for patch in self._patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self._patches:
+            patch.stop()
+        super(TestLatestValues, self).tearDown()
+
+    def test_pool_list(self):
+        response = self.client.get("/api/v1/cluster/abc/pool")
+        self.assertStatus(response, 200)
+        self.assertEqual(len(response.data), 100)
+        self.assertEqual(response.data[0]['used_bytes'], 1.0)
+        self.assertEqual(response.data[0]['used_objects'], None)
+
+        # One request for all the pools' stats
+        self.assertEqual(self.carbon.get_latest.call_count, 1)
+        self.assertEqual(len(self.carbon.get_latest.call_args[0][0]), 200)
+
+    def test_graphite_windows(self):
+        stat = lambda pool_id, name='num_objects': "ceph.cluster.abc.pool.{0}.{1}".format(pool_id, name)  # noqa
+        found = {stat(0): '-1min', stat(1): '-60min', stat(3): '-1min', stat(0, 'num_bytes'): '-1min'}
+        fetched = []
+
+        class Series(list):
+            def __init__(self, name, values):
+                super(Series, self).__init__(values)
+                self.name = name
+
+        def fetch_data(request_context, path_expr):
+            fetched.append((request_context['startTime'], path_expr))
+            # Like graphite, a wildcard matches every pool, including ones not asked for
+            names = [stat(i, path_expr.split('.')[-1]) for i in range(0, 4)] if '*' in path_expr else [path_expr]
+            return [Series(name, [1.0, None] if found.get(name) == request_context['startTime'] else [None])
+                    for name in names]
+
+        metrics = [stat(0), stat(1), stat(2), stat(0, 'num_bytes')]
+        with mock.patch.object(v1, 'fetchData', fetch_data, create=True):
+            with mock.patch.object(v1, 'parseATTime', lambda t, tz: t, create=True):
+                self.assertEqual(v1._get_latest_graphite(metrics),
+                                 {stat(0): 1.0, stat(1): 1.0, stat(2): None, stat(0, 'num_bytes'): 1.0})
+
+        # One fetch per stat name per window, and wider windows are only searched
+        # for the metrics that aren't found yet
+        self.assertEqual(fetched, [
+            ('-1min', 'ceph.cluster.abc.pool.*.num_objects'),
+            ('-1min', stat(0, 'num_bytes')),
+            ('-10min', 'ceph.cluster.abc.pool.*.num_objects'),
+            ('-60min', 'ceph.cluster.abc.pool.*.num_objects'),
+            ('-1d', stat(2)),
+            ('-7d', stat(2)),
+        ])
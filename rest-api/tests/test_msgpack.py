@@ -0,0 +1,84 @@
+import gzip
+import json
+from StringIO import StringIO
+
+import mock
+import msgpack
+from django.test.utils import override_settings
+
+from calamari_rest.renderers import StreamingJSONResponse
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestMsgPack(RestApiUnitTest):
+    OSD_MAP = {'epoch': 10, 'osds': [{'osd': i, 'up': 1, 'in': 1, 'uuid': 'aaa-%s' % i} for i in range(0, 100)]}
+    URL = "/api/v2/cluster/abc123/sync_object/osd_map"
+
+    def setUp(self):
+        super(TestMsgPack, self).setUp()
+        self.rpc.get_sync_object = mock.Mock(return_value=self.OSD_MAP)
+
+    def test_render(self):
+        response = self.client.get(self.URL, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), self.OSD_MAP)
+
+        # Cached separately to the JSON rendering
+        self.assertEqual(self.client.get(self.URL).data, self.OSD_MAP)
+        cached = self.client.get(self.URL, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(self.rpc.get_sync_object.call_count, 2)
+
+    def test_parse(self):
+        self.rpc.update = mock.Mock(return_value='request-id')
+        self.rpc.get_sync_object = mock.Mock(return_value={'osd_pool_default_size': '3'})
+        response = self.client.patch("/api/v2/cluster/abc123/osd/1", msgpack.packb({'up': False}),
+                                     content_type='application/msgpack')
+        self.assertEqual(response.status_code, 202)
+        self.rpc.update.assert_called_once_with('abc123', 'osd', 1, {'up': False})
+
+        response = self.client.patch("/api/v2/cluster/abc123/osd/1", "\xc1", content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestGzip(RestApiUnitTest):
+    URL = "/api/v2/cluster/abc123/config"
+
+    def setUp(self):
+        super(TestGzip, self).setUp()
+        self.config = dict(("setting_%s" % i, "value") for i in range(0, 100))
+        self.rpc.get_sync_object = mock.Mock(side_effect=lambda fsid, sync_type: self.config)
+
+    def _gunzip(self, content):
+        return gzip.GzipFile(fileobj=StringIO(content)).read()
+
+    @override_settings(GZIP_MIN_SIZE=1024)
+    def test_threshold(self):
+        response = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(self._gunzip(response.content))), 100)
+
+        # No compression for clients that don't ask for it, or for small bodies
+        self.assertFalse(self.client.get(self.URL).has_header('Content-Encoding'))
+        response = self.client.get(self.URL + "/setting_1", HTTP_ACCEPT_ENCODING='gzip')
+        self.assertStatus(response, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(GZIP_MIN_SIZE=1024)
+    def test_streamed(self):
+        response = self.client.get("/api/v2/cluster/abc123/sync_object/config", HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIsInstance(response, StreamingJSONResponse)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(self._gunzip("".join(response.streaming_content))), self.config)
+
+    @override_settings(GZIP_MIN_SIZE=1024)
+    def test_etag(self):
+        etag = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.endswith(';gzip"'))
+        response = self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(GZIP_MIN_SIZE=0)
+    def test_disabled(self):
+        self.assertFalse(self.client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
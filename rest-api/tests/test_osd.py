@@ -4,7 +4,7 @@ import mock
 import logging
 
 from calamari_common.types import OSD
-from tests.rest_api_unit_test import RestApiUnitTest, fake_async
+from tests.rest_api_unit_test import RestApiUnitTest
 
 log = logging.getLogger(__name__)
 
@@ -15,10 +15,17 @@ class TestOsd(RestApiUnitTest):
     def setUp(self):
         super(TestOsd, self).setUp()
 
-        self.rpc.list = mock.Mock(return_value=fake_async([]))
-        self.rpc.get_sync_object = mock.Mock(return_value=fake_async([]))
-        self.rpc.get_valid_commands = mock.Mock(return_value=fake_async([]))
-        self.rpc.server_by_service = mock.Mock(return_value=fake_async([]))
+        self.rpc.list_page = mock.Mock(return_value={'count': 0, 'results': []})
+
+    def _row(self, osd_id):
+        return {
+            'osd': osd_id, 'id': osd_id, 'uuid': 'aaa', 'up': 1, 'in': 1,
+            'public_addr': '1.2.3.4:6800/1', 'cluster_addr': '1.2.3.4:6801/1',
+            'reweight': 0.5, 'server': 'server1', 'host': 'server1', 'pools': [0, 2],
+            'backend_device_node': None, 'backend_partition_path': None,
+            'osd_data': '/var/lib/ceph/osd/ceph-%s' % osd_id, 'osd_journal': None,
+            'valid_commands': ['scrub'], 'crush_node_ancestry': [[-2]], 'pg_states': {}, 'device_class': None
+        }
 
     def test_filter_by_pool(self):
         fsid = "abc123"
@@ -30,7 +37,7 @@ class TestOsd(RestApiUnitTest):
         ))
 
         self.assertStatus(response, 200)
-        self.rpc.list.assert_called_once_with(fsid, OSD, {'pool': pool}, async=True)
+        self.rpc.list_page.assert_called_once_with(fsid, OSD, {'pool': pool}, None, 0, None)
 
         # NB no actual results in response because of mocking, just checking the filter
         # args are constructed through to point of RPC
@@ -45,7 +52,95 @@ class TestOsd(RestApiUnitTest):
         ))
 
         self.assertStatus(response, 200)
-        self.rpc.list.assert_called_once_with(fsid, OSD, {'id__in': ids}, async=True)
+        self.rpc.list_page.assert_called_once_with(fsid, OSD, {'id__in': ids}, None, 0, None)
 
         # NB no actual results in response because of mocking, just checking the filter
         # args are constructed through to point of RPC
+
+    def test_filter_by_host_and_pg_states(self):
+        fsid = "abc123"
+
+        response = self.client.get("/api/v2/cluster/{0}/osd?{1}".format(
+            fsid,
+            urllib.urlencode([("host", "server1"), ("pg_states", "Degraded,peering"), ("up", "false"),
+                              ("crush_ancestor", "-3"), ("device_class", "ssd")])
+        ))
+
+        self.assertStatus(response, 200)
+        self.rpc.list_page.assert_called_once_with(fsid, OSD, {
+            'host': 'server1',
+            'pg_states': ['degraded', 'peering'],
+            'up': False,
+            'crush_ancestor': -3,
+            'device_class': 'ssd'
+        }, None, 0, None)
+        # Filtering by PG state makes the list depend on the PG summary
+        self.assertEqual(self.rpc.get_sync_object_versions.call_args[0][1], ['osd_map', 'server', 'pg_summary'])
+
+        response = self.client.get("/api/v2/cluster/{0}/osd?up=maybe".format(fsid))
+        self.assertStatus(response, 400)
+
+    def test_paginate_and_sort(self):
+        fsid = "abc123"
+        self.rpc.list_page.return_value = {'count': 25, 'results': [self._row(i) for i in range(10, 20)]}
+
+        response = self.client.get("/api/v2/cluster/{0}/osd?page=2&ordering=host,-reweight".format(fsid))
+        self.assertStatus(response, 200)
+        self.rpc.list_page.assert_called_once_with(fsid, OSD, {}, 'host,-reweight', 10, 10)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([o['id'] for o in response.data['results']], range(10, 20))
+        self.assertIn('page=3', response.data['next'])
+        self.assertIn('page=1', response.data['previous'])
+
+        response = self.client.get("/api/v2/cluster/{0}/osd?ordering=uuid".format(fsid))
+        self.assertStatus(response, 400)
+
+        self.rpc.list_page.return_value = {'count': 25, 'results': []}
+        response = self.client.get("/api/v2/cluster/{0}/osd?page=4".format(fsid))
+        self.assertStatus(response, 400)
+
+    def test_retrieve(self):
+        fsid = "abc123"
+        self.rpc.get_osd_row = mock.Mock(return_value=self._row(1))
+
+        response = self.client.get("/api/v2/cluster/{0}/osd/1".format(fsid))
+        self.assertStatus(response, 200)
+        self.rpc.get_osd_row.assert_called_once_with(fsid, 1)
+        self.assertEqual(response.data['id'], 1)
+        self.assertEqual(response.data['server'], 'server1')
+        self.assertEqual(response.data['reweight'], 0.5)
+        self.assertEqual(response.data['pools'], [0, 2])
+        self.assertEqual(response.data['osd_data'], '/var/lib/ceph/osd/ceph-1')
+        self.assertEqual(response.data['valid_commands'], ['scrub'])
+        self.assertEqual(response.data['crush_node_ancestry'], [[-2]])
+        self.assertNotIn('pg_states', response.data)
+
+    def test_bulk_update(self):
+        self.rpc.update_many = mock.Mock(return_value={'request_id': 'abc'})
+        response = self.client.patch("/api/v2/cluster/abc123/osd", [
+            {'id': 1, 'in': False},
+            {'id': 2, 'reweight': 0.5}
+        ], format="json")
+        self.assertStatus(response, 202)
+        self.assertEqual(response.data, {'request_id': 'abc'})
+        self.rpc.update_many.assert_called_once_with(
+            'abc123', OSD, [{'id': 1, 'in': False}, {'id': 2, 'reweight': 0.5}])
+
+    def test_bulk_update_invalid(self):
+        self.rpc.update_many = mock.Mock()
+        response = self.client.patch("/api/v2/cluster/abc123/osd", [
+            {'id': 1, 'in': False},
+            {'in': False},
+            {'id': 1, 'reweight': 0.5},
+            {'id': 3, 'server': 'server2'}
+        ], format="json")
+        self.assertStatus(response, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(set(response.data[1].keys()), {'id'})
+        self.assertEqual(set(response.data[2].keys()), {'id'})
+        self.assertEqual(set(response.data[3].keys()), {'server'})
+        self.assertFalse(self.rpc.update_many.called)
+
+        self.assertStatus(self.client.patch("/api/v2/cluster/abc123/osd", {'id': 1}, format="json"), 400)
+        self.assertStatus(self.client.patch("/api/v2/cluster/abc123/osd", [{'id': True, 'in': False}],
+                                            format="json"), 400)
@@ -0,0 +1,46 @@
+import mock
+
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestRequest(RestApiUnitTest):
+    def _request(self, i):
+        return {'id': str(i), 'state': 'complete', 'error': False, 'error_message': '', 'status': None,
+                'headline': "Request %s" % i, 'requested_at': '2015-01-01T12:00:00+00:00',
+                'completed_at': '2015-01-01T12:00:01+00:00', 'outcomes': None}
+
+    def test_list_page(self):
+        self.rpc.list_requests = mock.Mock(return_value={
+            'count': 25, 'results': [self._request(i) for i in range(10, 20)]})
+        response = self.client.get("/api/v2/request?page=2&state=complete")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([r['id'] for r in response.data['results']], [str(i) for i in range(10, 20)])
+        self.assertIn('page=3', response.data['next'])
+        self.rpc.list_requests.assert_called_once_with({'state': 'complete', 'fsid': None}, 10, 10)
+
+    def test_list_cursor(self):
+        self.rpc.list_requests = mock.Mock(return_value={
+            'count': None, 'results': [self._request(i) for i in range(19, 8, -1)]})
+        response = self.client.get("/api/v2/request?cursor=&state=complete")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['count'], None)
+        self.assertEqual([r['id'] for r in response.data['results']], [str(i) for i in range(19, 9, -1)])
+        self.assertEqual(response.data['previous'], None)
+        # One more than a page is asked for, to learn whether there is a next page
+        self.rpc.list_requests.assert_called_once_with({'state': 'complete', 'fsid': None}, 0, 11, None, False)
+
+        next_url = response.data['next']
+        self.rpc.list_requests.return_value = {'count': 25, 'results': [self._request(i) for i in range(9, 4, -1)]}
+        response = self.client.get(next_url + "&count=true")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['next'], None)
+        self.assertNotEqual(response.data['previous'], None)
+        self.rpc.list_requests.assert_called_with({'state': 'complete', 'fsid': None}, 0, 11,
+                                                  ['next', '2015-01-01T12:00:00+00:00', '10'], True)
+
+        self.assertStatus(self.client.get("/api/v2/request?cursor=garbage"), 400)
+
+    def test_bad_state(self):
+        self.assertStatus(self.client.get("/api/v2/request?state=unknown"), 400)
@@ -0,0 +1,41 @@
+from django.utils.unittest import TestCase
+
+from calamari_rest.views.response_cache import ResponseCache
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(100)
+
+    def test_hit_and_invalidate(self):
+        self.assertIsNone(self.cache.lookup('a', 1))
+        self.cache.store('a', 1, "x" * 10, 'application/json')
+        self.assertEqual(self.cache.lookup('a', 1), ("x" * 10, 'application/json'))
+
+        # A newer version drops the entry
+        self.assertIsNone(self.cache.lookup('a', 2))
+        self.assertIsNone(self.cache.lookup('a', 1))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['invalidations'], 1)
+        self.assertEqual(stats['entries'], 0)
+        self.assertEqual(stats['bytes'], 0)
+
+    def test_lru_eviction(self):
+        for key in ['a', 'b', 'c']:
+            self.cache.store(key, 1, "x" * 40, 'application/json')
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertIsNone(self.cache.lookup('a', 1))
+
+        # Using 'b' makes 'c' the least recently used
+        self.assertIsNotNone(self.cache.lookup('b', 1))
+        self.cache.store('d', 1, "x" * 40, 'application/json')
+        self.assertIsNone(self.cache.lookup('c', 1))
+        self.assertIsNotNone(self.cache.lookup('b', 1))
+        self.assertEqual(self.cache.stats()['bytes'], 80)
+
+    def test_oversize(self):
+        self.cache.store('a', 1, "x" * 101, 'application/json')
+        self.assertEqual(self.cache.stats()['entries'], 0)
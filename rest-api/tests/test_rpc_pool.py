@@ -0,0 +1,66 @@
+from django.utils.unittest import TestCase
+import mock
+from zerorpc import LostRemote
+
+from calamari_rest.views import rpc_view
+from calamari_rest.views.rpc_view import RpcClientPool
+
+
+class TestRpcClientPool(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(rpc_view, 'ProfiledRpcClient', side_effect=lambda: mock.MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = RpcClientPool("tcp://127.0.0.1:5050", 2, 30)
+
+    def test_reuse(self):
+        a = self.pool.checkout()
+        a.connect.assert_called_once_with("tcp://127.0.0.1:5050")
+        self.pool.release(a)
+        self.assertIs(self.pool.checkout(), a)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['idle'], 0)
+
+    def test_overflow(self):
+        clients = [self.pool.checkout() for i in range(0, 3)]
+        self.assertEqual(self.pool.stats()['in_use'], 3)
+        for c in clients:
+            self.pool.release(c)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['overflow'], 1)
+        clients[2].close.assert_called_once_with()
+
+    def test_lost(self):
+        a = self.pool.checkout()
+        self.pool.release(a, lost=True)
+        a.close.assert_called_once_with()
+
+        self.assertIsNot(self.pool.checkout(), a)
+        self.assertEqual(self.pool.stats()['lost'], 1)
+
+    def test_health_check(self):
+        a = self.pool.checkout()
+        self.pool.release(a)
+        b = self.pool.checkout()
+        self.pool.release(b)
+
+        # Idle for less than the check interval: no ping
+        self.assertFalse(a._zerorpc_ping.called)
+
+        with mock.patch.object(rpc_view.time, 'time', return_value=rpc_view.time.time() + 60):
+            a._zerorpc_ping.side_effect = LostRemote()
+            c = self.pool.checkout()
+
+        self.assertIsNot(c, a)
+        a.close.assert_called_once_with()
+        stats = self.pool.stats()
+        self.assertEqual(stats['health_checks'], 1)
+        self.assertEqual(stats['health_check_failures'], 1)
+        self.assertEqual(stats['connects'], 2)
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+import mock
+
+from calamari_common.snapshot import SnapshotReader, SnapshotWriter
+from calamari_rest.views import rpc_view
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestSnapshot(RestApiUnitTest):
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.writer = SnapshotWriter(self.path)
+        self.reader = SnapshotReader(self.path)
+
+        patcher = mock.patch.object(rpc_view, 'snapshots', self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(TestSnapshot, self).tearDown()
+
+    def test_publish_and_read(self):
+        self.assertIsNone(self.reader.get('abc123', 'osd_map'))
+
+        self.writer.publish('abc123', 'osd_map', 10, {'epoch': 10, 'osds': [{'osd': 0}]})
+        snapshot = self.reader.get('abc123', 'osd_map')
+        self.assertEqual(snapshot.version, 10)
+        self.assertEqual(snapshot.header['fsid'], 'abc123')
+        self.assertEqual(snapshot.data, {'epoch': 10, 'osds': [{'osd': 0}]})
+
+        # Unchanged file gives the same, already decoded, snapshot
+        self.assertIs(self.reader.get('abc123', 'osd_map'), snapshot)
+
+        # A new version replaces it, without disturbing the old mapping
+        self.writer.publish('abc123', 'osd_map', 11, {'epoch': 11, 'osds': []})
+        self.assertEqual(self.reader.get('abc123', 'osd_map').data, {'epoch': 11, 'osds': []})
+        self.assertEqual(snapshot.data['epoch'], 10)
+        self.assertEqual(os.listdir(os.path.join(self.path, 'abc123')), ['osd_map'])
+
+        self.writer.clear()
+        self.assertIsNone(self.reader.get('abc123', 'osd_map'))
+
+    def test_max_age(self):
+        reader = SnapshotReader(self.path, max_age=60)
+        with mock.patch('calamari_common.snapshot.time.time', return_value=1000.0):
+            self.writer.publish('abc123', 'osd_map', 10, {'epoch': 10})
+        snapshot = reader.get('abc123', 'osd_map')
+
+        # Refused once it is too old, and accepted again when published afresh
+        with mock.patch('calamari_common.snapshot.time.time', return_value=1061.0):
+            self.assertIsNone(reader.get('abc123', 'osd_map'))
+            self.writer.publish('abc123', 'osd_map', 10, {'epoch': 10})
+            self.assertIsNot(reader.get('abc123', 'osd_map'), snapshot)
+            self.assertEqual(reader.get('abc123', 'osd_map').version, 10)
+
+    def test_views_read_snapshot(self):
+        self.writer.publish('abc123', 'config', 'd41d8cd9', {'osd_pool_default_size': '3'})
+        self.rpc.get_sync_object_versions = mock.Mock()
+        self.rpc.get_sync_object = mock.Mock()
+
+        response = self.client.get("/api/v2/cluster/abc123/config/osd_pool_default_size")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['value'], '3')
+
+        response = self.client.get("/api/v2/cluster/abc123/sync_object/config",
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data, {'osd_pool_default_size': '3'})
+
+        # Everything came from the snapshot
+        self.assertFalse(self.rpc.get_sync_object_versions.called)
+        self.assertFalse(self.rpc.get_sync_object.called)
+
+    def test_stale_snapshot(self):
+        self.writer.publish('abc123', 'config', 'd41d8cd9', {'osd_pool_default_size': '3'})
+        self.rpc.get_sync_object = mock.Mock(return_value={'osd_pool_default_size': '2'})
+        self.reader.max_age = 60
+
+        # As if cthulhu had gone away without removing it
+        with mock.patch('calamari_common.snapshot.time.time', return_value=os.path.getmtime(
+                os.path.join(self.path, 'abc123', 'config')) + 120):
+            response = self.client.get("/api/v2/cluster/abc123/config/osd_pool_default_size")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['value'], '2')
+        self.rpc.get_sync_object.assert_called_once_with('abc123', 'config')
+
+    def test_fallback_to_rpc(self):
+        self.rpc.get_sync_object = mock.Mock(return_value={'osd_pool_default_size': '2'})
+        response = self.client.get("/api/v2/cluster/abc123/config/osd_pool_default_size")
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['value'], '2')
+        self.rpc.get_sync_object.assert_called_once_with('abc123', 'config')
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+from django.utils.unittest import TestCase
+import mock
+from rest_framework.renderers import JSONRenderer
+
+from calamari_common.types import OSD_MAP
+from calamari_rest.renderers import StreamedList, StreamingJSONResponse, materialize
+from calamari_rest.views.response_cache import ResponseCache
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestStreamingJSONResponse(TestCase):
+    DATA = OrderedDict([
+        ('count', 3),
+        ('next', None),
+        ('results', [
+            {'id': 0, 'name': u'caf\xe9', 'pools': [1, 2], 'reweight': 0.5, 'up': True},
+            {'id': 1, 'nested': {'a': [{'b': None}]}},
+            []
+        ]),
+        ('empty', {})
+    ])
+
+    def _content(self, response):
+        return "".join(response.streaming_content)
+
+    def test_same_as_json_renderer(self):
+        expected = JSONRenderer().render(self.DATA)
+        for depth in range(0, 5):
+            self.assertEqual(self._content(StreamingJSONResponse(self.DATA, depth=depth)), expected)
+
+        for data in [[], {}, "string", 1.5]:
+            self.assertEqual(self._content(StreamingJSONResponse(data)), JSONRenderer().render(data))
+
+    def test_streamed_list(self):
+        data = {'results': StreamedList(range(0, 5), lambda i: {'id': i})}
+        expected = JSONRenderer().render({'results': [{'id': i} for i in range(0, 5)]})
+        self.assertEqual(self._content(StreamingJSONResponse(data, depth=0)), expected)
+        self.assertEqual(materialize(data), {'results': [{'id': i} for i in range(0, 5)]})
+
+    def test_chunks(self):
+        data = [{'id': i, 'padding': 'x' * 100} for i in range(0, 2000)]
+        with mock.patch.object(StreamingJSONResponse, 'CHUNK_SIZE', 1024):
+            chunks = list(StreamingJSONResponse(data).streaming_content)
+
+        self.assertEqual("".join(chunks), JSONRenderer().render(data))
+        self.assertGreater(len(chunks), 100)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), 1024)
+            self.assertLess(len(chunk), 1024 + 200)
+
+
+class TestStreamingViews(RestApiUnitTest):
+    OSD_MAP = {'epoch': 10, 'osds': [{'osd': i, 'up': 1, 'in': 1} for i in range(0, 100)]}
+
+    def setUp(self):
+        super(TestStreamingViews, self).setUp()
+        self.rpc.get_sync_object = mock.Mock(return_value=self.OSD_MAP)
+
+    def test_sync_object(self):
+        response = self.client.get("/api/v2/cluster/abc123/sync_object/%s" % OSD_MAP)
+        self.assertStatus(response, 200)
+        self.assertIsInstance(response, StreamingJSONResponse)
+        self.assertEqual(response.data, self.OSD_MAP)
+
+    def test_browsable_api(self):
+        # The browsable API renders the whole response as usual
+        response = self.client.get("/api/v2/cluster/abc123/sync_object/%s" % OSD_MAP, HTTP_ACCEPT='text/html')
+        self.assertStatus(response, 200)
+        self.assertNotIsInstance(response, StreamingJSONResponse)
+        self.assertIn('&quot;epoch&quot;: 10', response.content)
+
+    def test_cached(self):
+        url = "/api/v2/cluster/abc123/sync_object/%s" % OSD_MAP
+        streamed = self.client.get(url)
+        cached = self.client.get(url)
+        self.assertNotIsInstance(cached, StreamingJSONResponse)
+        self.assertEqual(cached.content, "".join(streamed.streaming_content))
+        self.assertEqual(self.rpc.get_sync_object.call_count, 1)
+
+    def test_too_big_to_cache(self):
+        url = "/api/v2/cluster/abc123/sync_object/%s" % OSD_MAP
+        with mock.patch.object(ResponseCache.get(), 'max_bytes', 1024):
+            self.assertIsInstance(self.client.get(url), StreamingJSONResponse)
+            self.assertIsInstance(self.client.get(url), StreamingJSONResponse)
+        self.assertEqual(self.rpc.get_sync_object.call_count, 2)
@@ -0,0 +1,62 @@
+import datetime
+import json
+
+import msgpack
+
+from calamari_common.db.sync_object import SyncObject
+from calamari_rest.views.database_view_set import DatabaseViewSet
+from calamari_rest.views.v2 import SyncObjectHistory
+from tests.rest_api_unit_test import RestApiUnitTest
+
+
+class TestSyncObjectHistory(RestApiUnitTest):
+    def setUp(self):
+        super(TestSyncObjectHistory, self).setUp()
+
+        self.session = SyncObjectHistory().session
+        SyncObject.__table__.create(DatabaseViewSet.engine, checkfirst=True)
+
+        t0 = datetime.datetime(2014, 1, 1)
+        for epoch in range(1, 6):
+            self.session.add(SyncObject(
+                fsid="abc123", cluster_name="ceph", sync_type='osd_map', version=epoch,
+                when=t0 + datetime.timedelta(hours=epoch),
+                data=msgpack.packb({
+                    'epoch': epoch,
+                    'osds': [{'osd': 0, 'up': 1, 'in': 1, 'uuid': 'aaa'},
+                             {'osd': 1, 'up': epoch % 2, 'in': 1, 'uuid': 'bbb'}]
+                })))
+        self.session.add(SyncObject(
+            fsid="def456", cluster_name="ceph", sync_type='osd_map', version=1,
+            when=t0, data=msgpack.packb({'epoch': 1, 'osds': []})))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.query(SyncObject).delete()
+        self.session.commit()
+        super(TestSyncObjectHistory, self).tearDown()
+
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads("".join(response.streaming_content))
+
+    def test_range(self):
+        history = self._get("/api/v2/cluster/abc123/sync_object/osd_map/history"
+                            "?from=2014-01-01T02:00:00Z&to=2014-01-01T05:00:00%2B00:00")
+        self.assertEqual([h['version'] for h in history], [2, 3, 4])
+        self.assertEqual(history[0]['when'], "2014-01-01T02:00:00+00:00")
+        self.assertEqual(history[0]['data']['epoch'], 2)
+
+    def test_projection(self):
+        history = self._get("/api/v2/cluster/abc123/sync_object/osd_map/history?fields=osds.osd,osds.up")
+        self.assertEqual(len(history), 5)
+        self.assertEqual(history[0]['data'], {'osds': [{'osd': 0, 'up': 1}, {'osd': 1, 'up': 1}]})
+        self.assertEqual(history[1]['data'], {'osds': [{'osd': 0, 'up': 1}, {'osd': 1, 'up': 0}]})
+
+    def test_empty(self):
+        self.assertEqual(self._get("/api/v2/cluster/abc123/sync_object/mon_status/history"), [])
+
+    def test_errors(self):
+        self.assertStatus(self.client.get("/api/v2/cluster/abc123/sync_object/nonsense/history"), 404)
+        self.assertStatus(self.client.get("/api/v2/cluster/abc123/sync_object/osd_map/history?from=yesterday"), 400)